@@ -60,6 +60,11 @@ class config_class(object):
     edgelength; the length in s of the edge between 0 and 1 in P and Q
     fs; sample frequency for niDAQ or ADwin
 
+    settle_tau; time constant (s) of the transient after changing the control
+        voltages, used by RampScheduler to compute the settling time of each change
+    settle_tolerance; remaining transient (mV) accepted as settled
+    settle_min; least time (s) waited after every change of the control voltages
+
     ----------------------------------------------------------------------------
     For a description of method, refer to their individual docstrings.
 
@@ -71,6 +76,9 @@ class config_class(object):
         ################################################
         self.fs = 1000
         self.comport = 'COM3'  # COM port for the ivvi rack
+        self.settle_tau = 0.1  # s, see RampScheduler
+        self.settle_tolerance = 1  # mV
+        self.settle_min = 1  # s, the fixed wait after setting the DACs; lower it once tau is measured
 
         ################################################
         ############### Evolution settings #############
@@ -46,21 +46,16 @@ class GenePool(object):
         self.newpool = self.pool.copy()
         # Determine which genomes are chosen to generate offspring 
         # Note: twice as much parents are selected as there are genomes to be generated
-        chosen = self.Universal_sampling()
+        chosen = self.Universal_sampling().reshape(-1,2)
         # Generate offspring by means of crossover. 
-        # The crossover method returns 1 genome from 2 parents       
-        for i in range(0,len(chosen),2):
-            index_newpool = int(i/2 +sum(self.partition[:1]))
-            if chosen[i] == chosen[i+1]:
-                if chosen[i] == 0: 
-                    chosen[i] = chosen[i] + 1 
-                else: 
-                    chosen[i] = chosen[i] - 1 
-            #The individual with the highest fitness score is given as input first
-            if chosen[i] < chosen[i+1]:
-                self.newpool[index_newpool,:] = self.Crossover_BLXab(self.pool[chosen[i],:], self.pool[chosen[i+1],:])
-            else:
-                self.newpool[index_newpool,:] = self.Crossover_BLXab(self.pool[chosen[i+1],:], self.pool[chosen[i],:])
+        # The crossover method returns 1 genome from 2 parents, for all pairs at once
+        same = chosen[:,0] == chosen[:,1]
+        chosen[same,0] = np.where(chosen[same,0] == 0, 1, chosen[same,0] - 1)
+        #The individual with the highest fitness score is given as input first
+        fitter = np.min(chosen, axis=1)
+        weaker = np.max(chosen, axis=1)
+        start = self.partition[0]
+        self.newpool[start:start+len(chosen)] = self.Crossover_BLXab(self.pool[fitter], self.pool[weaker])
         # The mutation rate is updated based on the generation counter     
         self.UpdateMutation(gen)
         # Every genome, except the partition[0] genomes are mutated 
@@ -77,23 +72,14 @@ class GenePool(object):
         Sampling method: Stochastic universal sampling returns the chosen 'parents' 
         '''
         no_genomes = 2 * self.partition[1]    
-        chosen = []
-        probabilities = self.Linear_rank()
-        for i in range(1, len(self.fitness)):
-            probabilities[i] = probabilities[i] + probabilities[i-1]
+        probabilities = np.cumsum(self.Linear_rank())
         distance = 1/(no_genomes)
         start = random.random() * distance
-        for n in range(no_genomes):
-            pointer = start+n*distance
-            for i in range(len(self.fitness)):
-                if pointer < probabilities[0]:
-                    chosen.append(0)
-                    break 
-                elif pointer< probabilities[i] and pointer >= probabilities[i-1]:
-                    chosen.append(i)
-                    break 
-        chosen = random.sample(chosen, len(chosen))    
-        return chosen
+        pointers = start + distance*np.arange(no_genomes)
+        # Genome i is chosen for each pointer in [probabilities[i-1], probabilities[i])
+        chosen = np.searchsorted(probabilities, pointers, side='right')
+        chosen = np.minimum(chosen, len(probabilities)-1)
+        return np.random.permutation(chosen)
      
     
     def Linear_rank(self):
@@ -114,7 +100,9 @@ class GenePool(object):
     def Crossover_BLXab(self, parent1, parent2):
         '''
         Crossover method: Blend alpha beta crossover returns a new genome (voltage combination)
-        from two parents. Here, parent 1 has a higher fitness than parent 2
+        from two parents. Here, parent 1 has a higher fitness than parent 2.
+        The parents can also be arrays of shape (pairs, genes) to generate one 
+        offspring for each pair.
         '''
         
         alpha = 0.6
@@ -122,18 +110,12 @@ class GenePool(object):
         maximum = np.maximum(parent1, parent2)
         minimum = np.minimum(parent1, parent2)
         I = (maximum - minimum) 
-        offspring= np.zeros((parent1.shape))
-        for i in range(len(parent1)):
-            if parent1[i] > parent2[i]:
-                offspring[i] = np.random.uniform(minimum[i]-I[i]*beta, maximum[i]+I[i]*alpha)
-            else: 
-                offspring[i] = np.random.uniform(minimum[i] - I[i]*alpha, maximum[i]+I[i]*beta)
-        for i in range(0,self.genes):
-            if offspring[i] < self.generange[i][0]: 
-                offspring[i] = self.generange[i][0]
-            if offspring[i]  > self.generange[i][1]: 
-                offspring[i] = self.generange[i][1]
-        return offspring
+        # The interval is extended by alpha*I on the side of the fitter parent
+        lower = np.where(parent1 > parent2, minimum - I*beta, minimum - I*alpha)
+        upper = np.where(parent1 > parent2, maximum + I*alpha, maximum + I*beta)
+        offspring = np.random.uniform(lower, upper)
+        generange = np.asarray(self.generange)
+        return np.clip(offspring, generange[:,0], generange[:,1])
     
     
  #------------------------------------------------------------------------------    
@@ -156,15 +138,22 @@ class GenePool(object):
         np.random.seed(seed=None)
         mask = np.random.choice([0, 1], size=self.pool[self.partition[0]:].shape, 
                                 p=[1-self.mutationrate, self.mutationrate])
-        mutatedpool = np.zeros((self.genomes-self.partition[0], self.genes))
-    
-        for i in range(0,self.genes):
-            if self.generange[i][0] == self.generange[i][1]:
-                mutatedpool[:,i] = self.generange[i][0]*np.ones(mutatedpool[:,i].shape)
-            else:
-                mutatedpool[:,i] = np.random.triangular(self.generange[i][0], self.newpool[self.partition[0]:,i], self.generange[i][1])
+        mutatedpool = self.Triangular(self.newpool[self.partition[0]:])
         self.newpool[self.partition[0]:] = ((np.ones(self.newpool[self.partition[0]:].shape) - mask)*self.newpool[self.partition[0]:]  + mask * mutatedpool)
     
+    def Triangular(self, genomes):
+        '''
+        Draws new genes from a triangular distribution in generange with 
+        mode=current gene, for an array of genomes of shape (nr-genomes, genes).
+        Genes with a fixed range are set to that value.
+        '''
+        low, high = np.asarray(self.generange, dtype=float).T
+        fixed = low == high
+        # np.random.triangular needs low < high, the fixed genes are overwritten below
+        mutated = np.random.triangular(low, np.clip(genomes, low, high), np.where(fixed, low + 1, high),
+                                       size=genomes.shape)
+        return np.where(fixed, low, mutated)
+    
     
   #------------------------------------------------------------------------------   
      
@@ -172,16 +161,14 @@ class GenePool(object):
         np.random.seed(seed=None)
         '''
         Check the entire pool for any duplicate genomes and replace them by 
-        the genome put through a triangular distribution
-        '''
-        for i in range(self.genomes):
-            for j in range(self.genomes):
-                if(j != i and np.array_equal(self.newpool[i],self.newpool[j])):
-                    for k in range(0,self.genes):
-                        if self.generange[k][0] != self.generange[k][1]:
-                            self.newpool[j][k] = np.random.triangular(self.generange[k][0], self.newpool[j][k], self.generange[k][1])
-                        else: 
-                            self.newpool[j][k] = self.generange[k][0]
+        the genome put through a triangular distribution. The first occurrence
+        of each genome is kept.
+        '''
+        _, first = np.unique(self.newpool, axis=0, return_index=True)
+        duplicates = np.ones(self.genomes, dtype=bool)
+        duplicates[first] = False
+        if np.any(duplicates):
+            self.newpool[duplicates] = self.Triangular(self.newpool[duplicates])
                             
                         
 #------------------------------------------------------------------------------
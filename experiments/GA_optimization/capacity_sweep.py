@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Capacity sweep: finds a classifier for each binary labelling of the inputs using
+evolve_VCdim5_Final.evolve and measures the capacity (VC dimension) of the device.
+The labellings are independent GA runs, so they are scheduled over a process pool.
+Every finished labelling is cached in save_dir, so an interrupted sweep resumes
+where it stopped when it is called again with the same save_dir.
+----------------------------------------------------------------------------
+Arguments of capacity_sweep
+----------------------------------------------------------------------------
+- inputs: Input data, a list with the values of each input for the N points
+- save_dir: Folder for the cached labellings and the final Results.npz
+- labels: indices of the labellings in bintarget(N) to evaluate (default: all)
+- workers: number of processes evolving labellings in parallel
+- early_stop: if True, a labelling stops evolving as soon as a linearly separable
+    solution is found; if False it searches all generations for better solutions
+- dataset: index of the measurement, passed on to evolve
+NOTE: On Windows the script calling capacity_sweep must be guarded by __main__.
+"""
+
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from create_binary import bintarget
+import evolve_VCdim5_Final as vcd
+
+
+def capacity_sweep(inputs, save_dir, labels=None, workers=os.cpu_count(), early_stop=True, dataset=0):
+    N = len(inputs[0])
+    binary_labels = bintarget(N)
+    if labels is not None:
+        binary_labels = binary_labels[labels]
+    binary_labels = binary_labels.tolist()
+    threshold = (1-0.5/N)
+    print('Threshold for acceptance is set at: ',threshold)
+    if not os.path.exists(save_dir):
+        os.makedirs(save_dir)
+
+    results = [None]*len(binary_labels)
+    pending = []
+    for i, bl in enumerate(binary_labels):
+        cache_file = os.path.join(save_dir, 'VCdim-'+''.join(map(str, bl))+'.npz')
+        if len(set(bl))==1:
+            print('Label ',bl,' ignored')
+            results[i] = {'found':1}
+        elif os.path.isfile(cache_file):
+            print('Label ',bl,' loaded from cache')
+            with np.load(cache_file) as cached:
+                results[i] = dict(cached)
+        else:
+            pending.append((i, bl, cache_file))
+
+    print(f'Evolving {len(pending)} labellings on {workers} workers')
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(workers,)) as executor:
+        futures = {executor.submit(_solve, dataset, inputs, bl, threshold, early_stop, cache_file):i
+                   for i, bl, cache_file in pending}
+        for nr, future in enumerate(as_completed(futures)):
+            i = futures[future]
+            results[i] = future.result()
+            print(f'Labelling {binary_labels[i]} done ({nr+1}/{len(pending)}): accuracy {results[i]["accuracy"]}')
+
+    return _aggregate(inputs, binary_labels, results, threshold, save_dir)
+
+
+def _init_worker(workers):
+    # Share the cores among the workers instead of oversubscribing them
+    import torch
+    torch.set_num_threads(max(1, os.cpu_count()//workers))
+
+
+def _solve(dataset, inputs, bl, threshold, early_stop, cache_file):
+    print('Finding classifier ',bl)
+    stop_fitness = 0.1 if early_stop else None
+    genes, output, fitness, accuracy, target, end, w = vcd.evolve(dataset, threshold, inputs, bl,
+                                                                  stop_fitness=stop_fitness)
+    res = {'genes':genes, 'output':output, 'fitness':fitness, 'accuracy':accuracy,
+           'target':target, 'end':end, 'w':w, 'found':int(accuracy>threshold)}
+    # Write to a temporary file first, so an interruption never leaves a broken cache
+    with open(cache_file+'.tmp', 'wb') as f:
+        np.savez(f, **res)
+    os.replace(cache_file+'.tmp', cache_file)
+    return res
+
+
+def _aggregate(inputs, binary_labels, results, threshold, save_dir):
+    evolved = [res for res in results if 'genes' in res]
+    genes_shape = evolved[0]['genes'].shape if evolved else (0,)
+    output_shape = evolved[0]['output'].shape if evolved else (0,)
+    get = lambda key, shape=(): np.asarray([res[key] if key in res else np.nan*np.ones(shape)
+                                            for res in results])
+
+    sweep = {'inputs':inputs,
+             'binary_labels':binary_labels,
+             'found_classifier':get('found'),
+             'fitness_classifier':get('fitness'),
+             'accuracy_classifier':get('accuracy'),
+             'output_classifier':get('output', output_shape),
+             'genes_classifier':get('genes', genes_shape),
+             'target_classifier':get('target', output_shape),
+             'end_classifier':get('end'),
+             'threshold':threshold}
+    if evolved:
+        sweep['w'] = evolved[0]['w']
+    sweep['capacity'] = np.mean(sweep['found_classifier'])
+    print('Capacity: ', sweep['capacity'])
+    np.savez(os.path.join(save_dir, 'Results'), **sweep)
+    return sweep
@@ -10,7 +10,7 @@ Created on Mon May 13 12:59:05 2019
 Script to evolve the NN using the Evolution_Final.py module. 
 It contains 2 functions: a noise generator and a function to compare the opposite pool with the current pool
 Note: the search automatically stops if a linearly separable solution is found. 
-If you want to continue the search for higher quality solutions, remove the 'break'
+If you want to continue the search for higher quality solutions, set stop_fitness=None
 More information about each parameter can be found below
 """
 
@@ -72,7 +72,7 @@ def opposite( x, genePool, cf, net, target, dtype,w):
     genePool.setNewPool(indices)     
 
 
-def evolve( dataset, threshold, inputs, binary_labels):
+def evolve( dataset, threshold, inputs, binary_labels, stop_fitness=0.1):
     # Initialize config object
     cf = config.experiment_config(inputs, binary_labels)
     # Initialize input and target
@@ -104,7 +104,7 @@ def evolve( dataset, threshold, inputs, binary_labels):
     genePool = Evolution.GenePool(cf)  
 
     #%% Measurement loop
-
+    end = cf.generations - 1
     for i in range(cf.generations):
         start = time.time()
         #if the solution is not found when half of the generations have elapsed, evaluate opposite pool
@@ -155,8 +155,9 @@ def evolve( dataset, threshold, inputs, binary_labels):
         y = best_output[w][:,np.newaxis]
         trgt = target[w][:,np.newaxis] 
         #If one of the genomes is linearly separable, break. See methods in config_evolve for 
-        #A more detailed description of this threshold. 
-        if max(genePool.fitness) > 0.1:
+        #A more detailed description of this threshold. Set stop_fitness=None to continue
+        #the search for higher quality solutions.
+        if stop_fitness is not None and max(genePool.fitness) > stop_fitness:
             end = i 
             break 
         #Evolve to next generation 
@@ -1,6 +1,6 @@
 import SkyNEt.modules.SaveLib as SaveLib
 import matplotlib.pyplot as plt
-from SkyNEt.instruments import InstrumentImporter
+from SkyNEt.instruments import MeasurementBackends
 import numpy as np
 import os
 import config_IV as config
@@ -14,14 +14,9 @@ saveDirectory = SaveLib.createSaveDirectory(config.filepath, config.name)
 # Define the device input using the function in the config class.
 Input = config.Sweepgen( config.v_high, config.v_low, config.n_points, config.direction)
 
-# Measure using the device specified in the config class.
-if config.device == 'nidaq':
-    Output = InstrumentImporter.nidaqIO.IO(Input, config.fs)
-elif config.device == 'adwin':
-    adwin = InstrumentImporter.adwinIO.InitInstrument()
-    Output = InstrumentImporter.adwinIO.IO(adwin, Input, config.fs)
-else:
-    print('specify measurement device')
+# Measure using the backend specified in the config class.
+backend = MeasurementBackends.get_backend(config.backend)
+Output = backend.IO(Input, config.fs)
 
 # Save the Input and Output
 SaveLib.saveExperiment(saveDirectory, input = Input, output = Output)
@@ -32,4 +27,4 @@ plt.plot(Input[0:len(Output)], Output)
 plt.show()
 
 # Final reset
-InstrumentImporter.reset(0, 0)
+backend.reset()
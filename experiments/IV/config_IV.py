@@ -13,7 +13,7 @@ class experiment_config(object):
     direction; Controls the sweep direction. down goes to v_low first while up goes to v_high first.
     amplification; This is used to correct for the amplication used in the amplifier (1G=1, 100M=10, 10M=100, 1M=1000).
     source_gain; Defines the source gain. THe input from the nidaq is limited by the IVVI rack. an amplifier can be used to get 5X higher voltages. to correct for this the source_gain needs to be set to 5.
-    device; Here you indicate which meanrement device you use (nidaq or adwin).
+    backend; Here you indicate which measurement backend you use (nidaq, adwin or simulated), see instruments/MeasurementBackends.
     fs; Controls the samepling rate of the measurement device.
     sweepgen; This is the function used to generate the input sequence.
     '''
@@ -36,7 +36,8 @@ class experiment_config(object):
         self.source_gain = 1
 
         #measurment tool settings.
-        self.device = 'nidaq'
+        self.backend = {'backend':'nidaq'}
+        # self.backend = {'backend':'simulated', 'path2NN':r'D:\Bram\model.pt', 'ao_indx':[0], 'dac_indx':[1,2,3,4,5,6], 'noise':0.}
         self.fs = 1000
 
 
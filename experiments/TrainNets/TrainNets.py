@@ -18,8 +18,8 @@ from SkyNEt.modules.Nets.DataHandler import GetData as gtd
 ########################### LOAD DATA  ########################################
 ###############################################################################
 main_dir = r'../../test/NN_test/data4nn/16_04_2019/'
-file_name = 'data_for_training.npz'
-data = dl(main_dir, file_name, syst='cpu', steps=3)
+file_name = 'data_for_training'
+data = dl(main_dir, file_name, steps=3)
 
 #%%
 ###############################################################################
@@ -72,7 +72,7 @@ net = staNNet(path)
 
 ########################## TEST GENERALIZATION  ###############################
 file_dir = r'/home/hruiz/Documents/PROJECTS/DARWIN/Data_Darwin/NN_data_Mark/7D_test_sets/2019_03_19_084109_rand_test_set_100ms/data4nn/2019_04_08/'
-inputs, targets = gtd(file_dir+'data_for_test.npz', syst='cpu') #function to load data returning torch Variable with correct form and dtype 
+inputs, targets = gtd(file_dir+'data_for_test', device='cpu') #function to load data returning torch Variable with correct form and dtype 
 prediction = net.outputs(inputs)
  
 
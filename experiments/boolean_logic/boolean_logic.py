@@ -15,6 +15,8 @@ This is done withing 3 for loops:
 import SkyNEt.modules.SaveLib as SaveLib
 import SkyNEt.modules.Evolution as Evolution
 import SkyNEt.modules.PlotBuilder as PlotBuilder
+from SkyNEt.modules.RampScheduler import RampScheduler
+import SkyNEt.modules.AcquisitionPipeline as AcquisitionPipeline
 import config_boolean_logic as config
 from SkyNEt.instruments import InstrumentImporter
 
@@ -31,76 +33,91 @@ x = np.asarray(cf.InputGen()[1:3])  # Array with P and Q signal
 w = cf.InputGen()[3]  # Weight array
 target = cf.TargetGen()[1]  # Target signal
 
-# np arrays to save genePools, outputs and fitness
-geneArray = np.zeros((cf.generations, cf.genomes, cf.genes))
-outputArray = np.zeros((cf.generations, cf.genomes, len(x[0])))
-fitnessArray = np.zeros((cf.generations, cf.genomes))
-
 # Temporary arrays, overwritten each generation
 fitnessTemp = np.zeros((cf.genomes, cf.fitnessavg))
-outputAvg = np.zeros((cf.fitnessavg, len(x[0])))
 outputTemp = np.zeros((cf.genomes, len(x[0])))
-controlVoltages = np.zeros(cf.genes)
+controlVoltages = np.zeros((cf.genomes, cf.genes-1))
 
 # Initialize save directory
 saveDirectory = SaveLib.createSaveDirectory(cf.filepath, cf.name)
 
+# Memory-mapped arrays to save genePools, outputs and fitness, each generation
+# only its own rows are written to disk
+store = SaveLib.ResultStore(saveDirectory)
+geneArray = store.create('geneArray', (cf.generations, cf.genomes, cf.genes))
+outputArray = store.create('outputArray', (cf.generations, cf.genomes, len(x[0])))
+fitnessArray = store.create('fitnessArray', (cf.generations, cf.genomes))
+store.save(t = t,
+           x = x,
+           amplified_target = cf.amplification*target)
+SaveLib.copyFiles(saveDirectory)
+
 # Initialize main figure
 mainFig = PlotBuilder.initMainFigEvolution(cf.genes, cf.generations, cf.genelabels, cf.generange)
 
 # Initialize instruments
 ivvi = InstrumentImporter.IVVIrack.initInstrument()
+scheduler = RampScheduler(lambda cv: InstrumentImporter.IVVIrack.setControlVoltages(ivvi, cv),
+                          cf.settle_tau, cf.settle_tolerance, minimum=cf.settle_min)
 
 # Initialize genepool
 genePool = Evolution.GenePool(cf)
 
+#%% Measurement and fitness of a single genome
+def measure(j):
+    '''Measures genome j cf.fitnessavg times; runs in the acquisition thread.'''
+    # Set the input scaling
+    x_scaled = x * genePool.MapGenes(cf.generange[-1], genePool.pool[j, -1])
+
+    outputs = np.zeros((cf.fitnessavg, len(x[0])))
+    for avgIndex in range(cf.fitnessavg):
+        # Feed input to measurement device
+        if(cf.device == 'nidaq'):
+            output = InstrumentImporter.nidaqIO.IO_2D(x_scaled, cf.fs)
+        elif(cf.device == 'adwin'):
+            adw = InstrumentImporter.adwinIO.initInstrument()
+            output = InstrumentImporter.adwinIO.IO_2D(adw, x_scaled, cf.fs)
+        else:
+            print('Specify measurement device as either adwin or nidaq')
+        outputs[avgIndex] = np.asarray(output)
+    return outputs
+
+def score(j, outputs):
+    '''Fitness of each measurement of genome j; runs in a worker thread.'''
+    return np.array([cf.Fitness(cf.amplification * output, target, w) for output in outputs])
+
 #%% Measurement loop
 
 for i in range(cf.generations):
+    # Map the genes to the control voltages of all genomes
     for j in range(cf.genomes):
-        # Set the DAC voltages
         for k in range(cf.genes-1):
-            controlVoltages[k] = genePool.MapGenes(
+            controlVoltages[j, k] = genePool.MapGenes(
                                     cf.generange[k], genePool.pool[j, k])
-        InstrumentImporter.IVVIrack.setControlVoltages(ivvi, controlVoltages)
-        time.sleep(1)  # Wait after setting DACs
 
-        # Set the input scaling
-        x_scaled = x * genePool.MapGenes(cf.generange[-1], genePool.pool[j, -1])
+    # Set the DAC voltages genome by genome, in the order with the least ramping, and
+    # measure genome j+1 while the fitness of genome j is computed and plotted
+    for j, outputs, fitness in AcquisitionPipeline.pipeline(scheduler.sweep(controlVoltages),
+                                                            measure, score):
+        fitnessTemp[j] = fitness
+
+        # Plot genome
+        PlotBuilder.currentGenomeEvolution(mainFig, genePool.pool[j])
 
-        # Measure cf.fitnessavg times the current configuration
+        # Plot output
         for avgIndex in range(cf.fitnessavg):
-            # Feed input to measurement device
-            if(cf.device == 'nidaq'):
-                output = InstrumentImporter.nidaqIO.IO_2D(x_scaled, cf.fs)
-            elif(cf.device == 'adwin'):
-                adw = InstrumentImporter.adwinIO.initInstrument()
-                output = InstrumentImporter.adwinIO.IO_2D(adw, x_scaled, cf.fs)
-            else:
-                print('Specify measurement device as either adwin or nidaq')
-
-            # Plot genome
-            PlotBuilder.currentGenomeEvolution(mainFig, genePool.pool[j])
-
-            # Train output
-            outputAvg[avgIndex] = cf.amplification * np.asarray(output)  # empty for now, as we have only one output node
-
-            # Calculate fitness
-            fitnessTemp[j, avgIndex]= cf.Fitness(outputAvg[avgIndex],
-                                                     target,
-                                                     w)
-
-            # Plot output
             PlotBuilder.currentOutputEvolution(mainFig,
                                                t,
                                                target,
-                                               output,
+                                               outputs[avgIndex],
                                                j + 1, i + 1,
                                                fitnessTemp[j, avgIndex])
 
-        outputTemp[j] = outputAvg[np.argmin(fitnessTemp[j])]
+        outputTemp[j] = cf.amplification * outputs[np.argmin(fitnessTemp[j])]
 
     genePool.fitness = fitnessTemp.min(1)  # Save fitness
+    # Measured output of the fittest genome, independent of the order of the measurements
+    output = outputTemp[np.argmax(genePool.fitness)] / cf.amplification
 
     # Status print
     print("Generation nr. " + str(i + 1) + " completed")
@@ -123,13 +140,7 @@ for i in range(cf.generations):
                                        w)
 
     # Save generation
-    SaveLib.saveExperiment(saveDirectory,
-                     geneArray = geneArray,
-                     outputArray = outputArray,
-                     fitnessArray = fitnessArray,
-                     t = t,
-                     x = x,
-                     amplified_target = cf.amplification*target)
+    store.flush()
 
     # Evolve to the next generation
     genePool.NextGen()
@@ -34,6 +34,8 @@ class experiment_config(config_class):
         self.electrodes = len(self.voltageGrid)
         self.acqTime = 0.01
         self.samples = 50
+        self.settle_tau = 0.002  # s, settling time of each grid step (see RampScheduler)
+        self.settle_min = 0.01  # s, least wait after each grid step, tune this to avoid transients
 
         # Save settings
         self.filepath = r'D:\data\path\to\your\directory\\'
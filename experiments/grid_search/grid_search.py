@@ -7,6 +7,7 @@ import SkyNEt.modules.SaveLib as SaveLib
 from SkyNEt.intruments import InstrumentImporter
 import time
 from SkyNEt.modules.GridConstructor import gridConstructor as grid
+from SkyNEt.modules.RampScheduler import RampScheduler
 import SkyNEt.experiments.grid_search.config_grid_search as config
 # temporary imports
 import numpy as np
@@ -31,6 +32,8 @@ saveDirectory = SaveLib.createSaveDirectory(cf.filepath, cf.name)
 
 # Initialize instruments
 ivvi = InstrumentImporter.IVVIrack.initInstrument(dac_step = 500, dac_delay = 0.001)
+scheduler = RampScheduler(lambda cv: InstrumentImporter.IVVIrack.setControlVoltages(ivvi, cv),
+                          cf.settle_tau, cf.settle_tolerance, minimum=cf.settle_min)
 
 nr_blocks = len(cf.input1)*len(cf.input2)
 blockSize = int(len(voltages)/nr_blocks)
@@ -39,11 +42,11 @@ assert len(voltages) == blockSize*nr_blocks, 'Nr of gridpoints not divisible by
 for j in range(nr_blocks):
     print('Getting Data for block '+str(j)+'...')
     start_block = time.time()
-    InstrumentImporter.IVVIrack.setControlVoltages(ivvi, voltages[j * blockSize, :])
+    scheduler.set(voltages[j * blockSize, :])
     time.sleep(1)  #extra delay to account for changing the input voltages
-    for i in range(blockSize):
-        IVVIrack.setControlVoltages(ivvi, voltages[j * blockSize + i, :])
-        time.sleep(0.01)  #tune this to avoid transients
+    # The grid changes one electrode by one step between consecutive points, so it is
+    # swept in its own order; the settling time follows from the size of each change
+    for i in scheduler.sweep(voltages[j * blockSize:(j + 1) * blockSize], reorder=False):
         data[j * blockSize + i, -cf.samples:] = InstrumentImporter.nidaqIO.IO(np.zeros(cf.samples), cf.samples/cf.acqTime)
     end_block = time.time()
     print('CV-sweep over one input state took '+str(end_block-start_block)+' sec.')
@@ -27,22 +27,23 @@ def FloatToLong(x, Vmax):
     '''
     Converts float values to integers,
     more specifically this function maps [-10, 10) -> [0, 65536)
+    Returns an int32 array, which can be passed to the FIFOs without copying.
     '''
-    for i in range(len(x)):
-        x[i] = int(np.round((x[i] + Vmax) / (2*Vmax / 65535)))
-    return x
+    return np.round((np.asarray(x) + Vmax) / (2*Vmax / 65535)).astype(np.int32)
 
 def LongToFloat(x, Vmax):
     '''
     Converts integer values to floats,
     more specifically this function maps [0, 65536) -> [-Vmax, Vmax)
     '''
-    if isinstance(x, int):
-        x = 2*Vmax/65536 * x - Vmax
-    else:
-        for i in range(len(x)):
-            x[i] = 2*Vmax/65536 * x[i] - Vmax
-    return x
+    return 2*Vmax/65536 * np.asarray(x) - Vmax
+
+def FifoData(x):
+    '''
+    Zero-copy ctypes view of the int32 array x as expected by SetFifo_Long.
+    x is only copied if it is not a contiguous int32 array already.
+    '''
+    return np.ctypeslib.as_ctypes(np.ascontiguousarray(x, dtype=np.int32))
 
 
 def IO(adw, Input, Fs, inputPorts = [1, 0, 0, 0, 0, 0, 0], highRange = False):
@@ -87,17 +88,16 @@ def IO(adw, Input, Fs, inputPorts = [1, 0, 0, 0, 0, 0, 0], highRange = False):
     if len(Input.shape) == 1:
         Input = Input[np.newaxis,:]
 
-    inputs = Input.copy()
-    InputSize = inputs.shape[1]
-    x = np.zeros((8, InputSize), dtype = int)
+    InputSize = Input.shape[1]
 
-    # Transform all inputs to Long:
-    for i in range(x.shape[0]):
-        if i < inputs.shape[0] :
-            x[i, :] = FloatToLong(list(inputs[i, :]), 10)
-        else:
-            x[i, :] = FloatToLong(list(x[i, :]), 10)
-    outputs = [[], [], [], [], [], [], [], []]  # Eight empty output lists
+    # Transform all inputs to Long, unused ports are kept at 0V:
+    x = FloatToLong(np.zeros((8, InputSize)), 10)
+    x[:Input.shape[0]] = FloatToLong(Input, 10)
+    # Preallocated buffer for the eight read FIFOs, filled in place as the data
+    # comes in; it holds the raw Longs and is converted to floats at the end.
+    # The first datapoint is the additional one read because write lags behind.
+    outputs = np.zeros((8, InputSize + 1))
+    stored = 0  # number of datapoints stored in outputs
     lastWrite = False
 
     try:
@@ -120,11 +120,11 @@ def IO(adw, Input, Fs, inputPorts = [1, 0, 0, 0, 0, 0, 0], highRange = False):
         if(FifoSize <= InputSize):
             for i in range(1, 5):
                 fillSize = adw.Fifo_Empty(i)
-                adw.SetFifo_Long(i, list(x[i-1,:fillSize]), fillSize)
+                adw.SetFifo_Long(i, FifoData(x[i-1, :fillSize]), fillSize)
                 written = fillSize
         else:
             for i in range(1, 5):
-                adw.SetFifo_Long(i, list(x[i-1, :]), InputSize)
+                adw.SetFifo_Long(i, FifoData(x[i-1, :]), InputSize)
                 written = InputSize
                 lastWrite = True
 
@@ -145,26 +145,29 @@ def IO(adw, Input, Fs, inputPorts = [1, 0, 0, 0, 0, 0, 0], highRange = False):
 
             # Read values if read FIFOs are full enough
             if(full > 2000 and not lastWrite):
-                for i in range(5, 13):          # Read ports are 5 to 12
-                    y = adw.GetFifo_Long(i, 2000) 
-                    outputs[i-5] += LongToFloat(list(y), 10) 
-                read += 2000
-
+                count = 2000
             elif(lastWrite):
+                count = full
+            else:
+                count = 0
+
+            if(count > 0):
+                keep = min(count, outputs.shape[1] - stored)
                 for i in range(5, 13):          # Read ports are 5 to 12
-                    y = adw.GetFifo_Long(i, full) 
-                    outputs[i-5] += LongToFloat(list(y), 10) 
-                read += full
+                    y = np.ctypeslib.as_array(adw.GetFifo_Long(i, count))
+                    outputs[i-5, stored:stored + keep] = y[:keep]
+                stored += keep
+                read += count
 
             # Write values if write FIFOs are empty enough
             if(written < InputSize):
                 if(empty > 2000 and written+2000 <= InputSize):
                     for i in range(1, 5):
-                        adw.SetFifo_Long(i, list(x[i-1, written:written + 2000]), 2000)
+                        adw.SetFifo_Long(i, FifoData(x[i-1, written:written + 2000]), 2000)
                     written += 2000
                 elif(empty > 2000):
                     for i in range(1, 5):
-                        adw.SetFifo_Long(i, list(x[i-1, written:]), InputSize-written)
+                        adw.SetFifo_Long(i, FifoData(x[i-1, written:]), InputSize-written)
                     written = InputSize
                     lastWrite = True
                     time.sleep((InputSize - read)/Fs) # If the last values are put in the write memory, wait a bit until they are written
@@ -176,13 +179,8 @@ def IO(adw, Input, Fs, inputPorts = [1, 0, 0, 0, 0, 0, 0], highRange = False):
         print('***', e)
 
     # Prepare outputArray
-    outputArray = np.zeros((sum(inputPorts), InputSize))
-    outputs = np.array(outputs)
-    i = 0
-    for index, val in enumerate(inputPorts):
-        if(val):
-            outputArray[i] = outputs[index, 1:InputSize+1]
-            i += 1
+    ports = np.flatnonzero(inputPorts)
+    outputArray = LongToFloat(outputs[ports, 1:InputSize+1], 10)
 
     return outputArray
 
@@ -22,12 +22,11 @@ def initInstrument(dac_step = 50, dac_delay = 0.01, comport = 'COM3', name = 'iv
 def setControlVoltages(ivvi, controlVoltages):
 	'''
 	Sets voltages on the ivvi rack DACs. controlVoltages is a 1D array or list with
-	values. They will be set sequentially to the DACs, starting at DAC 1.
+	values. They will be set to the DACs, starting at DAC 1.
 	So if len(controlVoltages) = 5, then DAC1 through DAC5 will be used.
+	All changed DACs are set together with one message (see IVVI.set_dacs).
 	'''
-	for i in range(len(controlVoltages)):
-		command = 'ivvi.dac{}({})'.format(i+1,controlVoltages[i])
-		exec(command)
+	ivvi.set_dacs(controlVoltages)
 
 def setControlVoltage(ivvi, controlVoltage, dacNo):
 	'''
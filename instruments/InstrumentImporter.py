@@ -18,8 +18,30 @@ def reset(signum, frame, exit=True):
         - Apply zero signal to the ADwin
         - exits script if exit=True (default)
         '''
+        reset_ivvi()
+
+        try:
+            nidaqIO.reset_device()
+            print('nidaq has been reset')
+        except:
+            print('nidaq not connected to PC, so also not reset')
+
+        try:
+            adw = adwinIO.initInstrument()
+            adwinIO.reset(adw)
+            print('adwin has been reset')
+        except:
+            print('adwin was not initialized, so also not reset')
+
+        if(exit==True):
+            sys.exit()
+
+def reset_ivvi():
+        '''
+        Sets the DACs of the IVVI rack found on COM1-COM5 to zero.
+        '''
         ivvi_found = False
-        reset_ivvi = False
+        ivvi_reset = False
         for i in range(5):
             try:
                 # Check if comport has ivvi by reading serial response
@@ -37,26 +59,10 @@ def reset(signum, frame, exit=True):
                     ivviReset = IVVIrack.initInstrument(name='ivviReset' + str(i+1), comport='COM' + str(i+1))
                     ivviReset.set_dacs_zero()
                     print('ivvi DACs set to zero')
-                    reset_ivvi = True
+                    ivvi_reset = True
             except: pass
-        if not reset_ivvi:    
+        if not ivvi_reset:    
             print('ivvi was not initialized, so also not reset')
-
-        try:
-            nidaqIO.reset_device()
-            print('nidaq has been reset')
-        except:
-            print('nidaq not connected to PC, so also not reset')
-
-        try:
-            adw = adwinIO.initInstrument()
-            adwinIO.reset(adw)
-            print('adwin has been reset')
-        except:
-            print('adwin was not initialized, so also not reset')
-
-        if(exit==True):
-            sys.exit()
 	
 # Set up reset call at ctrl-C
 signal.signal(signal.SIGINT, reset)
@@ -0,0 +1,148 @@
+'''
+Pluggable measurement backends. The backend is selected in the config of the
+experiment with a dictionary, e.g.
+    self.backend = {'backend':'nidaq'}
+    self.backend = {'backend':'simulated', 'path2NN':..., 'noise':0.01, 'latency':0.1}
+and created with get_backend(cf.backend). All backends implement:
+    IO(y, Fs, inputPorts): writes y, a N x M array (N output ports, M datapoints),
+        at sample frequency Fs and returns the P x M array measured on the P
+        used inputPorts, as nidaqIO.IO
+    setControlVoltages(controlVoltages): sets the static control voltages in mV,
+        starting at DAC 1, as IVVIrack.setControlVoltages
+    reset(): sets all voltages to zero
+The hardware modules are only imported by the backend using them, so the simulated
+backend runs without the lab setup (and without the drivers installed).
+'''
+import importlib
+import time
+import numpy as np
+
+
+def get_backend(backend_dict):
+    '''Gets an instance of the backend class determined by backend_dict['backend'].'''
+    if backend_dict['backend'] == 'nidaq':
+        return nidaq(backend_dict)
+    elif backend_dict['backend'] == 'adwin':
+        return adwin(backend_dict)
+    elif backend_dict['backend'] == 'simulated':
+        return simulated(backend_dict)
+    else:
+        raise NotImplementedError(f"Backend {backend_dict['backend']} is not recognized!")
+
+
+#%% Hardware backends
+class ivvi:
+    '''Base of the hardware backends: the control voltages are set on the IVVI rack
+    connected to backend_dict['comport'] (no rack is used if it is not given, but reset
+    still zeroes the DACs of a rack found on the COM ports). Like the scripts importing
+    InstrumentImporter, the hardware backends reset the instruments at ctrl-C.
+    '''
+    def __init__(self, backend_dict):
+        self.InstrumentImporter = importlib.import_module('SkyNEt.instruments.InstrumentImporter')
+        if backend_dict.__contains__('comport'):
+            self.IVVIrack = importlib.import_module('SkyNEt.instruments.DAC.IVVIrack')
+            self.ivvi = self.IVVIrack.initInstrument(comport=backend_dict['comport'])
+        else:
+            self.ivvi = None
+
+    def setControlVoltages(self, controlVoltages):
+        assert self.ivvi is not None, 'No IVVI rack initialized, specify its comport in the backend'
+        self.IVVIrack.setControlVoltages(self.ivvi, controlVoltages)
+
+    def reset(self):
+        if self.ivvi is not None:
+            self.ivvi.set_dacs_zero()
+        else:
+            self.InstrumentImporter.reset_ivvi()
+
+
+class nidaq(ivvi):
+    '''Measures with the NI USB 6216 (nidaqIO.IO) or, if backend_dict['cDAQ'] is True,
+    writes with the NI 9264 in the cDAQ chassis (nidaqIO.IO_cDAQ).
+    '''
+    def __init__(self, backend_dict):
+        super().__init__(backend_dict)
+        self.nidaqIO = importlib.import_module('SkyNEt.instruments.niDAQ.nidaqIO')
+        if backend_dict.__contains__('cDAQ') and backend_dict['cDAQ']:
+            self._IO = self.nidaqIO.IO_cDAQ
+        else:
+            self._IO = self.nidaqIO.IO
+
+    def IO(self, y, Fs, inputPorts=[1, 0, 0, 0, 0, 0, 0]):
+        return self._IO(y, Fs, inputPorts=inputPorts)
+
+    def reset(self):
+        super().reset()
+        # reset_device also resets the cDAQ, which is not in every setup
+        try:
+            self.nidaqIO.reset_device()
+            print('nidaq has been reset')
+        except:
+            print('nidaq not connected to PC, so also not reset')
+
+
+class adwin(ivvi):
+    '''Measures with the ADwin (adwinIO.IO).'''
+    def __init__(self, backend_dict):
+        super().__init__(backend_dict)
+        self.adwinIO = importlib.import_module('SkyNEt.instruments.ADwin.adwinIO')
+        self.adw = self.adwinIO.initInstrument()
+
+    def IO(self, y, Fs, inputPorts=[1, 0, 0, 0, 0, 0, 0]):
+        return self.adwinIO.IO(self.adw, y, Fs, inputPorts=inputPorts)
+
+    def reset(self):
+        super().reset()
+        self.adwinIO.reset(self.adw)
+
+
+#%% Simulated backend
+class simulated:
+    '''Simulated device: a staNNet surrogate loaded from backend_dict['path2NN'] takes
+    the place of the device, the DAQ and the IVVI rack. The output ports of IO drive the
+    NN inputs in backend_dict['ao_indx'] and the DACs drive the NN inputs in
+    backend_dict['dac_indx']. Every used input port reads the output of the NN model
+    without the amplification, i.e. in the units of the signal measured by the DAQ.
+    Optional keys:
+        noise: std of the gaussian noise added to the measured data (default 0)
+        latency: overhead in seconds of every IO call (default 0)
+        realtime: if True, IO also takes the M/Fs seconds of the measurement (default False)
+    '''
+    def __init__(self, backend_dict):
+        self.torch = importlib.import_module('torch')
+        self.Accelerator = importlib.import_module('SkyNEt.config.acceleration').Accelerator
+        staNNet = importlib.import_module('SkyNEt.modules.Nets.staNNet').staNNet
+        self.net = staNNet(backend_dict['path2NN'])
+        self.ao_indx = backend_dict['ao_indx']
+        self.dac_indx = backend_dict['dac_indx']
+        self.noise = backend_dict['noise'] if backend_dict.__contains__('noise') else 0.
+        self.latency = backend_dict['latency'] if backend_dict.__contains__('latency') else 0.
+        self.realtime = backend_dict['realtime'] if backend_dict.__contains__('realtime') else False
+        # Voltages on the NN inputs (in V) held between IO calls
+        self.electrodes = np.zeros(len(self.net.info['amplitude']))
+
+    def IO(self, y, Fs, inputPorts=[1, 0, 0, 0, 0, 0, 0]):
+        start = time.time()
+        y = np.asarray(y)
+        if len(y.shape) == 1:
+            y = y[np.newaxis,:]
+        assert y.shape[0] <= len(self.ao_indx), f'Only {len(self.ao_indx)} output ports are simulated'
+
+        inputs = np.tile(self.electrodes, (y.shape[1], 1))
+        inputs[:, self.ao_indx[:y.shape[0]]] = y.T
+        with self.torch.no_grad():
+            output = self.net.model(self.Accelerator.format_numpy(inputs)).cpu().numpy()[:,0]
+        data = np.tile(output, (sum(inputPorts), 1))
+        if self.noise > 0:
+            data += self.noise * np.random.randn(*data.shape)
+
+        # Emulate the time spent on the measurement
+        duration = self.latency + (y.shape[1]/Fs if self.realtime else 0.)
+        time.sleep(max(0., duration - (time.time() - start)))
+        return data
+
+    def setControlVoltages(self, controlVoltages):
+        self.electrodes[self.dac_indx[:len(controlVoltages)]] = np.asarray(controlVoltages)/1000
+
+    def reset(self):
+        self.electrodes[:] = 0
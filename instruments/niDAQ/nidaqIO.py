@@ -5,6 +5,8 @@ NI USB 6216. (Note that nidaqmx has to be installed seperately first.)
 import SkyNEt.instruments.niDAQ.nidaqmx as nidaqmx
 import SkyNEt.instruments.niDAQ.nidaqmx.constants as constants
 import SkyNEt.instruments.niDAQ.nidaqmx.system.device as device
+import SkyNEt.instruments.niDAQ.nidaqmx.stream_readers as stream_readers
+import SkyNEt.instruments.niDAQ.nidaqmx.stream_writers as stream_writers
 from SkyNEt.instruments import InstrumentImporter
 import numpy as np
 import math
@@ -181,4 +183,145 @@ def IO_cDAQ(y, Fs, inputPorts = [1, 0, 0, 0, 0, 0, 0]):
         input_task.stop()     
         output_task.stop()
 
-    return data
\ No newline at end of file
+    return data
+
+
+class StreamSession(object):
+    '''
+    Persistent continuous-mode session with the NI USB 6216. The ao/ai tasks are
+    created once and a long measurement is streamed through them in blocks, so
+    there is no task setup between batches and the voltages only need to be ramped
+    at the start and at the end of the whole stream instead of around every batch.
+    The DAQ output buffer holds two blocks (double buffering): while one block is
+    generated the next one is already written, and the measured blocks are read
+    into two preallocated arrays which are used alternately.
+
+    Usage:
+        with StreamSession(Fs, n_ao=2, block_size=10000) as session:
+            for data in session.stream(blocks):
+                ...
+
+    Input arguments
+    ---------------
+    Fs: sample frequency
+    n_ao: number of output ports
+    inputPorts: binary list containing ones for the used input ports
+    block_size: number of datapoints per block
+    highRange: if False, blocks exceeding [-2, 2]V abort the stream
+    '''
+
+    def __init__(self, Fs, n_ao=1, inputPorts=[1, 0, 0, 0, 0, 0, 0], block_size=10000, highRange=False):
+        self.Fs = Fs
+        self.n_ao = n_ao
+        self.n_ai = sum(inputPorts)
+        self.block_size = block_size
+        self.highRange = highRange
+        self.timeout = block_size/Fs + 1
+
+        self.output_task = nidaqmx.Task()
+        self.input_task = nidaqmx.Task()
+        # Define ao/ai channels
+        for i in range(n_ao):
+            self.output_task.ao_channels.add_ao_voltage_chan('Dev1/ao'+str(i)+'', 'ao'+str(i)+'', -5, 5)
+        for i in range(len(inputPorts)):
+            if(inputPorts[i] == 1):
+                self.input_task.ai_channels.add_ai_voltage_chan('Dev1/ai'+str(i)+'')
+
+        # Configure sample rate and set acquisition mode to continuous; the input
+        # buffer is larger to give the consumer of the blocks some slack
+        self.output_task.timing.cfg_samp_clk_timing(Fs, sample_mode=constants.AcquisitionType.CONTINUOUS, samps_per_chan = 2*block_size)
+        self.input_task.timing.cfg_samp_clk_timing(Fs, sample_mode=constants.AcquisitionType.CONTINUOUS, samps_per_chan = 8*block_size)
+        # Never generate old samples again, the output waits for the next block
+        self.output_task.out_stream.regen_mode = constants.RegenerationMode.DONT_ALLOW_REGENERATION
+
+        # Output triggers on the read operation
+        self.output_task.triggers.start_trigger.cfg_dig_edge_start_trig('/Dev1/ai/StartTrigger')
+
+        self.writer = stream_writers.AnalogMultiChannelWriter(self.output_task.out_stream, auto_start=False)
+        self.reader = stream_readers.AnalogMultiChannelReader(self.input_task.in_stream)
+
+        # Preallocated buffers
+        self._write_buffer = np.zeros((n_ao, block_size))
+        self._read_buffers = np.zeros((2, self.n_ai, block_size))
+        self._lag_buffer = np.zeros((self.n_ai, 1))
+
+    def stream(self, blocks):
+        '''
+        Generator which writes the blocks and yields the measured data of each block.
+        blocks is an iterable (e.g. a generator) of N x M arrays, N output ports and
+        M <= block_size datapoints; a shorter block holds its last value until the
+        end of the block. The yielded P x M arrays (P input ports) are views of the
+        read buffers: they are overwritten two blocks later, so copy them if they
+        have to be kept.
+        '''
+        blocks = iter(blocks)
+        self._exhausted = False
+        self._write_buffer[:] = 0
+        try:
+            lengths = [self._write_next(blocks), self._write_next(blocks)]
+
+            # Start tasks
+            self.output_task.start()
+            self.input_task.start()
+            # Trim off the first datapoint, read lags one sample behind write
+            self.reader.read_many_sample(self._lag_buffer, 1, self.timeout)
+
+            nr = 0
+            while lengths[0] is not None:
+                data = self._read_buffers[nr % 2]
+                self.reader.read_many_sample(data, self.block_size, self.timeout)
+                # Keep the output buffer filled while the consumer handles the data
+                lengths.append(self._write_next(blocks))
+                nr += 1
+                yield data[:, :lengths.pop(0)]
+        finally:
+            # Stop the tasks, they are kept for the next stream
+            self.input_task.stop()
+            self.output_task.stop()
+
+    def run(self, blocks, callback):
+        '''Streams the blocks and calls callback(data) with the data of each block.'''
+        for data in self.stream(blocks):
+            callback(data)
+
+    def _write_next(self, blocks):
+        '''
+        Writes the next block to the output buffer and returns its length. When
+        the blocks are exhausted (or a block is rejected) the last voltages are
+        held and None is returned.
+        '''
+        block = None if self._exhausted else next(blocks, None)
+        if block is not None:
+            block = np.asarray(block, dtype=float)
+            if len(block.shape) == 1:
+                block = block[np.newaxis,:]
+            assert block.shape[0] == self.n_ao and block.shape[1] <= self.block_size, \
+                f'Blocks must have {self.n_ao} rows and at most {self.block_size} datapoints, got {block.shape}'
+            # Sanity check on input voltages
+            if not self.highRange and np.max(abs(block)) > 2:
+                print('WARNING: input voltages exceed threshold of 2V: highest absolute voltage is ' + str(np.max(abs(block))))
+                print('If you want to use high range voltages, set highRange to True.')
+                print('Aborting stream...')
+                block = None
+
+        if block is None:
+            self._exhausted = True
+            self._write_buffer[:] = self._write_buffer[:, -1:]
+            self.writer.write_many_sample(self._write_buffer, self.timeout)
+            return None
+
+        length = block.shape[1]
+        self._write_buffer[:, :length] = block
+        self._write_buffer[:, length:] = block[:, -1:]
+        self.writer.write_many_sample(self._write_buffer, self.timeout)
+        return length
+
+    def close(self):
+        self.output_task.close()
+        self.input_task.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Overlaps the measurements on the chip with the processing of their results.
+The instruments are driven by a single acquisition thread that measures the
+items (e.g. the genomes given by RampScheduler.sweep) one after the other, while
+the results of the previous items are scored by worker threads and handed to
+the caller, e.g. for plotting and saving:
+
+    for j, output, fitness in pipeline(scheduler.sweep(controlVoltages), measure, score):
+        PlotBuilder...  # runs while genome j+1 is measured
+
+The results are yielded in the order the items were measured. The acquisition
+runs at most depth items ahead of the caller (a bounded queue), so the memory
+used is bounded and an error in the caller stops the measurements. Only the
+acquisition thread talks to the instruments and plotting stays in the thread of
+the caller, as matplotlib requires.
+"""
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+_DONE = object()
+
+
+def pipeline(items, measure, process=None, depth=2, workers=1):
+    '''Generator measuring the items in a background thread and yielding
+    (item, data, result) in order, where data = measure(item) and
+    result = process(item, data) is computed by workers threads (None if no
+    process is given). Iterating items is part of the acquisition, so a
+    RampScheduler.sweep sets the voltages in the acquisition thread.
+    An exception in the acquisition is raised in the caller.
+    '''
+    assert depth >= 1, 'The acquisition must be able to run at least one item ahead'
+    results = queue.Queue(depth)
+    stop = threading.Event()
+    errors = []
+    executor = ThreadPoolExecutor(workers) if process is not None else None
+
+    def acquire():
+        try:
+            for item in items:
+                if stop.is_set():
+                    break
+                data = measure(item)
+                result = executor.submit(process, item, data) if executor is not None else None
+                results.put((item, data, result))
+        except Exception as error:
+            errors.append(error)
+        finally:
+            results.put(_DONE)
+
+    acquisition = threading.Thread(target=acquire, daemon=True)
+    acquisition.start()
+    try:
+        while True:
+            entry = results.get()
+            if entry is _DONE:
+                break
+            item, data, result = entry
+            yield item, data, result.result() if result is not None else None
+        if errors:
+            raise errors[0]
+    finally:
+        # stop the acquisition if the caller stops iterating or fails
+        stop.set()
+        while acquisition.is_alive():
+            try:
+                results.get(timeout=0.01)
+            except queue.Empty:
+                pass
+        if executor is not None:
+            executor.shutdown()
@@ -58,6 +58,40 @@ def perceptron(wvfrm,target,tolerance=0.01,max_iter=200):
         
     return accuracy, weights, predicted
 
+def linear_separability(wvfrms,target):
+    '''Vectorized alternative to the perceptron for 1-D outputs of many genomes.
+    For a single output a linear classifier is a threshold, so the best one is found
+    in closed form by scanning all cuts of the sorted (normalized) outputs.
+    Assumes wvfrms has shape (genomes,n_total) and the binary target shape (n_total,);
+    the samples above the threshold are classified as 1.
+    Returns the accuracy (genomes,), the weights (genomes,2) with the convention of the
+    perceptron, i.e. predict 1 if np.dot([1,x],w)<0, and the predictions (genomes,n_total).
+    '''
+    genomes, n_total = wvfrms.shape
+    std = np.std(wvfrms,axis=1,keepdims=True)
+    std[std==0] = 1.
+    wvfrm = (wvfrms-np.mean(wvfrms,axis=1,keepdims=True))/std
+    order = np.argsort(wvfrm,axis=1)
+    sorted_wvfrm = np.take_along_axis(wvfrm,order,axis=1)
+    sorted_target = (np.asarray(target).ravel()==1)[order]
+    
+    # Correct predictions when the cut k puts the first k sorted samples in class 0
+    zeros_below = np.zeros((genomes,n_total+1))
+    zeros_below[:,1:] = np.cumsum(~sorted_target,axis=1)
+    ones_below = np.zeros((genomes,n_total+1))
+    ones_below[:,1:] = np.cumsum(sorted_target,axis=1)
+    n_correct = zeros_below + ones_below[:,-1:] - ones_below
+    # A cut between two equal values cannot be realized by a threshold
+    n_correct[:,1:-1][sorted_wvfrm[:,1:]==sorted_wvfrm[:,:-1]] = -1
+    cut = np.argmax(n_correct,axis=1)
+    accuracy = n_correct[np.arange(genomes),cut]/n_total
+    
+    padded = np.concatenate([sorted_wvfrm[:,:1]-1,sorted_wvfrm,sorted_wvfrm[:,-1:]+1],axis=1)
+    threshold = 0.5*(padded[np.arange(genomes),cut] + padded[np.arange(genomes),cut+1])
+    weights = np.stack([threshold,-np.ones(genomes)],axis=1)
+    predicted = (wvfrm > threshold[:,np.newaxis]).astype(float)
+    return accuracy, weights, predicted
+
 if __name__=='__main__':
     
     #XOR as target
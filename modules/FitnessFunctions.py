@@ -2,77 +2,77 @@
 """
 Created on Wed Aug 21 13:14:52 2019
 
+All fitness functions take the full output pool of shape (genomes, samples)
+and the target of shape (samples,) and return a numpy array with the score
+of each genome. They are registered with the @register decorator, so
+Grabber.get_fitness finds them by name.
+
 @author: HCRuiz
 """
 import numpy as np
-from SkyNEt.modules.Classifiers import perceptron 
+from SkyNEt.modules.Classifiers import linear_separability
 
 #TODO: implement corr_lin_fit (AF's last fitness function)?
 
-#%% Accuracy of a perceptron as fitness: meanures separability 
+#%% Registry of fitness functions available in Grabber.get_fitness
+fitness_registry = {}
+
+def register(func):
+    '''Adds the fitness function to fitness_registry under its own name.'''
+    fitness_registry[func.__name__] = func
+    return func
+
+#%% Accuracy of the best linear (threshold) classifier as fitness: measures separability
+@register
 def accuracy_fit(outputpool, target, clipvalue=np.inf):
-    genomes = len(outputpool)
-    fitpool = np.zeros(genomes)
-    for j in range(genomes):
-        output = outputpool[j]
-    
-        if np.any(np.abs(output)>clipvalue):
-            acc = 0
-            print(f'Clipped at {clipvalue} nA')
-        else:
-            x = output[:,np.newaxis]
-            y = target[:,np.newaxis]
-            acc, _, _ = perceptron(x,y)
-            
-        fitpool[j] = acc
+    fitpool, _, _ = linear_separability(outputpool, target)
+    fitpool[clipped_genomes(outputpool, clipvalue)] = 0
     return fitpool
 
 #%% Correlation between output and target: measures similarity
+@register
 def corr_fit(outputpool, target, clipvalue=np.inf):
-    genomes = len(outputpool)
-    fitpool = np.zeros(genomes)
-    for j in range(genomes):
-        output = outputpool[j]
-        if np.any(np.abs(output)>clipvalue):
-            print(f'Clipped at {clipvalue} nA')
-            corr = -1
-        else:
-            x = output[:,np.newaxis]
-            y = target[:,np.newaxis]
-            X = np.stack((x, y), axis=0)[:,:,0]
-            corr = np.corrcoef(X)[0,1]
-            
-        fitpool[j] = corr
-    return fitpool
+    corr = batch_corr(outputpool, target)
+    corr[clipped_genomes(outputpool, clipvalue)] = -1
+    return corr
 
-#%% Combination of a sigmoid with pre-defined separation threshold (2.5 nA) and 
-#the correlation function. The sigmoid can be adapted by changing the function 'sig( , x)'        
+#%% Combination of a sigmoid with pre-defined separation threshold (2.5 nA) and
+#the correlation function. The sigmoid can be adapted by changing the function 'sig( , x)'
+@register
 def corrsig_fit(outputpool, target, clipvalue=np.inf):
-    
-    genomes = len(outputpool)
-    fitpool = np.zeros(genomes)
-    for j in range(genomes):
-        output = outputpool[j]
-        if np.any(np.abs(output)>clipvalue):
-            print(f'Clipped at {clipvalue} nA')
-            fit = -100
-        else:
-            buff0 = target == 0
-            buff1 = target == 1
-            max_0 = np.max(output[buff0])
-            min_1 = np.min(output[buff1])
-            sep = min_1 - max_0
-            x = output[:,np.newaxis]
-            y = target[:,np.newaxis]
-            X = np.stack((x, y), axis=0)[:,:,0]
-            corr = np.corrcoef(X)[0,1]
-            if sep >= 0: 
-                fit = sig(sep) * corr
-            else:
-                fit = sig(sep) * corr * 0.01
-        fitpool[j] = fit   
+    corr = batch_corr(outputpool, target)
+    sep = batch_sep(outputpool, target)
+    fitpool = sig(sep) * corr
+    fitpool[sep < 0] *= 0.01
+    fitpool[clipped_genomes(outputpool, clipvalue)] = -100
     return fitpool
 
-#Sigmoid function. 
+#Sigmoid function.
 def sig(sep):
     return 1/(1+np.exp(-5*(sep/2.5-0.5)))+ 0.1
+
+#%% Vectorized helpers acting on the whole output pool at once
+def batch_corr(outputpool, target):
+    '''Pearson correlation of each row of outputpool (genomes, samples) with
+    the target (samples,). Constant outputs give nan as in np.corrcoef.
+    '''
+    x = outputpool - np.mean(outputpool, axis=1, keepdims=True)
+    y = target - np.mean(target)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = np.dot(x, y) / (np.linalg.norm(x, axis=1) * np.linalg.norm(y))
+    return np.clip(corr, -1, 1)
+
+def batch_sep(outputpool, target):
+    '''Separation between the lowest output where target==1 and the highest
+    output where target==0, for each genome in outputpool.
+    '''
+    max_0 = np.max(outputpool[:, target == 0], axis=1)
+    min_1 = np.min(outputpool[:, target == 1], axis=1)
+    return min_1 - max_0
+
+def clipped_genomes(outputpool, clipvalue):
+    '''Boolean mask of the genomes whose output exceeds the clipvalue.'''
+    clipped = np.any(np.abs(outputpool) > clipvalue, axis=1)
+    if np.any(clipped):
+        print(f'{np.sum(clipped)} genomes clipped at {clipvalue} nA')
+    return clipped
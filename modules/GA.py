@@ -7,13 +7,17 @@ Created on Thu May 16 18:16:36 2019
 import numpy as np
 import time
 import random 
+import multiprocessing as mp
+from concurrent import futures
 #import pdb
 #import logging
 #import sys
 from SkyNEt.modules.GenWaveform import GenWaveform 
 import SkyNEt.modules.Grabber as Grabber
-from SkyNEt.modules.Classifiers import perceptron
+from SkyNEt.modules.Classifiers import linear_separability
+from SkyNEt.modules.FitnessFunctions import batch_corr
 from SkyNEt.modules.Observers import God as Savior
+from SkyNEt.modules.Observers import Migrator
 #TODO: Implement Plotter
 class GA:
     '''This is a class implementing the genetic algorithm (GA).
@@ -30,6 +34,8 @@ class GA:
       - genomes : number of individuals in the population
       - partition : a list with the partition for the different operations on the population
       - mutation_rate : rate of mutation applied to genes
+      - (optional) fitnessavg : as in the experiment configs; if > 1 the genomes are meant
+        to be re-evaluated, so the outputs of the platform are not cached (see Grabber.get_platform)
       - Arguments for GenWaveform:
           o lengths : defines the input lengths (in ms) of the targets
           o slopes : defines the slopes (in ms) between targets
@@ -59,7 +65,8 @@ class GA:
         self.platform = config_dict['platform']     # Dictionary containing all variables for the platform
         self.fitness_function = config_dict['fitness'] # String determining fitness funtion
         #Define platform and fitness function from Grabber
-        self.Platform = Grabber.get_platform(self.platform)
+        self.fitnessavg = config_dict['fitnessavg'] if config_dict.__contains__('fitnessavg') else 1
+        self.Platform = Grabber.get_platform(self.platform, fitnessavg=self.fitnessavg)
         self.Fitness = Grabber.get_fitness(self.fitness_function)
         
         # Internal parameters and variables
@@ -101,24 +108,7 @@ class GA:
                  dirname = 'TEST',
                  seed=None):
         
-        assert len(inputs[0]) == len(targets), f'No. of input data {len(inputs)} does not match no. of targets {len(targets)}'
-        np.random.seed(seed=seed)
-        
-        self.generations = epochs
-        # Initialize target
-        self.target_wfm = self.waveform(targets)
-        # Initialize target
-        self.inputs_wfm, self.filter_array = self.input_waveform(inputs)
-        # Generate filepath and filename for saving
-        self.savepath = savepath
-        self.dirname = dirname
-        #reset placeholder arrays and filepath in saviour
-        self.savior.reset()
-        
-        self.pool = np.zeros((self.genomes, self.genes))
-        self.opposite_pool = np.zeros((self.genomes, self.genes))
-        for i in range(0,self.genes):
-            self.pool[:,i] = np.random.uniform(self.generange[i][0], self.generange[i][1], size=(self.genomes,))
+        self.initialize(inputs, targets, epochs, savepath, dirname, seed)
         
         #Evolution loop
         for gen in range(self.generations):
@@ -127,7 +117,7 @@ class GA:
             self.outputs = self.Platform.evaluatePopulation(self.inputs_wfm,
                                                   self.pool, 
                                                   self.target_wfm)
-            self.fitness = self.Fitness(self.outputs, self.target_wfm)
+            self.fitness = self.Score(self.outputs)
             #-----------------------------------------------------------------#
             # Status print
             max_fit = max(self.fitness)
@@ -146,7 +136,31 @@ class GA:
             #Evolve to the next generation
             self.NextGen(gen)
                         
-        #Get best results
+        return self.best_solution()
+    
+    def initialize(self, inputs, targets, epochs, savepath, dirname, seed):
+        '''Sets the waveforms, the save directory and the random initial pool.'''
+        assert len(inputs[0]) == len(targets), f'No. of input data {len(inputs)} does not match no. of targets {len(targets)}'
+        np.random.seed(seed=seed)
+        
+        self.generations = epochs
+        # Initialize target
+        self.target_wfm = self.waveform(targets)
+        # Initialize target
+        self.inputs_wfm, self.filter_array = self.input_waveform(inputs)
+        # Generate filepath and filename for saving
+        self.savepath = savepath
+        self.dirname = dirname
+        #reset placeholder arrays and filepath in saviour
+        self.savior.reset()
+        
+        self.pool = np.zeros((self.genomes, self.genes))
+        self.opposite_pool = np.zeros((self.genomes, self.genes))
+        for i in range(0,self.genes):
+            self.pool[:,i] = np.random.uniform(self.generange[i][0], self.generange[i][1], size=(self.genomes,))
+    
+    def best_solution(self):
+        '''Prints and returns the best genome found, its output, fitness and accuracy.'''
         max_fitness, best_genome, best_output = self.savior.judge()
 #        print(best_output.shape,self.target_wfm.shape)
         best_corr = self.corr(best_output)
@@ -154,9 +168,9 @@ class GA:
         print('Fitness: ', max_fitness)
         print('Correlation: ', best_corr)
         print(f'Genome:\n {best_genome}')
-        y = best_output[self.filter_array][:,np.newaxis]
-        trgt = self.target_wfm[self.filter_array][:,np.newaxis]
-        accuracy, _, _ = perceptron(y,trgt)
+        y = best_output[self.filter_array][np.newaxis,:]
+        trgt = self.target_wfm[self.filter_array]
+        accuracy = linear_separability(y,trgt)[0][0]
         print('Accuracy: ', accuracy)
         print('===============================================================')
         return best_genome, best_output, max_fitness, accuracy
@@ -172,21 +186,16 @@ class GA:
         self.newpool = self.pool.copy()
         # Determine which genomes are chosen to generate offspring 
         # Note: twice as much parents are selected as there are genomes to be generated
-        chosen = self.Universal_sampling()
+        chosen = self.Universal_sampling().reshape(-1,2)
         # Generate offspring by means of crossover. 
-        # The crossover method returns 1 genome from 2 parents       
-        for i in range(0,len(chosen),2):
-            index_newpool = int(i/2 +sum(self.partition[:1]))
-            if chosen[i] == chosen[i+1]:
-                if chosen[i] == 0: 
-                    chosen[i] = chosen[i] + 1 
-                else: 
-                    chosen[i] = chosen[i] - 1 
-            #The individual with the highest fitness score is given as input first
-            if chosen[i] < chosen[i+1]:
-                self.newpool[index_newpool,:] = self.Crossover_BLXab(self.pool[chosen[i],:], self.pool[chosen[i+1],:])
-            else:
-                self.newpool[index_newpool,:] = self.Crossover_BLXab(self.pool[chosen[i+1],:], self.pool[chosen[i],:])
+        # The crossover method returns 1 genome from 2 parents, for all pairs at once
+        same = chosen[:,0] == chosen[:,1]
+        chosen[same,0] = np.where(chosen[same,0] == 0, 1, chosen[same,0] - 1)
+        #The individual with the highest fitness score is given as input first
+        fitter = np.min(chosen, axis=1)
+        weaker = np.max(chosen, axis=1)
+        start = self.partition[0]
+        self.newpool[start:start+len(chosen)] = self.Crossover_BLXab(self.pool[fitter], self.pool[weaker])
         # The mutation rate is updated based on the generation counter     
         self.UpdateMutation(gen)
         # Every genome, except the partition[0] genomes are mutated 
@@ -204,23 +213,14 @@ class GA:
         Sampling method: Stochastic universal sampling returns the chosen 'parents' 
         '''
         no_genomes = 2 * self.partition[1]    
-        chosen = []
-        probabilities = self.Linear_rank()
-        for i in range(1, len(self.fitness)):
-            probabilities[i] = probabilities[i] + probabilities[i-1]
+        probabilities = np.cumsum(self.Linear_rank())
         distance = 1/(no_genomes)
         start = random.random() * distance
-        for n in range(no_genomes):
-            pointer = start+n*distance
-            for i in range(len(self.fitness)):
-                if pointer < probabilities[0]:
-                    chosen.append(0)
-                    break 
-                elif pointer< probabilities[i] and pointer >= probabilities[i-1]:
-                    chosen.append(i)
-                    break 
-        chosen = random.sample(chosen, len(chosen))    
-        return chosen
+        pointers = start + distance*np.arange(no_genomes)
+        # Genome i is chosen for each pointer in [probabilities[i-1], probabilities[i])
+        chosen = np.searchsorted(probabilities, pointers, side='right')
+        chosen = np.minimum(chosen, len(probabilities)-1)
+        return np.random.permutation(chosen)
      
     
     def Linear_rank(self):
@@ -241,7 +241,9 @@ class GA:
     def Crossover_BLXab(self, parent1, parent2):
         '''
         Crossover method: Blend alpha beta crossover returns a new genome (voltage combination)
-        from two parents. Here, parent 1 has a higher fitness than parent 2
+        from two parents. Here, parent 1 has a higher fitness than parent 2.
+        The parents can also be arrays of shape (pairs, genes) to generate one 
+        offspring for each pair.
         '''
         
         alpha = 0.6
@@ -249,18 +251,12 @@ class GA:
         maximum = np.maximum(parent1, parent2)
         minimum = np.minimum(parent1, parent2)
         I = (maximum - minimum) 
-        offspring= np.zeros((parent1.shape))
-        for i in range(len(parent1)):
-            if parent1[i] > parent2[i]:
-                offspring[i] = np.random.uniform(minimum[i]-I[i]*beta, maximum[i]+I[i]*alpha)
-            else: 
-                offspring[i] = np.random.uniform(minimum[i] - I[i]*alpha, maximum[i]+I[i]*beta)
-        for i in range(0,self.genes):
-            if offspring[i] < self.generange[i][0]: 
-                offspring[i] = self.generange[i][0]
-            if offspring[i]  > self.generange[i][1]: 
-                offspring[i] = self.generange[i][1]
-        return offspring
+        # The interval is extended by alpha*I on the side of the fitter parent
+        lower = np.where(parent1 > parent2, minimum - I*beta, minimum - I*alpha)
+        upper = np.where(parent1 > parent2, maximum + I*alpha, maximum + I*beta)
+        offspring = np.random.uniform(lower, upper)
+        generange = np.asarray(self.generange)
+        return np.clip(offspring, generange[:,0], generange[:,1])
     
     
  #------------------------------------------------------------------------------    
@@ -283,15 +279,22 @@ class GA:
         np.random.seed(seed=None)
         mask = np.random.choice([0, 1], size=self.pool[self.partition[0]:].shape, 
                                 p=[1-self.mutationrate, self.mutationrate])
-        mutatedpool = np.zeros((self.genomes-self.partition[0], self.genes))
-    
-        for i in range(0,self.genes):
-            if self.generange[i][0] == self.generange[i][1]:
-                mutatedpool[:,i] = self.generange[i][0]*np.ones(mutatedpool[:,i].shape)
-            else:
-                mutatedpool[:,i] = np.random.triangular(self.generange[i][0], self.newpool[self.partition[0]:,i], self.generange[i][1])
+        mutatedpool = self.Triangular(self.newpool[self.partition[0]:])
         self.newpool[self.partition[0]:] = ((np.ones(self.newpool[self.partition[0]:].shape) - mask)*self.newpool[self.partition[0]:]  + mask * mutatedpool)
     
+    def Triangular(self, genomes):
+        '''
+        Draws new genes from a triangular distribution in generange with 
+        mode=current gene, for an array of genomes of shape (nr-genomes, genes).
+        Genes with a fixed range are set to that value.
+        '''
+        low, high = np.asarray(self.generange, dtype=float).T
+        fixed = low == high
+        # np.random.triangular needs low < high, the fixed genes are overwritten below
+        mutated = np.random.triangular(low, np.clip(genomes, low, high), np.where(fixed, low + 1, high),
+                                       size=genomes.shape)
+        return np.where(fixed, low, mutated)
+    
     
   #------------------------------------------------------------------------------   
      
@@ -299,16 +302,14 @@ class GA:
         np.random.seed(seed=None)
         '''
         Check the entire pool for any duplicate genomes and replace them by 
-        the genome put through a triangular distribution
+        the genome put through a triangular distribution. The first occurrence
+        of each genome is kept.
         '''
-        for i in range(self.genomes):
-            for j in range(self.genomes):
-                if(j != i and np.array_equal(self.newpool[i],self.newpool[j])):
-                    for k in range(0,self.genes):
-                        if self.generange[k][0] != self.generange[k][1]:
-                            self.newpool[j][k] = np.random.triangular(self.generange[k][0], self.newpool[j][k], self.generange[k][1])
-                        else: 
-                            self.newpool[j][k] = self.generange[k][0]
+        _, first = np.unique(self.newpool, axis=0, return_index=True)
+        duplicates = np.ones(self.genomes, dtype=bool)
+        duplicates[first] = False
+        if np.any(duplicates):
+            self.newpool[duplicates] = self.Triangular(self.newpool[duplicates])
                             
                         
 #------------------------------------------------------------------------------
@@ -334,6 +335,14 @@ class GA:
     ########### Helper Methods ######################
     #################################################
     
+    def Score(self, outputs):
+        '''Fitness of the outputs of the last evaluation, minus the uncertainty penalty of the
+        genomes that the platform only evaluated with a surrogate (see Platforms.chip).'''
+        fitness = self.Fitness(outputs, self.target_wfm)
+        if getattr(self.Platform, 'penalty', None) is not None:
+            fitness = fitness - self.Platform.penalty
+        return fitness
+    
     def StopCondition(self, max_fit):
         best = self.outputs[self.fitness==max_fit][0]
         corr = self.corr(best)
@@ -369,6 +378,208 @@ class GA:
         
         return inputs_wvfrm, bool_weights#, time_arr
     
+#%% Steady-state model
+class SteadyStateGA(GA):
+    '''Asynchronous steady-state GA: instead of waiting for a whole generation, a new
+    genome is bred as soon as an evaluation finishes, and its result replaces the worst
+    genome of the population. With platform_dict['workers'] > 1 the platform is wrapped
+    in Platforms.parallel and workers genomes are evaluated concurrently, so fast workers
+    never wait for the slowest one (e.g. simulated chips, nn or KMC workers with uneven 
+    run time); otherwise the genomes are evaluated one by one. All workers of a chip 
+    platform measure with the same backend, so they only run concurrently on simulated 
+    devices.
+    The parents of a new genome are drawn with the linear ranking of GA among the evaluated
+    genomes, recombined with Crossover_BLXab and each gene is mutated with probability 
+    mutationrate (Triangular), so the first partition is not protected from mutation 
+    but the fittest genomes stay in the population until something better replaces them.
+    The number of evaluations is epochs*genomes as in GA. Every genomes evaluations count
+    as a generation: the current population is passed to the observers (saved by God, so 
+    the results have the same format as GA) and the stop condition is checked. The first
+    generation is only complete when all genomes of the initial pool are evaluated.
+    '''
+    def optimize(self, inputs, targets, 
+                 epochs=100, 
+                 savepath=r'../test/evolution_test/NN_testing/',
+                 dirname = 'TEST',
+                 seed=None):
+        
+        self.initialize(inputs, targets, epochs, savepath, dirname, seed)
+        self.outputs = np.zeros((self.genomes, len(self.target_wfm)))
+        self.fitness = np.full(self.genomes, -np.inf)
+        self.evaluated = np.zeros(self.genomes, dtype=bool)
+        workers = self.Platform.workers if hasattr(self.Platform, 'submit') else 1
+        budget = self.generations*self.genomes
+        
+        # pending maps each running evaluation to the slot of its genome in the pool
+        # (None for offspring, which replace the worst genome when they are done)
+        pending = {}
+        submitted = evaluations = gen = 0
+        checkpoint = self.genomes
+        start = time.time()
+        stop = False
+        while evaluations < budget and not stop:
+            while len(pending) < workers and submitted < budget:
+                if submitted < self.genomes:
+                    slot, genome = submitted, self.pool[submitted].copy()
+                elif np.sum(self.evaluated) >= 2:
+                    slot, genome = None, self.Offspring()
+                else:
+                    break
+                pending[self.submit(genome)] = (slot, genome)
+                submitted += 1
+            
+            done, _ = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                slot, genome = pending.pop(future)
+                output = future.result()
+                if slot is None:
+                    slot = np.flatnonzero(self.evaluated)[np.argmin(self.fitness[self.evaluated])]
+                self.pool[slot], self.outputs[slot] = genome, output[0]
+                self.fitness[slot] = self.Score(output)[0]
+                self.evaluated[slot] = True
+                evaluations += 1
+                # Wait for all initial genomes, a slow one can still be running after genomes evaluations
+                while evaluations >= checkpoint and np.all(self.evaluated):
+                    stop = self.Checkpoint(gen, start)
+                    checkpoint += self.genomes
+                    if stop:
+                        break
+                    gen += 1
+                    start = time.time()
+                    self.UpdateMutation(gen)
+                if stop:
+                    break
+        
+        for future in pending:
+            future.cancel()
+        print('--- final saving ---')
+        self.savior.save()
+        return self.best_solution()
+    
+    def submit(self, genome):
+        '''Starts the evaluation of genome, returns a Future with its output of shape (1, samples).'''
+        if hasattr(self.Platform, 'submit'):
+            return self.Platform.submit(self.inputs_wfm, genome[np.newaxis], self.target_wfm)
+        future = futures.Future()
+        future.set_result(self.Platform.evaluatePopulation(self.inputs_wfm, genome[np.newaxis], self.target_wfm))
+        return future
+    
+    def Checkpoint(self, gen, start):
+        '''Passes the population to the observers; returns True if the evolution must stop.'''
+        max_fit = max(self.fitness)
+        print(f"Highest fitness: {max_fit}")
+        self.next_state = {'generation':gen, 'genes':self.pool.copy(), 
+                           'outputs':self.outputs.copy(), 'fitness': self.fitness.copy()}
+        print("Generation nr. " + str(gen + 1) + " completed; took "+str(time.time()-start)+" sec.")
+        return self.StopCondition(max_fit)
+    
+    def Offspring(self):
+        '''Breeds a single genome from two parents chosen by linear ranking of the evaluated genomes.'''
+        evaluated = np.flatnonzero(self.evaluated)
+        ranked = evaluated[np.argsort(self.fitness[evaluated])[::-1]]
+        maximum = 1.5
+        minimum = 2 - maximum
+        rank = np.arange(len(ranked))
+        probability = (maximum - (maximum-minimum)*rank/(len(ranked) - 1))/len(ranked)
+        fitter, weaker = np.sort(np.random.choice(len(ranked), 2, replace=False, p=probability))
+        offspring = self.Crossover_BLXab(self.pool[ranked[fitter]], self.pool[ranked[weaker]])
+        mask = np.random.random(self.genes) < self.mutationrate
+        offspring = np.where(mask, self.Triangular(offspring[np.newaxis])[0], offspring)
+        if np.any(np.all(self.pool[evaluated] == offspring, axis=1)):
+            offspring = self.Triangular(offspring[np.newaxis])[0]
+        return offspring
+    
+#%% Island model
+class IslandGA:
+    '''Island model of the GA: evolves config_dict['islands'] independent GA populations,
+    each in its own process and with its own platform instance. Every 
+    config_dict['migration_interval'] generations each island sends its fittest 
+    config_dict['migrants'] genomes to the next island in a ring, where they replace 
+    the worst genomes (see Observers.Migrator).
+    Each island saves its own results in dirname_island<i>; at the end the results
+    of all islands are merged in a single God observer and saved in dirname_islands.
+    NOTE: On Windows config_dict is pickled to start the islands, so it cannot contain
+    lambdas and the script must be guarded by __main__.
+    '''
+    def __init__(self, config_dict):
+        self.config_dict = config_dict
+        self.islands = config_dict['islands']
+        self.genes = config_dict['genes']
+        self.genomes = self.islands*config_dict['genomes'] # genomes in the merged results
+        self.savior = Savior(config_dict)
+        self.savior.subject = self
+        
+    def optimize(self, inputs, targets, 
+                 epochs=100, 
+                 savepath=r'../test/evolution_test/NN_testing/',
+                 dirname = 'TEST',
+                 seed=None):
+        
+        # Ring of queues, island i receives from island i-1 and sends to island i+1
+        queues = [mp.Queue() for _ in range(self.islands)]
+        results = mp.Queue()
+        processes = []
+        for i in range(self.islands):
+            island_seed = None if seed is None else seed + i
+            args = (self.config_dict, i, queues[i-1], queues[i], results, 
+                    inputs, targets, epochs, savepath, dirname, island_seed)
+            processes.append(mp.Process(target=_run_island, args=args))
+            processes[-1].start()
+        # Collect before joining, the islands only exit once their results are read
+        island_results = dict(results.get() for _ in range(self.islands))
+        for p in processes:
+            p.join()
+        failed = [i for i, res in island_results.items() if res is None]
+        if failed:
+            raise RuntimeError(f'Islands {failed} failed, see their traceback above')
+        
+        #Merge the results of all islands
+        self.generations = epochs
+        self.target_wfm = island_results[0]['target_wfm']
+        self.inputs_wfm = island_results[0]['inputs_wfm']
+        self.filter_array = island_results[0]['filter_array']
+        self.savepath = savepath
+        self.dirname = dirname + '_islands'
+        self.savior.reset()
+        genomes = self.config_dict['genomes']
+        for i, res in island_results.items():
+            self.savior.geneArray[:, i*genomes:(i+1)*genomes] = res['geneArray']
+            self.savior.outputArray[:, i*genomes:(i+1)*genomes] = res['outputArray']
+            self.savior.fitnessArray[:, i*genomes:(i+1)*genomes] = res['fitnessArray']
+        self.savior.save()
+        
+        #Get best results
+        max_fitness, best_genome, best_output = self.savior.judge()
+        y = best_output[self.filter_array][np.newaxis,:]
+        trgt = self.target_wfm[self.filter_array]
+        best_corr = batch_corr(y,trgt)[0]
+        accuracy = linear_separability(y,trgt)[0][0]
+        print(f'\n==================== BEST SOLUTION OF {self.islands} ISLANDS ===================')
+        print('Fitness: ', max_fitness)
+        print('Correlation: ', best_corr)
+        print(f'Genome:\n {best_genome}')
+        print('Accuracy: ', accuracy)
+        print('===============================================================')
+        return best_genome, best_output, max_fitness, accuracy
+
+def _run_island(config_dict, island, inbox, outbox, results, 
+                inputs, targets, epochs, savepath, dirname, seed):
+    '''Evolves a single island of IslandGA in a worker process.'''
+    # Do not wait at exit for migrants that the next island will never read
+    outbox.cancel_join_thread()
+    res = None
+    try:
+        ga = GA(config_dict)
+        ga.attach(Migrator(config_dict, inbox, outbox))
+        ga.optimize(inputs, targets, epochs=epochs, savepath=savepath,
+                    dirname=f'{dirname}_island{island}', seed=seed)
+        res = {'geneArray':np.asarray(ga.savior.geneArray), 'outputArray':np.asarray(ga.savior.outputArray),
+               'fitnessArray':np.asarray(ga.savior.fitnessArray), 'target_wfm':ga.target_wfm,
+               'inputs_wfm':ga.inputs_wfm, 'filter_array':ga.filter_array}
+    finally:
+        outbox.put(None)
+        results.put((island, res))
+
 #%% MAIN
 if __name__=='__main__':
     
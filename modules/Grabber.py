@@ -7,31 +7,44 @@ Created on Wed Aug 21 16:12:34 2019
 import SkyNEt.modules.Platforms as Platforms
 import SkyNEt.modules.FitnessFunctions as FitF
 
-def get_platform(platform):
+def get_platform(platform, fitnessavg=1):
     '''Gets an instance of the determined class from Platforms.
     The classes in Platform must have a method self.evaluate() which takes as 
     arguments the inputs inputs_wfm, the gene pool and the targets target_wfm. 
     It must return outputs as numpy array of shape (self.genomes, len(self.target_wfm))
+    If platform['workers'] > 1, the platform is wrapped in Platforms.parallel to evaluate
+    the population on a pool of workers (platform['pool'] = 'process' or 'thread'); this is
+    not possible with the surrogate pre-screening of the chip (platform['surrogate']).
+    The outputs of deterministic platforms (nn) are cached per genome with Platforms.cached,
+    unless platform['cache_size'] is 0 or each genome is evaluated fitnessavg > 1 times. 
     '''
-    if platform['modality'] == 'chip':
-        return Platforms.chip(platform)
+    if platform.__contains__('workers') and platform['workers'] > 1:
+        if platform.__contains__('surrogate'):
+            raise NotImplementedError("Surrogate pre-screening of the chip is not implemented for workers > 1!")
+        instance = Platforms.parallel(platform)
+    elif platform['modality'] == 'chip':
+        instance = Platforms.chip(platform)
     elif platform['modality'] == 'nn':
-        return Platforms.nn(platform)
+        instance = Platforms.nn(platform)
     elif platform['modality'] == 'kmc':
-        return Platforms.kmc(platform)
+        instance = Platforms.kmc(platform)
     else:
         raise NotImplementedError(f"Platform {platform['modality']} is not recognized!")
+    
+    # The measurements on the chip and the kmc simulations are noisy, their genomes are re-evaluated
+    deterministic = platform['modality'] == 'nn'
+    cache = not platform.__contains__('cache_size') or platform['cache_size'] > 0
+    if deterministic and cache and fitnessavg == 1:
+        return Platforms.cached(instance, platform)
+    return instance
 
 def get_fitness(fitness):
-    '''Gets the fitness function used in GA from the module FitnessFunctions
+    '''Gets the fitness function used in GA from the registry in FitnessFunctions.
     The fitness functions must take two arguments, the outputs of the black-box and the target
-    and must return a numpy array of scores of size len(outputs).
+    and must return a numpy array of scores of size len(outputs). New functions become
+    available here by decorating them with FitnessFunctions.register.
     '''
-    if fitness == 'corr_fit':
-        return FitF.corr_fit
-    elif fitness == 'accuracy_fit':
-        return FitF.accuracy_fit
-    elif fitness == 'corrsig_fit':
-        return FitF.corrsig_fit
+    if fitness in FitF.fitness_registry:
+        return FitF.fitness_registry[fitness]
     else:
         raise NotImplementedError(f"Fitness function {fitness} is not recognized!")
\ No newline at end of file
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+Kinetic Monte Carlo (KMC) simulation of hopping conduction of holes in a 2D
+dopant network, used by Platforms.kmc to evaluate genomes without the chip.
+
+The device is a rectangle [0,xdim]x[0,ydim] (nm) with N acceptors, M donors
+(compensation, fixed negative charge, so there are N-M holes) and electrodes on
+its boundary. A hole hops from site a to site b (acceptors or electrodes) with
+the Miller-Abrahams rate
+    rate = nu * exp(-2*r_ab/ab) * exp(-max(dE,0)/kT)
+where the energy of a hole on acceptor i is
+    E_i = phi_i + sum_holes I0/r_ij - sum_donors I0/r_id     (eV)
+with phi the potential of the electrodes (V), and an electrode is a reservoir
+with energy equal to its voltage. The potential is the solution of the Laplace
+equation (electrodes fixed, other boundaries insulating) on a grid; it is linear
+in the voltages, so the solution for each electrode at 1 V is computed once per
+device and phi is a matrix product for every configuration of voltages.
+
+The configurations (e.g. all genomes times input levels) are simulated together:
+every step makes one hop in each configuration with numpy operations over the
+whole batch. The rates of all hops of a configuration are kept in a Fenwick tree,
+so an event is selected in O(log n). After a hop only the rates of the events of
+the sites whose energy changed by more than tolerance*kT since their last update
+(and of the two sites of the hop) are recomputed, updating the trees in O(log n)
+per rate; tolerance=0 gives exact rates. A configuration in which more than a
+quarter of the sites changed is rebuilt as a whole, which is cheaper.
+"""
+import numpy as np
+
+kB = 8.617333e-5   # Boltzmann constant in eV/K
+I0 = 1.439965      # e^2/(4*pi*eps0) in eV*nm
+
+
+#%% Fenwick trees over the rates of a batch of configurations
+def fenwick_build(values):
+    '''Fenwick trees (P x E+1) of the rows of values (P x E); node i holds the sum
+    of the values in (i-lowbit(i), i].'''
+    cumsum = np.zeros((values.shape[0], values.shape[1]+1))
+    np.cumsum(values, axis=1, out=cumsum[:, 1:])
+    nodes = np.arange(1, values.shape[1]+1)
+    tree = np.zeros_like(cumsum)
+    tree[:, 1:] = cumsum[:, nodes] - cumsum[:, nodes - (nodes & -nodes)]
+    return tree
+
+def fenwick_add(tree, rows, positions, delta):
+    '''Adds delta to the values at positions in the trees rows (flat arrays, repeated
+    rows allowed).'''
+    nodes = positions + 1
+    while len(nodes):
+        np.add.at(tree, (rows, nodes), delta)
+        nodes = nodes + (nodes & -nodes)
+        keep = nodes < tree.shape[1]
+        rows, nodes, delta = rows[keep], nodes[keep], delta[keep]
+
+def fenwick_search(tree, targets):
+    '''Position of the value in each tree where the cumulative sum exceeds targets.'''
+    size = tree.shape[1] - 1
+    rows = np.arange(len(tree))
+    positions = np.zeros(len(tree), dtype=int)
+    targets = targets.copy()
+    step = 1 << (size.bit_length() - 1)
+    while step:
+        nodes = positions + step
+        values = tree[rows, np.minimum(nodes, size)]
+        go = (nodes <= size) & (values <= targets)
+        targets -= np.where(go, values, 0.)
+        positions = np.where(go, nodes, positions)
+        step >>= 1
+    return np.minimum(positions, size - 1)
+
+
+#%% Dopant network
+class DopantNetwork:
+    '''
+    The layout of a device and the precomputed quantities that do not depend on the
+    voltages: the distances, tunnelling factors and Coulomb interactions between all
+    sites (acceptors first, then electrodes) and the potential of each electrode.
+    Arguments:
+        - acceptors: N x 2 array with the positions (nm) of the acceptors
+        - donors: M x 2 array with the positions (nm) of the donors
+        - electrodes: list of (x,y) positions (nm) on the boundary of the device
+        - xdim, ydim: size of the device in nm
+    kwargs:
+        - T: temperature in K (default 77)
+        - ab: localization (Bohr) radius in nm (default 10)
+        - eps_r: relative permittivity (default 11.68, silicon)
+        - nu: attempt frequency, the unit of the rates and the currents (default 1)
+        - grid: nr of grid points per dimension of the Laplace solver (default 30)
+        - electrode_width: width (nm) of the electrodes on the boundary (default 2 grid spacings)
+    '''
+    def __init__(self, acceptors, donors, electrodes, xdim, ydim,
+                 T=77., ab=10., eps_r=11.68, nu=1., grid=30, electrode_width=None):
+        self.acceptors = np.asarray(acceptors, dtype=float).reshape(-1, 2)
+        self.donors = np.asarray(donors, dtype=float).reshape(-1, 2)
+        self.electrodes = np.asarray(electrodes, dtype=float).reshape(-1, 2)
+        self.xdim, self.ydim = xdim, ydim
+        self.kT = kB*T
+        self.N, self.M, self.P = len(self.acceptors), len(self.donors), len(self.electrodes)
+        assert self.M < self.N, 'There must be less donors than acceptors to have holes'
+        self.holes = self.N - self.M
+        self.sites = self.N + self.P
+
+        sites = np.concatenate((self.acceptors, self.electrodes))
+        distance = np.linalg.norm(sites[:, np.newaxis] - sites[np.newaxis], axis=-1)
+        # Tunnelling factor of the hops, there are no hops between electrodes
+        self.tunnel = nu*np.exp(-2*distance/ab)
+        np.fill_diagonal(self.tunnel, 0)
+        self.tunnel[self.N:, self.N:] = 0
+        # Coulomb interaction between holes on the acceptors
+        self.coulomb = np.zeros((self.sites, self.sites))
+        with np.errstate(divide='ignore'):
+            self.coulomb[:self.N, :self.N] = I0/eps_r/distance[:self.N, :self.N]
+        np.fill_diagonal(self.coulomb, 0)
+        donor_distance = np.linalg.norm(self.acceptors[:, np.newaxis] - self.donors[np.newaxis], axis=-1)
+        self.compensation = np.sum(I0/eps_r/donor_distance, axis=1)
+
+        width = electrode_width if electrode_width is not None else 2*max(xdim, ydim)/(grid-1)
+        self.potential_basis = self.laplace(grid, width)
+
+    @classmethod
+    def random(cls, N, M, electrodes, xdim, ydim, seed=None, **kwargs):
+        '''Device with N acceptors and M donors at random positions.'''
+        rng = np.random.RandomState(seed)
+        size = np.array([xdim, ydim])
+        return cls(rng.uniform(size=(N, 2))*size, rng.uniform(size=(M, 2))*size,
+                   electrodes, xdim, ydim, **kwargs)
+
+    def laplace(self, grid, width):
+        '''Potential on the acceptors for each electrode at 1V and the others at 0V
+        (P x N array), solving the Laplace equation with finite differences.'''
+        x, y = np.linspace(0, self.xdim, grid), np.linspace(0, self.ydim, grid)
+        dx2, dy2 = (x[1]-x[0])**2, (y[1]-y[0])**2
+        index = np.arange(grid*grid).reshape(grid, grid)
+        X, Y = np.meshgrid(x, y, indexing='ij')
+        on_boundary = (X == 0) | (X == self.xdim) | (Y == 0) | (Y == self.ydim)
+        # The boundary nodes within the width of an electrode are fixed to its voltage
+        fixed = -np.ones((grid, grid), dtype=int)
+        for e, (ex, ey) in enumerate(self.electrodes):
+            distance = np.hypot(X - ex, Y - ey)
+            contact = on_boundary & (distance <= width/2)
+            contact[np.unravel_index(np.argmin(np.where(on_boundary, distance, np.inf)), distance.shape)] = True
+            fixed[contact] = e
+
+        A = np.zeros((grid*grid, grid*grid))
+        rhs = np.zeros((grid*grid, self.P))
+        for i in range(grid):
+            for j in range(grid):
+                node = index[i, j]
+                if fixed[i, j] >= 0:
+                    A[node, node] = 1
+                    rhs[node, fixed[i, j]] = 1
+                    continue
+                # Missing neighbours on the boundary give zero normal derivative (insulating)
+                for ni, nj, h2 in ((i-1, j, dx2), (i+1, j, dx2), (i, j-1, dy2), (i, j+1, dy2)):
+                    if 0 <= ni < grid and 0 <= nj < grid:
+                        A[node, index[ni, nj]] += 1/h2
+                        A[node, node] -= 1/h2
+        potential = np.linalg.solve(A, rhs).reshape(grid, grid, self.P)
+
+        # Bilinear interpolation on the acceptors
+        fx = np.clip(self.acceptors[:, 0]/self.xdim*(grid-1), 0, grid-1-1e-9)
+        fy = np.clip(self.acceptors[:, 1]/self.ydim*(grid-1), 0, grid-1-1e-9)
+        i, j = fx.astype(int), fy.astype(int)
+        wx, wy = (fx - i)[:, np.newaxis], (fy - j)[:, np.newaxis]
+        basis = ((1-wx)*(1-wy)*potential[i, j] + wx*(1-wy)*potential[i+1, j]
+                 + (1-wx)*wy*potential[i, j+1] + wx*wy*potential[i+1, j+1])
+        return basis.T
+
+    def simulate(self, voltages, hops=10000, equilibration=1000, tolerance=0.01,
+                 rebuild_interval=1000, seed=None):
+        '''
+        Simulates each configuration of electrode voltages (C x P array, in V) for
+        equilibration + hops hops and returns the currents (C x P array) through the
+        electrodes during the last hops, in holes per unit time (1/nu) flowing from the
+        device into the electrode.
+        tolerance: shift of the energy of a site (in kT) after which the rates of its
+            events are updated; 0 updates all rates after every hop (exact)
+        rebuild_interval: nr of hops after which all rates and the trees are rebuilt,
+            to remove the accumulated rounding errors
+        '''
+        rng = np.random.RandomState(seed)
+        voltages = np.atleast_2d(np.asarray(voltages, dtype=float))
+        C, n, E = len(voltages), self.sites, self.sites**2
+        configs = np.arange(C)
+
+        # Energies without the holes, on the electrodes their voltage
+        base = np.concatenate((voltages @ self.potential_basis - self.compensation, voltages), axis=1)
+        occupation = np.zeros((C, n), dtype=bool)
+        for c in configs:
+            occupation[c, rng.choice(self.N, self.holes, replace=False)] = True
+
+        def rebuild():
+            energy = base + occupation[:, :self.N].astype(float) @ self.coulomb[:self.N]
+            rates = self.rates(energy, occupation).reshape(C, E)
+            return energy, rates, fenwick_build(rates), rates.sum(axis=1)
+
+        energy, rates, tree, total = rebuild()
+        drift = np.zeros((C, n))
+        flow = np.zeros((C, self.P))
+        time = np.zeros(C)
+        for step in range(equilibration + hops):
+            if step == equilibration:
+                flow[:], time[:] = 0, 0
+            elif step % rebuild_interval == 0:
+                energy, rates, tree, total = rebuild()
+                drift[:] = 0
+
+            # Select one event in each configuration, those without events do not change
+            active = total > 0
+            event = fenwick_search(tree, rng.uniform(size=C)*total)
+            lost = active & (rates[configs, event] <= 0)
+            if np.any(lost):
+                # rounding errors in the tree, select from the rates themselves
+                cumulative = np.cumsum(rates[lost], axis=1)
+                u = rng.uniform(size=np.sum(lost))*cumulative[:, -1]
+                event[lost] = [np.searchsorted(cum, x, side='right') for cum, x in zip(cumulative, u)]
+            time[active] += rng.exponential(size=np.sum(active))/total[active]
+            a, b = event[active]//n, event[active]%n
+            hopping = configs[active]
+
+            # Move the holes and count the holes entering (+) and leaving (-) the electrodes
+            from_acceptor, to_acceptor = a < self.N, b < self.N
+            occupation[hopping[from_acceptor], a[from_acceptor]] = False
+            occupation[hopping[to_acceptor], b[to_acceptor]] = True
+            np.add.at(flow, (hopping[~to_acceptor], b[~to_acceptor] - self.N), 1)
+            np.add.at(flow, (hopping[~from_acceptor], a[~from_acceptor] - self.N), -1)
+            shift = self.coulomb[b] - self.coulomb[a]
+            energy[hopping] += shift
+            drift[hopping] += shift
+
+            # Update the rates of the events of the sites of the hop and of the shifted sites
+            dirty = np.abs(drift) > tolerance*self.kT
+            dirty[hopping, a] = True
+            dirty[hopping, b] = True
+            drift[dirty] = 0
+            # Configurations with many shifted sites are cheaper to rebuild as a whole
+            full = np.sum(dirty, axis=1) > n//4
+            if np.any(full):
+                rates[full] = self.rates(energy[full], occupation[full]).reshape(-1, E)
+                tree[full] = fenwick_build(rates[full])
+                total[full] = rates[full].sum(axis=1)
+                dirty[full] = False
+            rows, sites = np.nonzero(dirty)
+            # All events from the dirty sites and the events to them from the other sites
+            rows_from = np.repeat(rows, n)
+            events_from = (sites[:, np.newaxis]*n + np.arange(n)).ravel()
+            clean = ~dirty[rows]
+            rows_to = np.repeat(rows, np.sum(clean, axis=1))
+            events_to = (np.arange(n)*n + sites[:, np.newaxis])[clean]
+            rows, events = np.concatenate((rows_from, rows_to)), np.concatenate((events_from, events_to))
+            new = self.rates(energy, occupation, rows, events//n, events%n)
+            delta = new - rates[rows, events]
+            rates[rows, events] = new
+            fenwick_add(tree, rows, events, delta)
+            np.add.at(total, rows, delta)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(time[:, np.newaxis] > 0, flow/time[:, np.newaxis], 0.)
+
+    def rates(self, energy, occupation, rows=None, a=None, b=None):
+        '''Rates of the hops a->b in the configurations rows; if they are not given, the
+        rates of all hops of all configurations (C x n x n).'''
+        # Electrodes can always give and take a hole
+        source = occupation.copy()
+        source[:, self.N:] = True
+        target = ~occupation
+        if rows is None:
+            dE = energy[:, np.newaxis, :] - energy[:, :, np.newaxis] - self.coulomb
+            allowed = source[:, :, np.newaxis] & target[:, np.newaxis, :]
+            return np.where(allowed, self.tunnel*np.exp(-np.maximum(dE, 0)/self.kT), 0.)
+        dE = energy[rows, b] - energy[rows, a] - self.coulomb[a, b]
+        allowed = source[rows, a] & target[rows, b]
+        return np.where(allowed, self.tunnel[a, b]*np.exp(-np.maximum(dE, 0)/self.kT), 0.)
@@ -4,8 +4,12 @@
 Created on Fri Sep 28 09:51:58 2018
 DataHandlers contains functions to pre-process and load the data needed for the neural net training:
     1. DataLoader(data_dir, file_name, **kwargs)
-    2. GetData(dir_file, syst = 'cuda')
+    2. GetData(dir_file, device = 'cuda')
     3. PrepData(main_dir, list_dirs, threshold = [-np.inf,np.inf])
+    4. NpzToStore(data_path, store_dir=None)
+Data sets too large for memory are kept in a store: a directory with an uncompressed
+.npy file per key (see SaveLib.ResultStore). DataLoader opens a store memory-mapped
+and returns LazySet's, which only read the rows of a minibatch from disk.
 @author: hruiz
 """
 import sys
@@ -15,7 +19,9 @@ import numpy as np
 import torch
 import matplotlib.pyplot as plt
 import math 
+import zipfile
 import pdb
+import SkyNEt.modules.SaveLib as SaveLib
 
 def loader(data_path, index):
     print('Loading data from: \n',data_path)
@@ -47,9 +53,9 @@ def loader(data_path, index):
     print('meta key is dict with keys:\n', list(data_dic['meta'].keys()))
     return data_dic
 
-def generate_inpsines(info):
-    nr_raw_samples = info['nr_raw_samples']
-    indices = np.arange(nr_raw_samples)[:,np.newaxis]
+def generate_inpsines(info, indices=None):
+    if indices is None:
+        indices = np.arange(info['nr_raw_samples'])[:,np.newaxis]
     freq = info['freq']
     amplitude = info['amplitude']
     offset = info['offset']
@@ -61,15 +67,17 @@ def generate_inpsines(info):
     
 #%% 1. STEP: Clean data for further analysis
 def PrepData(main_dir, data_filename = 'training_NN_data.npz',
-             list_dirs=[], threshold = [-np.inf,np.inf], index=False, plot=False):
+             list_dirs=[], threshold = [-np.inf,np.inf], index=False, plot=False,
+             chunk_size=2**20):
 
     '''Pre-process data, cleans clipping, generates input arrays if non existent (e.g. when sine-sampling
     was involved) and merges data sets if needed. The data arrays are merged into a single array and
-    cropped given the thresholds.
+    cropped given the thresholds. The files are streamed chunk by chunk into the merged arrays, which
+    are preallocated on disk, so the memory needed is set by chunk_size and not by the size of the data.
     Arguments:
         - a string with path to main directory
     kwdargs:
-        - data_filename: the name of the .npz file containing the data. It is assumend that this file 
+        - data_filename: the name of the .npz file (or store) containing the data. It is assumend that this file 
             contains at least the key 'outputs'. Besides the keys 'outputs' and 'inputs', all other keys are 
             bundled into a dictionary called meta. If the key 'inputs' is non-existent, it generates the
             inputs assuming sine waves and using the information in meta. The data_filename is also used 
@@ -78,70 +86,36 @@ def PrepData(main_dir, data_filename = 'training_NN_data.npz',
         - list_dirs: A list of strings indicating directories with training_NN_data.npz containing 'data'. 
         - threshold: A lower and upper threshold to crop data; default is [-np.inf,np.inf]
         - plot: if set to True, it plots the first 1000 samples of the inputs and outputs
+        - chunk_size: number of samples read at once from each file
     
     NOTE:
 
-        -The data is saved in main_dir+'/data4nn/ to a .npz file with keyes: inputs, outputs,
-        data_path and meta; the meta key has a dictionary as value containing metadata of the 
-        sampling procedure, i.e sine, sawtooth, grid, random.
+        -The data is saved in main_dir+'/data4nn/<date>/data_for_<use>' as a store (see NpzToStore), 
+        which DataLoader opens memory-mapped. It has the keys: inputs, outputs, meta, data_path and index.
+        The meta key has a dictionary as value containing metadata of the sampling procedure, i.e sine,
+        sawtooth, grid, random (for merged data the meta of the first file, with the total nr_raw_samples).
+        The index has an entry per merged file with its data_path, nr_raw_samples and the rows start:stop
+        of its cropped data in inputs and outputs.
         -The inputs are on ALL electrodes in Volts and the output in nA.
         - Data does not undergo any transformation, this is left to the user.
         - Data structure of output and input are arrays of Nxd, where N is the number of voltage 
         configurations probed and d is the number of samples for each configuration or the input dimension.
     '''
-    ### Load full data ###
     if list_dirs: # Merge data if list_dir is not empty
-        raw_data = {}
-        out_list = []
-        inp_list = []
-        meta_list = []
-        datapth_list = []
-        for dir_file in list_dirs:
-            _databuff = loader(main_dir+dir_file+data_filename, index)
-            out_list.append(_databuff['outputs']) 
-            meta_list.append(_databuff['meta'])
-            datapth_list.append(_databuff['data_path'])
-            inp_list.append(_databuff['inputs'])
-        #Generate numpy arrays out of the lists
-        raw_data['outputs'] = np.concatenate(tuple(out_list))
-        raw_data['inputs'] = np.concatenate(tuple(inp_list))
-        raw_data['meta'] = meta_list
-        raw_data['data_path'] = datapth_list
+        data_paths = [main_dir+dir_file+data_filename for dir_file in list_dirs]
     else:
-        raw_data = loader(main_dir+data_filename, index)
-        for key in raw_data['meta'].keys():
-            if 'file' in key:
-                raw_data['data_path'] = raw_data['meta'][key]
+        data_paths = [main_dir+data_filename]
+    sources = [_source(data_path, index) for data_path in data_paths]
     
-    ### Crop data ###
-    nr_raw_samples = raw_data['meta']['nr_raw_samples']
-    try:
-        mean_output = np.mean(raw_data['outputs'],axis=1) 
-    except:
-        mean_output = raw_data['outputs']
-        
-    if type(threshold) is list:
-        cropping_mask = (mean_output<threshold[1])*(mean_output>threshold[0])
-    elif type(threshold) is float:
-        cropping_mask = np.abs(mean_output)<threshold
-    else:
-        assert False, "Threshold not recognized! Must be list with lower and upper bound or float."
-    
-    outputs = raw_data['outputs'][cropping_mask]
-    inputs = raw_data['inputs'][cropping_mask,:]
+    ### First pass: count the samples kept by the crop, only the outputs are read ###
+    for src in sources:
+        src['nr_kept'] = 0
+        for outputs in _read_chunks(src['data_path'], src['output_key'], chunk_size):
+            src['nr_kept'] += int(np.sum(_cropping_mask(outputs, threshold)))
+    nr_raw_samples = sum(src['meta']['nr_raw_samples'] for src in sources)
+    nr_samples = sum(src['nr_kept'] for src in sources)
     print('Number of raw samples: ', nr_raw_samples)
-    print('% of points cropped: ',(1-len(outputs)/nr_raw_samples)*100)
-    
-    if plot:
-        plt.figure()
-        plt.suptitle('Data for NN training')
-        plt.subplot(211)
-        plt.plot(inputs[:1000])
-        plt.ylabel('inputs')
-        plt.subplot(212)
-        plt.plot(outputs[:1000])
-        plt.ylabel('outputs')
-        plt.show()
+    print('% of points cropped: ',(1-nr_samples/nr_raw_samples)*100)
     
     # save with timestamp
     now = datetime.datetime.now()
@@ -160,11 +134,207 @@ def PrepData(main_dir, data_filename = 'training_NN_data.npz',
         print("Directory " , dirName ,  " already exists")
     target_file = data_filename.split('_')[0]
     save_to = dirName+f'data_for_{target_file}'
-    print(f'Cleaned data saved to \n {save_to}.npz')
     
-    np.savez(save_to, inputs = inputs, outputs = outputs,
-         meta=raw_data['meta'], data_path = raw_data['data_path'])
+    ### Second pass: stream the cropped data into the preallocated arrays ###
+    store = SaveLib.ResultStore(save_to)
+    first = sources[0]
+    outputs_shape, outputs_dtype = first['output_header']
+    inputs_example = next(_input_chunks(first, 1))
+    outputs = store.create('outputs', (nr_samples,)+outputs_shape[1:], dtype=outputs_dtype)
+    inputs = store.create('inputs', (nr_samples,)+inputs_example.shape[1:], dtype=inputs_example.dtype)
+    file_index = []
+    start = 0
+    for src in sources:
+        stop = start
+        input_chunks = _input_chunks(src, chunk_size)
+        for out_chunk in _read_chunks(src['data_path'], src['output_key'], chunk_size):
+            inp_chunk = next(input_chunks)
+            mask = _cropping_mask(out_chunk, threshold)
+            kept = int(np.sum(mask))
+            outputs[stop:stop+kept] = out_chunk[mask]
+            inputs[stop:stop+kept] = inp_chunk[mask]
+            stop += kept
+        file_index.append((src['data_path'], src['meta']['nr_raw_samples'], start, stop))
+        start = stop
+    
+    meta = dict(first['meta'])
+    meta['nr_raw_samples'] = nr_raw_samples
+    index_dtype = [('data_path', f'U{max(len(path) for path in data_paths)}'),
+                   ('nr_raw_samples', int), ('start', int), ('stop', int)]
+    store.save(meta = np.array(meta), data_path = np.array(data_paths),
+               index = np.array(file_index, dtype=index_dtype))
+    store.flush()
+    print(f'Cleaned data saved to \n {save_to}')
+    
+    if plot:
+        plt.figure()
+        plt.suptitle('Data for NN training')
+        plt.subplot(211)
+        plt.plot(inputs[:1000])
+        plt.ylabel('inputs')
+        plt.subplot(212)
+        plt.plot(outputs[:1000])
+        plt.ylabel('outputs')
+        plt.show()
+
+def _cropping_mask(outputs, threshold):
+    try:
+        mean_output = np.mean(outputs,axis=1) 
+    except:
+        mean_output = outputs
+        
+    if type(threshold) is list:
+        return (mean_output<threshold[1])*(mean_output>threshold[0])
+    elif type(threshold) is float:
+        return np.abs(mean_output)<threshold
+    else:
+        assert False, "Threshold not recognized! Must be list with lower and upper bound or float."
+
+def _source(data_path, index):
+    '''Keys, meta and the header of the outputs of a data file, as loader but without loading
+    the inputs and outputs.'''
+    print('Reading data from: \n',data_path)
+    headers = _headers(data_path)
+    print('with keys: \n',list(headers.keys()))
+    assert any('output' in s for s in list(headers.keys())), 'Keyvalue \'output(s)\' is missing! Make sure you included the outputs in the data.'
+    src = {'data_path':data_path, 'index':index, 'input_key':None, 'meta':{}}
+    meta_keys = []
+    for key in headers:
+        if key in 'outputs':
+            src['output_key'] = key
+            src['output_header'] = headers[key]
+            src['meta']['nr_raw_samples'] = headers[key][0][0]
+        elif key in 'inputs':
+            src['input_key'] = key
+        else:
+            meta_keys.append(key)
+    if meta_keys:
+        if os.path.isdir(data_path):
+            store = SaveLib.loadStore(data_path)
+            src['meta'].update({key:np.array(store[key]) for key in meta_keys})
+        else:
+            with np.load(data_path, allow_pickle=True) as data:
+                src['meta'].update({key:data[key] for key in meta_keys})
+    if src['input_key'] is None:
+        if index:
+            print('Inputs are represented with their index, so lightNNet must be used.')
+        else:
+            print('Input generated as sine waves!')
+    return src
+
+def _input_chunks(src, chunk_size):
+    '''Yields the inputs of the data file src in chunks, generating them if they are not in the file.'''
+    if src['input_key'] is not None:
+        yield from _read_chunks(src['data_path'], src['input_key'], chunk_size)
+        return
+    for i in range(0, src['meta']['nr_raw_samples'], chunk_size):
+        indices = np.arange(i, min(i+chunk_size, src['meta']['nr_raw_samples']))[:,np.newaxis]
+        yield indices if src['index'] else generate_inpsines(src['meta'], indices)
+
+def _npy_header(f):
+    '''Reads the header of the .npy file object f and returns shape, fortran_order and dtype.'''
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        return np.lib.format.read_array_header_1_0(f)
+    return np.lib.format.read_array_header_2_0(f)
+
+def _headers(data_path):
+    '''Shape and dtype of every array in the .npz file or store data_path.'''
+    headers = {}
+    if os.path.isdir(data_path):
+        for key, array in SaveLib.loadStore(data_path).items():
+            headers[key] = (array.shape, array.dtype)
+    else:
+        with zipfile.ZipFile(data_path) as archive:
+            for member in archive.namelist():
+                with archive.open(member) as f:
+                    shape, _, dtype = _npy_header(f)
+                headers[os.path.splitext(member)[0]] = (shape, dtype)
+    return headers
+
+def _read_chunks(data_path, key, chunk_size):
+    '''Yields the array key of the .npz file (or store) data_path in chunks of chunk_size rows.'''
+    if os.path.isdir(data_path):
+        array = np.load(os.path.join(data_path, key+'.npy'), mmap_mode='r')
+        for i in range(0, len(array), chunk_size):
+            yield np.array(array[i:i+chunk_size])
+        return
+    with zipfile.ZipFile(data_path) as archive, archive.open(key+'.npy') as f:
+        shape, fortran_order, dtype = _npy_header(f)
+        if fortran_order:
+            # the rows are not contiguous in the file, load the array as a whole
+            with np.load(data_path) as data:
+                array = data[key]
+            for i in range(0, len(array), chunk_size):
+                yield array[i:i+chunk_size]
+            return
+        row_size = int(np.prod(shape[1:])) * dtype.itemsize
+        for i in range(0, shape[0], chunk_size):
+            n = min(chunk_size, shape[0]-i)
+            yield np.frombuffer(f.read(n*row_size), dtype=dtype).reshape((n,)+shape[1:])
     
+#%% Lazy access to data sets in a store
+class LazySet:
+    '''
+    The rows indices of a (memory-mapped) array, times scale, without copying them.
+    Indexing returns a numpy array and reads only the requested rows from disk;
+    shuffling and partitioning only permute and split the indices.
+    '''
+    def __init__(self, array, indices, scale=1.):
+        self.array = array
+        self.indices = indices
+        self.scale = scale
+
+    @property
+    def shape(self):
+        return (len(self.indices),) + self.array.shape[1:]
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, positions):
+        rows = self.indices[positions]
+        if isinstance(rows, np.ndarray) and rows.ndim == 1:
+            # read the rows in file order and put them back in the requested order
+            order = np.argsort(rows)
+            batch = np.empty((len(rows),) + self.array.shape[1:], dtype=self.array.dtype)
+            batch[order] = self.array[rows[order]]
+        else:
+            batch = np.array(self.array[rows])
+        return batch * self.scale if self.scale != 1. else batch
+
+    def __truediv__(self, value):
+        return LazySet(self.array, self.indices, self.scale / value)
+
+def NpzToStore(data_path, store_dir=None):
+    '''
+    Converts the .npz file data_path to a store in store_dir (default: data_path without
+    the extension). The arrays are copied in chunks, so they never have to fit in memory.
+    '''
+    if store_dir is None:
+        store_dir = os.path.splitext(data_path)[0]
+    store = SaveLib.ResultStore(store_dir)
+    chunk_bytes = 2**26
+    with zipfile.ZipFile(data_path) as archive:
+        for member in archive.namelist():
+            name = os.path.splitext(member)[0]
+            with archive.open(member) as f:
+                shape, fortran_order, dtype = _npy_header(f)
+                if dtype.hasobject:
+                    # python objects (e.g. meta) are small, load them as a whole
+                    with np.load(data_path, allow_pickle=True) as data:
+                        store.save(**{name: data[name]})
+                    continue
+                array = store.create(name, shape, dtype=dtype)
+                flat = array.reshape(-1, order='F' if fortran_order else 'C')
+                chunk = max(1, chunk_bytes // dtype.itemsize)
+                for i in range(0, flat.size, chunk):
+                    n = min(chunk, flat.size - i)
+                    flat[i:i+n] = np.frombuffer(f.read(n * dtype.itemsize), dtype=dtype)
+    store.flush()
+    print(f'Data of {data_path} stored in \n {store_dir}')
+    return store_dir
+
 #%% STEP 2: Load Data, prepare for NN and return as list with information dict
 def DataLoader(data_dir, file_name,
                val_size = 0.1, batch_size = 4*512, 
@@ -180,21 +350,33 @@ def DataLoader(data_dir, file_name,
     Data structure loaded must be a .npz file with a directory having keys: 'inputs','outputs'.
     The inputs follow the convention that the first dimension is over CV configs and the second index is
     over input dimension, i.e. number of electrodes.
+    If file_name is a store (a directory, see NpzToStore) the data is memory-mapped and the sets are 
+    returned as LazySet's: the subsampling, shuffling and partitioning only act on indices and the
+    minibatches are read from disk when they are used.
     '''
     assert isinstance(batch_size,int), 'Minibatch Size is not integer!!'
     print('Loading data from: \n'+data_dir+file_name)
     
-    with np.load(data_dir+file_name) as data:
+    if os.path.isdir(data_dir+file_name):
+        data = SaveLib.loadStore(data_dir+file_name)
         meta = data['meta'].tolist()
-#        print(type(meta))
         print('Metainfo about data:\n',meta.keys())
-        bf_inp = data['inputs'][::steps] # shape: Nx#electrodes
-        bf_out = data['outputs'][::steps] #Outputs need dim Nx1
-        print(f'Shape of outputs: {bf_out.shape}; shape of inputs: {bf_inp.shape}')
-    #Shuffle data
-    shuffler = np.random.permutation(len(bf_out))
-    inputs = bf_inp[shuffler]
-    outputs = bf_out[shuffler]
+        print(f"Shape of outputs: {data['outputs'].shape}; shape of inputs: {data['inputs'].shape}")
+        #Subsample and shuffle the indices only
+        shuffler = np.random.permutation(np.arange(0, len(data['outputs']), steps))
+        inputs = LazySet(data['inputs'], shuffler)
+        outputs = LazySet(data['outputs'], shuffler)
+    else:
+        with np.load(data_dir+file_name, allow_pickle=True) as data:
+            meta = data['meta'].tolist()
+            print('Metainfo about data:\n',meta.keys())
+            bf_inp = data['inputs'][::steps] # shape: Nx#electrodes
+            bf_out = data['outputs'][::steps] #Outputs need dim Nx1
+            print(f'Shape of outputs: {bf_out.shape}; shape of inputs: {bf_inp.shape}')
+        #Shuffle data
+        shuffler = np.random.permutation(len(bf_out))
+        inputs = bf_inp[shuffler]
+        outputs = bf_out[shuffler]
             
     assert len(outputs)==len(inputs), 'Inputs and Outpus have NOT the same length'
     nr_samples = len(outputs)
@@ -205,16 +387,14 @@ def DataLoader(data_dir, file_name,
     if test_size:
         # Devide data in training and test set 
         print('Size of TEST set is ',n_test)
-        outputs_test = outputs[:n_test] 
-        inputs_test = inputs[:n_test]
+        outputs_test, outputs = _split(outputs, n_test)
+        inputs_test, inputs = _split(inputs, n_test)
         
         #Save test set
         test_file = data_dir+'test_set_from_trainbatch'
-        np.savez(test_file, inputs=inputs_test, outputs=outputs_test)
+        np.savez(test_file, inputs=inputs_test[:], outputs=outputs_test[:])
         print(f'Test set saved in \n {test_file}.npz')
         
-        outputs = outputs[n_test:] 
-        inputs = inputs[n_test:]
     else:
         print('No TEST set partitioned')
     
@@ -228,12 +408,9 @@ def DataLoader(data_dir, file_name,
     print('Size of VALIDATION set is ',n_val)
     print('Size of TRAINING set is ',nr_samples-n_val)
     
-    #Validation set
-    inputs_val = inputs[:n_val]
-    outputs_val = outputs[:n_val]
-    # Training set
-    inputs_train = inputs[n_val:]
-    outputs_train = outputs[n_val:]
+    #Validation and training set
+    inputs_val, inputs_train = _split(inputs, n_val)
+    outputs_val, outputs_train = _split(outputs, n_val)
     ### Sanity Check ###
     assert nr_minibatches*batch_size + n_val + n_test == nr_samples, 'Data points not properly allocated!'
     if not outputs_train.shape[0] == inputs_train.shape[0]:
@@ -241,17 +418,30 @@ def DataLoader(data_dir, file_name,
 
     return [[inputs_train,outputs_train],[inputs_val,outputs_val],meta]
 
+def _split(data, n):
+    '''Returns the first n samples of data and the rest; a LazySet is split without reading it.'''
+    if isinstance(data, LazySet):
+        return LazySet(data.array, data.indices[:n], data.scale), LazySet(data.array, data.indices[n:], data.scale)
+    return data[:n], data[n:]
+
 #%% EXTRA: Just load data and return as torch.tensor
 def GetData(dir_file, device = 'cuda'):
     '''Get data from dir_file. Returns the inputs as torch.Tensor and targets/outputs as numpy-arrays. 
-    dtype of inputs is defined with kwarg syst. Default is 'cuda'.
+    dtype of inputs is defined with kwarg device. Default is 'cuda'.
     NOTES:
-        -The data must be in a .npz file with keys 'inputs' & 'outputs' and NxD-structure.
+        -The data must be in a .npz file or a store (e.g. data_for_test saved by PrepData) with 
+        keys 'inputs' & 'outputs' and NxD-structure.
         -This function assumes that data is cleaned; to clean the data use PrepData.
     '''
     
-    targets = np.load(dir_file)['outputs']
-    inputs = np.load(dir_file)['inputs']
+    if os.path.isdir(dir_file):
+        data = SaveLib.loadStore(dir_file)
+        targets = np.array(data['outputs'])
+        inputs = np.array(data['inputs'])
+    else:
+        with np.load(dir_file) as data:
+            targets = data['outputs']
+            inputs = data['inputs']
     
     if device is 'cuda':
         print('Inputs dtype defined for CUDA')
@@ -279,7 +469,7 @@ if __name__ == '__main__':
         else:
             dir_data = 'data4nn/16_04_2019/'
             data_dir = main_dir+dir_data    
-        file_name = 'data_for_training.npz'
+        file_name = 'data_for_training'
         print('Loading data...')
         data = DataLoader(data_dir, file_name,steps=3)
         meta = data[-1]
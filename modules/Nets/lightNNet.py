@@ -39,12 +39,45 @@ class lightNNet(staNNet):
         amplitude:  Amplitude of the sine wave (Vmax in this case)
         fs:         Sample frequency of the device
         phase:      (Optional) phase offset at t=0
+        
+        The waves are computed with torch on the device of t and returned as float32 tensor. The
+        parameters are kept as tensors on that device, so no data is copied to or from the host.
+        The argument of the sine is computed in double precision and reduced modulo 2*pi, because
+        the indices are large; on the CPU the argument is computed in place in a reused buffer and
+        the waves, a new tensor on every call, in place from it.
         '''     
-        if torch.cuda.is_available() and isinstance(t,torch.cuda.FloatTensor):
-            waves = amplitude * np.sin((2 * np.pi * np.outer(t.cpu(),freq))/ fs + phase) + np.outer(np.ones(t.shape[0]),offset)
-            waves = torch.from_numpy(waves).type(torch.cuda.FloatTensor)
-        else:
-            waves = amplitude * np.sin((2 * np.pi * np.outer(t,freq))/ fs + phase) + np.outer(np.ones(t.shape[0]),offset)
-            waves = torch.from_numpy(waves).type(torch.float32)
-                
-        return  waves    
+        t = torch.as_tensor(t)
+        params = self._sine_params(freq, amplitude, fs, offset, phase, t.device)
+        t = t.reshape(-1, 1).type(torch.float64)
+        if t.is_cuda:
+            argument = torch.remainder(t * params['omega'], 2 * np.pi) + params['phase']
+            return torch.addcmul(params['offset'], params['amplitude'], torch.sin(argument.float()))
+        
+        argument = self._sine_buffer(t.shape[0], params['omega'].shape[1])
+        torch.mul(t, params['omega'], out=argument)
+        argument.remainder_(2 * np.pi).add_(params['phase'])
+        waves = argument.float()
+        return waves.sin_().mul_(params['amplitude']).add_(params['offset'])
+    
+    def _sine_params(self, freq, amplitude, fs, offset, phase, device):
+        '''The parameters of the waves as tensors on device, cached while the same arrays are used.'''
+        sources = (freq, amplitude, fs, offset, phase)
+        if getattr(self, '_sine_cache', None) is not None:
+            cached_sources, cached_device, params = self._sine_cache
+            if cached_device == device and all(a is b for a, b in zip(sources, cached_sources)):
+                return params
+        row = lambda x, dtype: torch.as_tensor(np.asarray(x, dtype=np.float64).reshape(1, -1), dtype=dtype, device=device)
+        params = {'omega':row(2 * np.pi * np.asarray(freq) / fs, torch.float64),
+                  'phase':row(phase, torch.float64),
+                  'amplitude':row(amplitude, torch.float32),
+                  'offset':row(offset, torch.float32)}
+        self._sine_cache = (sources, device, params)
+        return params
+    
+    def _sine_buffer(self, n, dim):
+        '''View on n rows of the buffer for the argument (float64), which is never returned.'''
+        buffer = getattr(self, '_sine_argument', None)
+        if buffer is None or buffer.shape[0] < n or buffer.shape[1] != dim:
+            buffer = torch.empty(n, dim, dtype=torch.float64)
+            self._sine_argument = buffer
+        return buffer[:n]
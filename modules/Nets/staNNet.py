@@ -23,6 +23,9 @@ from SkyNEt.config.acceleration import Accelerator
 import torch
 import torch.nn as nn
 import numpy as np 
+import contextlib
+import threading
+import queue
 #import pdb
 
 class staNNet(nn.Module):
@@ -54,21 +57,21 @@ class staNNet(nn.Module):
             #Prepare data
            self._data(data)
            
-           self.D_in = self.load_data(self.x_train).size()[1]
-           self.D_out = self.y_train.size()[1]
+           self.D_in = self.load_data(self.x_train[:1]).shape[1]
+           self.D_out = self.y_train.shape[1]
            
            self.info['D_in'] = self.D_in
            self.info['D_out'] = self.D_out
            self.info['hidden_sizes'] = self.hidden_sizes
            if self.verbose:
                print(f'Meta-info: \n {self.info.keys()}')
-           self.ttype = self.x_train.type()
+           self.ttype = self.dtype
            self._tests()
         
            ################### DEFINE MODEL ######################################
            self._contruct_model()
 
-           if isinstance(self.x_train.data,torch.FloatTensor): 
+           if self.dtype is torch.FloatTensor: 
                self.itype = torch.LongTensor
            else:
                self.itype = torch.cuda.LongTensor
@@ -81,37 +84,57 @@ class staNNet(nn.Module):
     
     def train_nn(self,learning_rate,nr_epochs,batch_size,
                  betas = (0.9, 0.999), save_dir=None, save_interval=10,
-                 data = None, seed=None):
-        
-        data_available = [key in net.__dict__.keys() for key in 
-                          ['x_train', 'x_val', 'y_train', 'y_val']]
-        assert all(data_available), 'Data missing! Please define as kwarg data.'
-        
+                 data = None, seed=None, prefetch=2, amp=False, compile=False):
+        '''
+        Trains the model with Adam. The minibatches are prepared in a background thread
+        (see BatchPrefetcher), so reading and gathering the data overlaps with the training.
+        kwargs:
+            prefetch: number of minibatches prepared ahead of the training step
+            amp: if True, the forward pass runs in mixed precision (torch.autocast) and the
+                loss is scaled on the GPU; ignored if this torch version has no autocast
+            compile: if True, the model is trained as graph captured with torch.compile, if
+                available in this torch version
+        '''
         if seed:
             torch.manual_seed(seed)
             print(f'The torch RNG is seeded with {seed}!')
         if not isinstance(data,type(None)):
             self._data(data)
             self._tests()
+        
+        data_available = [key in self.__dict__.keys() for key in 
+                          ['x_train', 'x_val', 'y_train', 'y_val']]
+        assert all(data_available), 'Data missing! Please define as kwarg data.'
             
         optimizer = torch.optim.Adam(self.model.parameters(), lr=learning_rate, betas=betas) # OR SGD?!
         print('Prediction using ADAM optimizer')
+        device_type = 'cpu' if self.dtype is torch.FloatTensor else 'cuda'
+        if amp and not hasattr(torch, 'autocast'):
+            print('WARNING: torch.autocast not available, training without mixed precision')
+            amp = False
+        if hasattr(torch, 'amp') and hasattr(torch.amp, 'GradScaler'):
+            scaler = torch.amp.GradScaler(device_type, enabled=amp and device_type == 'cuda')
+        else:
+            scaler = torch.cuda.amp.GradScaler(enabled=amp and device_type == 'cuda')
+        if compile and not hasattr(torch, 'compile'):
+            print('WARNING: torch.compile not available, training the model without graph capture')
+            compile = False
+        model = torch.compile(self.model) if compile else self.model
+        batches = BatchPrefetcher([self.x_train, self.y_train], batch_size, self.dtype, depth=prefetch)
+        
         self.L_val = np.zeros((nr_epochs,))
         self.L_train = np.zeros((nr_epochs,))
         for epoch in range(nr_epochs):
             self.model.train()
-            permutation = torch.randperm(self.x_train.size()[0]).type(self.itype) # Permute indices 
-            nr_minibatches = 0
+            permutation = torch.randperm(self.x_train.shape[0]).type(self.itype) # Permute indices 
 
-            for i in range(0,len(permutation),batch_size):
+            for x_train, y_train in batches.epoch(permutation):
                 
                 # Forward pass: compute predicted y by passing x to the model.
-                indices = permutation[i:i+batch_size]
-                x_train = self.load_data(self.x_train[indices])
-                y_pred = self.model(x_train)
-                
-                # Compute and print loss.
-                loss_training = self.loss_fn(y_pred, self.y_train[indices])
+                with _autocast(device_type, amp):
+                    y_pred = model(self.load_data(x_train))
+                    # Compute and print loss.
+                    loss_training = self.loss_fn(y_pred, y_train)
 
                 # Before the backward pass, use the optimizer object to zero all of the
                 # gradients for the variables it will update (which are the learnable
@@ -121,13 +144,13 @@ class staNNet(nn.Module):
                 optimizer.zero_grad()
                 
                 # Backward pass: compute gradient of the loss with respect to model
-                # parameters
-                loss_training.backward()
+                # parameters (scaled to avoid underflow of the half precision gradients)
+                scaler.scale(loss_training).backward()
                 
                 # Calling the step function on an Optimizer makes an update to its
                 # parameters
-                optimizer.step()
-                nr_minibatches += 1
+                scaler.step(optimizer)
+                scaler.update()
                              
             self.model.eval()
             
@@ -240,10 +263,11 @@ class staNNet(nn.Module):
 
     def _errors(self, x, y):
         get_indices = torch.randperm(len(x)).type(self.itype)[:len(self.x_val)]
-        x = self.load_data(x[get_indices])
-        prediction = self.model(x) * Accelerator.format_numpy(self.info['amplification'])
-        target = y[get_indices] * Accelerator.format_numpy(self.info['amplification'])
-        return self.loss_fn(prediction, target).item()
+        with torch.no_grad():
+            x = self.load_data(self._batch(x, get_indices))
+            prediction = self.model(x) * Accelerator.format_numpy(self.info['amplification'])
+            target = self._batch(y, get_indices) * Accelerator.format_numpy(self.info['amplification'])
+            return self.loss_fn(prediction, target).item()
     
     def _data(self,data):
         self.x_train = self._to_torch(data[0][0])
@@ -256,17 +280,120 @@ class staNNet(nn.Module):
         self.y_val = self._to_torch(self.y_val)
 
     def _tests(self):
-        if not self.x_train.size()[0] == self.y_train.size()[0]:
+        if not self.x_train.shape[0] == self.y_train.shape[0]:
             raise ValueError('Input and Output Batch Sizes do not match!')
         #Check if dimensions match
-        if not self.D_in == self.x_train.size()[1]:
-            raise ValueError(f'Dimensions do not match: D_in is {self.D_in}; input data has dimension {self.x_train.size()[1]}')
-        if not self.D_out == self.y_train.size()[1]:
-            raise ValueError(f'Dimensions do not match: D_out is {self.D_out}; output data has dimension {self.y_train.size()[1]}')
+        if not self.D_in == self.x_train.shape[1]:
+            raise ValueError(f'Dimensions do not match: D_in is {self.D_in}; input data has dimension {self.x_train.shape[1]}')
+        if not self.D_out == self.y_train.shape[1]:
+            raise ValueError(f'Dimensions do not match: D_out is {self.D_out}; output data has dimension {self.y_train.shape[1]}')
 
     def _to_torch(self,x):
+        if not isinstance(x, np.ndarray):
+            # lazy data (DataHandler.LazySet) stays on disk, minibatches are read in _batch
+            return x
         return torch.from_numpy(x).type(self.dtype)
-        
+
+    def _batch(self, x, indices):
+        '''Rows indices of the data x as torch tensor.'''
+        if isinstance(x, torch.Tensor):
+            return x[indices]
+        return torch.from_numpy(x[indices.cpu().numpy()]).type(self.dtype)
+
+
+def _autocast(device_type, enabled):
+    '''Mixed precision context of torch.autocast; a no-op if disabled.'''
+    if enabled:
+        return torch.autocast(device_type)
+    return contextlib.nullcontext()
+
+
+class BatchPrefetcher:
+    '''
+    Prepares the minibatches of the data sets in data (a list, e.g. [x_train, y_train]) in a
+    background thread, depth batches ahead of the training. The rows of a batch are gathered
+    into buffers that are reused every epoch instead of allocating new tensors: tensors are
+    gathered on their device with index_select, lazy data (DataHandler.LazySet) is read from
+    disk into pinned host buffers and copied asynchronously to the GPU.
+    The yielded tensors are overwritten a few batches later, so they must not be kept.
+    '''
+    def __init__(self, data, batch_size, dtype, depth=2):
+        assert depth >= 1, 'At least one minibatch must be prefetched'
+        self.data = data
+        self.batch_size = batch_size
+        self.depth = depth
+        self.device = torch.device('cpu' if dtype is torch.FloatTensor else 'cuda')
+        # the batch in use, the ones in the queue and the one being gathered have their own buffers
+        nr_slots = depth + 2
+        self.slots = [[self._buffer(x) for x in data] for _ in range(nr_slots)]
+        self.events = [None]*nr_slots
+
+    def _buffer(self, x):
+        shape = (self.batch_size,) + tuple(x.shape[1:])
+        if isinstance(x, torch.Tensor):
+            return {'device':torch.empty(shape, dtype=x.dtype, device=x.device)}
+        buffer = {'device':torch.empty(shape, dtype=torch.float32, device=self.device)}
+        if self.device.type == 'cuda':
+            buffer['host'] = torch.empty(shape, dtype=torch.float32).pin_memory()
+        return buffer
+
+    def epoch(self, permutation):
+        '''Generator of the minibatches, a list with a tensor per data set, in the order of permutation.'''
+        batches = queue.Queue(self.depth)
+        stop = threading.Event()
+
+        def produce():
+            try:
+                rows = permutation.cpu().numpy()
+                for nr, i in enumerate(range(0, len(permutation), self.batch_size)):
+                    if stop.is_set():
+                        return
+                    slot = nr % len(self.slots)
+                    batches.put(self._gather(slot, permutation[i:i+self.batch_size], rows[i:i+self.batch_size]))
+                batches.put(None)
+            except Exception as error:
+                batches.put(error)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+        finally:
+            # let the producer finish if the epoch is interrupted
+            stop.set()
+            while producer.is_alive():
+                try:
+                    batches.get(timeout=0.01)
+                except queue.Empty:
+                    pass
+
+    def _gather(self, slot, indices, rows):
+        if self.events[slot] is not None:
+            # the host buffers of this slot are free when their last copy to the GPU is done
+            self.events[slot].synchronize()
+        batch = []
+        for x, buffer in zip(self.data, self.slots[slot]):
+            out = buffer['device'][:len(indices)]
+            if isinstance(x, torch.Tensor):
+                torch.index_select(x, 0, indices, out=out)
+            elif 'host' in buffer:
+                host = buffer['host'][:len(rows)]
+                host.numpy()[:] = x[rows]
+                out.copy_(host, non_blocking=True)
+            else:
+                out.numpy()[:] = x[rows]
+            batch.append(out)
+        if any('host' in buffer for buffer in self.slots[slot]):
+            self.events[slot] = torch.cuda.Event()
+            self.events[slot].record()
+        return batch
+
 if __name__ == '__main__':
     #%%
     ###############################################################################
@@ -275,7 +402,7 @@ if __name__ == '__main__':
     
     from SkyNEt.modules.Nets.DataHandler import DataLoader as dl
     main_dir = r'../../test/NN_test/data4nn/Data_for_testing/' #r'D:\git_repos\SkyNEt\test\NN_test\data4nn\'
-    file_name = 'data_for_training.npz'
+    file_name = 'data_for_training'
     data = dl(main_dir, file_name, steps=3)
     
     #%%
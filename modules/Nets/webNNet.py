@@ -21,9 +21,8 @@ Structure of self.graph (dictionary):
     keys: names of vertex, values: info of vertex
     vertex info (dictionary):
         'network'       : neural network object which simulates a device
-        'train_data'    : input data which is automatically added to control voltages (torch tensor)
         'isoutput'      : wether vertex is output vertex (boolean)
-        'output'        : output data of vertex calculated by _forward_vertex (torch tensor)
+        'output'        : output data of vertex calculated by _forward_layer (torch tensor)
         'swapindices'   : indices which are used to swap columns to correct gate positions before a vertex is evaluated
         'voltage_bounds': first row contains minimum voltage values a gate can handle, second row are maxima
         'transfer'      : list of transfer functions used to map the output of a network to correct voltage range of gate
@@ -34,6 +33,18 @@ Structure of self.arcs (dictionary):
     keys: tuple: (sink_name, sink_gate)
     values: source_name
 
+Execution plan:
+check_graph compiles the graph into self._plan, a list of topological layers. 
+Each layer is a list of groups of vertices which share the same network object,
+these are evaluated together in a single batched call of the network (if self.fuse_vertices).
+Each group is a list of steps (dictionary), one for each vertex in the group:
+    'name'          : name of vertex
+    'network'       : neural network object of vertex
+    'inputs'        : slice of the columns of the input data of the graph used by this vertex
+    'swapindices'   : gather indices (torch tensor on the device of the data) to put the columns in correct gate positions
+    'arcs'          : list of (sink_gate, source_name, transfer function) of the arcs into this vertex
+The plan is compiled again when vertices or arcs are added.
+
 @author: ljknoll
 """
 
@@ -60,6 +71,10 @@ class webNNet(torch.nn.Module):
         self.nr_output_vertices = 0     # number of networks whose output data is used
         self.nr_of_params = 0           # number of parameters of network which need to be trained (excluding those set by add_parameters)
         self._params = [{'params':[]}]  # attribute which builds the parameter groups, passed to optimizer
+        self._cv_batch = None           # batch of control voltages per vertex, set by evaluate_pool
+        self._plan = None               # topological execution plan, compiled by check_graph
+        self._output_vertices = []      # names of output vertices, in order of output data
+        self._input_dim = 0             # number of columns of input data of graph
         
         # setting defaults
         self.cuda = 'cpu'
@@ -69,12 +84,14 @@ class webNNet(torch.nn.Module):
         self.custom_reg = lambda : torch.FloatTensor([0])   # function which returns the regularization of custom parameters
         self.optimizer = torch.optim.Adam                   # optimizer function
         self.transfer = torch.sigmoid                       # function which maps output to input [0,1]
+        self.fuse_vertices = True                           # evaluate vertices with the same network in one call
     
     #attach training function to class
     train, session_train = webNNetTrain.train, webNNetTrain.session_train
     
     # attach GA functions to class (optional#1)
     prepare_config_obj, set_dict_indices_from_pool, set_parameters_from_pool, trainGA = GA.prepare_config_obj, GA.set_dict_indices_from_pool, GA.set_parameters_from_pool, GA.trainGA
+    cv_from_pool, evaluate_pool = GA.cv_from_pool, GA.evaluate_pool
     noveltyGA = GA.noveltyGA
 
     
@@ -86,7 +103,6 @@ class webNNet(torch.nn.Module):
             output:         (bool) wheter of not this vertex' output is output of complete graph (boolean)
             input_gates:    (list) numbers of gates which should be used as inputs
             voltage_bounds: (2 by D_in tensor) first row are lower bounds of all control voltages, second row are upper bounds
-            evaluated:      (bool) flag indicating if vertex has already been evaluated
         """
         
         assert not hasattr(self, name), "Name %s already in use, choose other name for vertex!" % name
@@ -142,11 +158,11 @@ class webNNet(torch.nn.Module):
                               'isoutput':output,
                               'swapindices':swapindices,
                               'voltage_bounds':voltage_bounds,
-                              'transfer':transfer,
-                              'evaluated':False}
+                              'transfer':transfer}
         
         if output:
             self.nr_output_vertices  += 1
+        self._plan = None
             
     def add_arc(self, source_name, sink_name, sink_gate):
         """Adds arc to graph, which connects an output of one vertex to the input of another.
@@ -158,6 +174,7 @@ class webNNet(torch.nn.Module):
         # check if gate is already in use, combination of sink gate and sink name must be unique!
         assert (sink_name, sink_gate) not in self.arcs, "Sink gate (%s, %s), already in use!" % (sink_name, sink_gate)
         self.arcs[(sink_name, sink_gate)] = source_name
+        self._plan = None
     
     def add_parameters(self, parameter_names, parameters, custom_reg = None, **kwargs):
         """Adds custom parameters to be trained to web
@@ -182,62 +199,71 @@ class webNNet(torch.nn.Module):
     
     def forward(self, x):
         """Evaluates the graph, returns output (torch.tensor)
-        Start at network which is the output of the whole graph, 
-        then recursively step through graph vertex by vertex
+        Runs the execution plan compiled by check_graph layer by layer, 
+        so each vertex is evaluated after the vertices it depends on.
+        If self._cv_batch is set (see evaluate_pool), the graph is evaluated for all
+        sets of control voltages at once and the output has an extra leading dimension.
         """
+        if self._plan is None:
+            self.check_graph(verbose=False)
         
         # reset output of the graph
-        self._clear_output()
+        self.output_data = None
         
         # define input data for all networks
         self._set_input_data(x)
         
-        tuple_data = ()
-        for key,value in self.graph.items():
-            # start at vertex which is defined as output
-            if value['isoutput']:
-                # recursively evaluate vertices
-                self._forward_vertex(key)
-                return_value = value['output']
-                tuple_data += (return_value,)
-        returned_data = torch.cat(tuple_data, dim=1)
+        outputs = {}
+        for layer in self._plan:
+            self._forward_layer(layer, x, outputs)
+        returned_data = torch.cat([outputs[name] for name in self._output_vertices], dim=-1)
         self.output_data = returned_data.data
         return returned_data
 
-    def _forward_vertex(self, vertex):
-        """Calculates output of vertex"""
-        v = self.graph[vertex]
-        
-        # skip if vertex is already evaluated
-        if not v['evaluated']:
-            # control voltages, repeated to match batch size of train_data
-            cv_data = getattr(self, vertex).repeat(self._batch_size, 1)
-            
-            # concatenate input with control voltage data
-            try:
-                data = torch.cat((v['train_data']*self.scale + self.bias, cv_data), dim=1) # If scale and bias are parameters
-            except AttributeError: 
-                data = torch.cat((v['train_data'], cv_data), dim=1)
-            
-            # swap columns according to input/control indices
-            data = data[:,self.graph[vertex]['swapindices']]
-            
-            # check dependencies of vertex by looping through all arcs
-            for sink,source_name in self.arcs.items():
-                sink_name, sink_gate = sink
-                # if current vertex is also vertex that the arc is pointing to,
-                # that means we need the data through that arc
-                if sink_name == vertex:
-                    # first evaluate vertices on which this input depends
-                    self._forward_vertex(source_name)
-                    # insert data from arc into control voltage parameters with correct transfer function
-                    data[:, sink_gate] = v['transfer'][sink_gate](self.graph[source_name]['output'][:,0])
-            # feed through network
+    def _forward_layer(self, layer, x, outputs):
+        """Calculates output of all vertices in layer, the vertices in previous layers
+        must already be in the dictionary outputs"""
+        for group in layer:
+            if self.fuse_vertices and len(group) > 1:
+                # stack the data of vertices with the same network and feed it at once
+                data = torch.stack([self._vertex_data(step, x, outputs) for step in group])
+                group_output = group[0]['network'].outputs(data,grad=True)
+                for step, output in zip(group, group_output):
+                    outputs[step['name']] = output
+                    self.graph[step['name']]['output'] = output
+            else:
+                for step in group:
+                    data = self._vertex_data(step, x, outputs)
+                    # feed through network
+                    outputs[step['name']] = step['network'].outputs(data,grad=True)
+                    self.graph[step['name']]['output'] = outputs[step['name']]
 
-            v['output'] = v['network'].outputs(data,grad=True)
-            v['evaluated'] = True
+    def _vertex_data(self, step, x, outputs):
+        """Builds input data of vertex from input data of graph, control voltages and arcs"""
+        # control voltages, broadcasted to match batch size of train_data
+        if self._cv_batch is None:
+            cv_data = getattr(self, step['name']).expand(self._batch_size, -1)
+        else:
+            # (genomes, nr_cv) -> (genomes, batch_size, nr_cv)
+            cv_data = self._cv_batch[step['name']][:,None,:].expand(-1, self._batch_size, -1)
+        
+        # concatenate input with control voltage data
+        train_data = x[:, step['inputs']]
+        if self._scaled:
+            train_data = train_data*self.scale + self.bias # If scale and bias are parameters
+        train_data = train_data.expand(cv_data.shape[:-1] + train_data.shape[-1:])
+        data = torch.cat((train_data, cv_data), dim=-1)
+        
+        # swap columns according to input/control indices, the indices are moved once to the device of the data
+        if step['swapindices'].device != data.device:
+            step['swapindices'] = step['swapindices'].to(data.device)
+        data = data.index_select(-1, step['swapindices'])
+        
+        # insert data from arcs into control voltage parameters with correct transfer function
+        for sink_gate, source_name, transfer in step['arcs']:
+            data[..., sink_gate] = transfer(outputs[source_name][...,0])
+        return data
 
-    
     def error_fn(self, y_pred, y, beta):
         """Error function: loss function with added regularization"""        
         # calculate regularization of control voltage parameters
@@ -251,19 +277,12 @@ class webNNet(torch.nn.Module):
 
     
     def _set_input_data(self, x):
-        """Store training data for each network, assumes the torch tensor has the same ordering as in the dictionary"""
-        # assumes each vertex has same number of parameters (could change in future)
+        """Checks input data of the graph, the columns used by each vertex are set in the plan by check_graph"""
         dim = x.shape[1]
-        # if input data is provided for each network
-        if dim+self.nr_of_params is 7*len(self.graph):
-            i = 0
-            for key,v in self.graph.items():
-                nr_columns = v['network'].D_in-v['voltage_bounds'].shape[1] # nr of columns of x to be used for this vertex
-                v['train_data'] = x[:,i:i+nr_columns]
-                i += nr_columns
-        else:
-            assert False, "Size of input data is incorrect, expected (%i), got (%i)" % (7*len(self.graph) - self.nr_of_params, dim)
+        assert dim == self._input_dim, "Size of input data is incorrect, expected (%i), got (%i)" % (self._input_dim, dim)
         self._batch_size = x.shape[0]
+        # If scale and bias are parameters, the input data is scaled
+        self._scaled = hasattr(self, 'scale') and hasattr(self, 'bias')
 
     def get_parameters(self):
         """Returns a copy of all learnable parameters of object in dictionary"""
@@ -311,13 +330,6 @@ class webNNet(torch.nn.Module):
         """Returns last computed output of web"""
         return torch.tensor(self.output_data.data, device=self.cuda)
     
-    def _clear_output(self):
-        """Reset output data of graph, NOT the parameters"""
-        self.output_data = None
-        for v in self.graph.values():
-            # reset evaluated flag
-            v['evaluated'] = False
-
     def check_cuda(self, *args):
         """Converts tensors that are going to be used to cuda"""
         if torch.cuda.is_available():
@@ -364,6 +376,8 @@ class webNNet(torch.nn.Module):
                 if arcs[sink] in independent_vertices:
                     del arcs[sink]
         
+        self._compile_plan(layers)
+        
         input_order = self.graph.keys()
         output_order = [key if value['isoutput'] else '' for key,value in self.graph.items()]
         if verbose:
@@ -413,3 +427,33 @@ class webNNet(torch.nn.Module):
             plt.tight_layout()
             plt.show()
         # ------------------- END plot graph ------------------- 
+
+    def _compile_plan(self, layers):
+        """Compiles the topological layers of the graph into the execution plan used by forward"""
+        # columns of the input data used by each vertex, in order of the graph
+        columns = {}
+        i = 0
+        for key,v in self.graph.items():
+            nr_columns = v['network'].D_in-v['voltage_bounds'].shape[1] # nr of columns of x to be used for this vertex
+            columns[key] = slice(i, i+nr_columns)
+            i += nr_columns
+        self._input_dim = i
+        
+        # arcs going into each vertex
+        arcs_in = {key:[] for key in self.graph.keys()}
+        for (sink_name, sink_gate), source_name in self.arcs.items():
+            arcs_in[sink_name].append((sink_gate, source_name, self.graph[sink_name]['transfer'][sink_gate]))
+        
+        self._plan = []
+        for layer in layers:
+            # group vertices of this layer which share the same network object
+            groups = odict()
+            for name in layer:
+                network = self.graph[name]['network']
+                groups.setdefault(id(network), []).append({'name':name,
+                        'network':network,
+                        'inputs':columns[name],
+                        'swapindices':torch.tensor(self.graph[name]['swapindices'], dtype=torch.long, device=self.cuda),
+                        'arcs':arcs_in[name]})
+            self._plan.append(list(groups.values()))
+        self._output_vertices = [key for key,value in self.graph.items() if value['isoutput']]
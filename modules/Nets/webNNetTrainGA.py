@@ -41,20 +41,18 @@ def trainGA(self,
     
     # Temporary arrays, overwritten each generation
     fitnessTemp = np.zeros((cf.genomes, cf.fitnessavg))
-    outputAvg = torch.zeros(cf.fitnessavg, train_data.shape[0], self.nr_output_vertices, device=self.cuda)
-    outputTemp = torch.zeros(cf.genomes, train_data.shape[0], self.nr_output_vertices, device=self.cuda)
+    outputAvg = torch.zeros(cf.fitnessavg, cf.genomes, train_data.shape[0], self.nr_output_vertices, device=self.cuda)
 
     for i in range(cf.generations):
-        for j in range(cf.genomes):
-            for avgIndex in range(cf.fitnessavg):
-                # update parameters of each network
-                self.set_parameters_from_pool(genepool.pool[j])
-                self.forward(train_data)
-                outputAvg[avgIndex] = self.get_output()
+        for avgIndex in range(cf.fitnessavg):
+            # evaluate the web for all genomes at once
+            outputAvg[avgIndex] = self.evaluate_pool(train_data, genepool.pool)
+            for j in range(cf.genomes):
                 # use negative loss as fitness for genepool.NextGen()
-                fitnessTemp[j, avgIndex] = -cf.Fitness(outputAvg[avgIndex], target_data).item()
-                
-            outputTemp[j] = outputAvg[np.argmin(fitnessTemp[j])]
+                fitnessTemp[j, avgIndex] = -cf.Fitness(outputAvg[avgIndex, j], target_data).item()
+        
+        worst = np.argmin(fitnessTemp, axis=1)
+        outputTemp = outputAvg[worst, np.arange(cf.genomes)]
         
         genepool.fitness = fitnessTemp.min(1)  # Save best fitness
 
@@ -121,6 +119,33 @@ def set_parameters_from_pool(self, pool):
             # replace parameter par_name values with values from pool
             replacement = [next(pool_iter) for _ in range(len(indices))]
             getattr(self, par_name)[indices] = torch.tensor(replacement, dtype=torch.float32, device=self.cuda)
+
+def cv_from_pool(self, pool):
+    """ Same as set_parameters_from_pool(), but for all genomes in pool at once.
+    Returns a dictionary with a tensor (genomes, nr of parameters) for each 
+    parameter; values not in the pool are copied from the current parameters """
+    pool = torch.tensor(pool, dtype=torch.float32, device=self.cuda)
+    cv_batch = {}
+    c = 0
+    for par_name, indices in self.indices.items():
+        values = getattr(self, par_name).detach().expand(len(pool), -1).clone()
+        values[:, indices] = pool[:, c:c+len(indices)]
+        c += len(indices)
+        cv_batch[par_name] = values
+    return cv_batch
+
+def evaluate_pool(self, train_data, pool):
+    """ Evaluates the web for all genomes in pool in a single batched forward pass 
+    over (genomes, data_size), returns output of shape (genomes, data_size, output_size).
+    Only the control voltages of the vertices are taken from the pool, 
+    custom parameters (e.g. scale and bias) keep their current value. """
+    with torch.no_grad(): # do not track gradients
+        self._cv_batch = self.cv_from_pool(pool)
+        try:
+            output = self.forward(train_data)
+        finally:
+            self._cv_batch = None
+    return output
             
             
             
@@ -198,31 +223,26 @@ def noveltyGA(self,
 
     # Temporary arrays, overwritten each generation
     fitnessTemp = np.zeros((cf.genomes, cf.fitnessavg))
-    outputAvg = torch.zeros(cf.fitnessavg, train_data.shape[0], self.nr_output_vertices, device=self.cuda)
-    outputTemp = torch.zeros(cf.genomes, train_data.shape[0], self.nr_output_vertices, device=self.cuda)
+    outputAvg = torch.zeros(cf.fitnessavg, cf.genomes, train_data.shape[0], self.nr_output_vertices, device=self.cuda)
 
     with torch.no_grad():
-        for i in range(initial_archive_size):
-            self.reset_parameters('rand')
-            archive[i] = np.random.rand(cf.genes)
-            self.set_parameters_from_pool(archive[i])
-            self.forward(train_data)
-            temp = self.get_output(False, False)
-            if normalize:
-                temp = (temp-torch.mean(temp, dim=0))/torch.std(temp, dim=0)
-            archive_output[i] = temp
+        self.reset_parameters('rand')
+        archive[:initial_archive_size] = np.random.rand(initial_archive_size, cf.genes)
+        temp = self.evaluate_pool(train_data, archive[:initial_archive_size])
+        if normalize:
+            temp = (temp-torch.mean(temp, dim=1, keepdim=True))/torch.std(temp, dim=1, keepdim=True)
+        archive_output[:initial_archive_size] = temp
         current_size = initial_archive_size
         nr_genomes_added = 0
         for i in range(cf.generations):
-            for j in range(cf.genomes):
-                for avgIndex in range(cf.fitnessavg):
-                    # update parameters of each network
-                    self.set_parameters_from_pool(genepool.pool[j])
-                    self.forward(train_data)
-                    outputAvg[avgIndex] = self.get_output()
-                    fitnessTemp[j, avgIndex] = sparseness(outputAvg[avgIndex], archive_output, current_size).item()
-
-                outputTemp[j] = outputAvg[np.argmax(fitnessTemp[j])]
+            for avgIndex in range(cf.fitnessavg):
+                # evaluate the web for all genomes at once
+                outputAvg[avgIndex] = self.evaluate_pool(train_data, genepool.pool)
+                for j in range(cf.genomes):
+                    fitnessTemp[j, avgIndex] = sparseness(outputAvg[avgIndex, j], archive_output, current_size).item()
+
+            best = np.argmax(fitnessTemp, axis=1)
+            outputTemp = outputAvg[best, np.arange(cf.genomes)]
 
             genepool.fitness = fitnessTemp.max(1)  # Save best fitness of averages
 
@@ -27,14 +27,17 @@ class God:
             self.save()
         
     def reset(self):
-        #Define placeholders
-        self.geneArray = np.zeros((self.subject.generations, self.subject.genomes, self.subject.genes))
-        self.outputArray = np.zeros((self.subject.generations, self.subject.genomes, len(self.subject.target_wfm)))
-        self.fitnessArray = -np.inf*np.ones((self.subject.generations, self.subject.genomes))
         # Initialize save directory
         self.saveDirectory = SaveLib.createSaveDirectory(
                                         self.subject.savepath,
                                         self.subject.dirname)
+        #Define placeholders, memory-mapped in the Results_GA store of the save directory
+        self.store = SaveLib.ResultStore(os.path.join(self.saveDirectory, 'Results_GA'))
+        self.geneArray = self.store.create('geneArray', (self.subject.generations, self.subject.genomes, self.subject.genes))
+        self.outputArray = self.store.create('outputArray', (self.subject.generations, self.subject.genomes, len(self.subject.target_wfm)))
+        self.fitnessArray = self.store.create('fitnessArray', (self.subject.generations, self.subject.genomes), fill_value=-np.inf)
+        self.store.save(mask = self.subject.filter_array)
+        SaveLib.copyFiles(self.saveDirectory)
         # Save experiment configurations
         self.config_dict['target'] = self.subject.target_wfm
         self.config_dict['inputs'] = self.subject.inputs_wfm
@@ -51,8 +54,48 @@ class God:
         return max_fitness, best_genome, best_output
     
     def save(self):
-        SaveLib.saveExperiment(self.saveDirectory, filename='Results_GA',
-                                                   geneArray = self.geneArray,
-                                                   outputArray = self.outputArray,
-                                                   fitnessArray = self.fitnessArray,
-                                                   mask = self.subject.filter_array)
\ No newline at end of file
+        # Only the generations written since the last checkpoint go to disk
+        self.store.flush()
+
+class Migrator:
+    '''Observer exchanging genomes between islands of the island model GA.
+    Every migration_interval generations it sends the fittest migrants genomes
+    of its subject to the next island via outbox, and replaces the worst genomes
+    of its subject with the ones received from the previous island via inbox.
+    A None in the inbox means that the previous island has stopped.
+    '''
+    
+    def __init__(self, config_dict, inbox, outbox):
+        self.subject = None
+        self.migration_interval = config_dict['migration_interval']
+        self.migrants = config_dict['migrants']
+        self.inbox = inbox
+        self.outbox = outbox
+        
+    def update(self, next_sate):
+        gen = next_sate['generation']
+        if (gen+1)%self.migration_interval != 0:
+            return
+        best = np.argsort(next_sate['fitness'])[::-1][:self.migrants]
+        self.outbox.put((next_sate['genes'][best], 
+                         next_sate['outputs'][best], 
+                         next_sate['fitness'][best]))
+        if self.inbox is None:
+            return
+        immigrants = self.inbox.get()
+        if immigrants is None:
+            print('--- previous island stopped, no more immigrants ---')
+            self.inbox = None
+            return
+        genes, outputs, fitness = immigrants
+        worst = np.argsort(next_sate['fitness'])[:len(fitness)]
+        # Rebind instead of changing in place, other observers hold next_sate
+        pool = next_sate['genes'].copy()
+        pool[worst] = genes
+        self.subject.pool = pool
+        all_outputs = next_sate['outputs'].copy()
+        all_outputs[worst] = outputs
+        self.subject.outputs = all_outputs
+        all_fitness = next_sate['fitness'].copy()
+        all_fitness[worst] = fitness
+        self.subject.fitness = all_fitness
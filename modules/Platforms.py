@@ -12,18 +12,125 @@ Created on Wed Aug 21 11:34:14 2019
 
 import numpy as np
 import importlib
+import os
+import threading
+from itertools import repeat
+from collections import OrderedDict, deque
 from SkyNEt.config.acceleration import Accelerator
 #TODO: Add chip platform
-#TODO: Add simulation platform
 #TODO: Target wave form as argument can be left out if output dimension is known internally
 
 #%% Chip platform to measure the current output from voltage configurations of disordered NE systems
 class chip:
+    '''Measures each genome on the device through the measurement backend defined by
+    platform_dict['backend'] (see SkyNEt.instruments.MeasurementBackends): the control 
+    genes (in V) are set as static control voltages and the inputs are written with the 
+    backend's IO at sample frequency platform_dict['fs']. With the simulated backend the
+    GA runs without the lab setup.
+    The genomes are measured in the order with the least ramping of the DACs and after each
+    change the platform waits for the settling time given by the optional keys 'settle_tau' 
+    (s, default 0: no waiting), 'settle_tolerance' (mV, default 1) and 'settle_min' (s, least
+    wait after every change, default 0), see RampScheduler.
+    
+    Surrogate-assisted pre-screening: if platform_dict['surrogate'] is given (the platform_dict 
+    of an nn platform with the staNNet model of the device) all genomes are first evaluated 
+    with the surrogate and scored with the fitness function platform_dict['fitness']. Only the 
+    'measure_best' genomes with the highest surrogate fitness (default 5) and 'measure_random' 
+    other genomes chosen at random (default 1, to explore where the surrogate is wrong) are 
+    measured; the others get the outputs of the surrogate. The measured outputs are reused for 
+    the same genome (e.g. the elite) for 'remeasure_interval' generations (default 5), after 
+    which the genome is measured again to follow the drift of the device.
+    The uncertainty of the surrogate is the RMS difference between the measured and the 
+    surrogate fitness of the last measured genomes; after each evaluation self.penalty holds, 
+    for each genome, 'penalty' (default 1) times this uncertainty if it was not measured and 0 
+    otherwise. GA subtracts it from the fitness. With platform_dict['verbose'] = True the
+    number of measured, reused and surrogate genomes is printed after each evaluation.
+    The penalty and the measured genomes are kept per instance, so the pre-screening cannot
+    be sharded over workers (see Grabber.get_platform).
+    '''
     def __init__(self, platform_dict):
-        pass
+        Backends = importlib.import_module('SkyNEt.instruments.MeasurementBackends')
+        RampScheduler = importlib.import_module('SkyNEt.modules.RampScheduler').RampScheduler
+        self.backend = Backends.get_backend(platform_dict['backend'])
+        settle_tau = platform_dict['settle_tau'] if platform_dict.__contains__('settle_tau') else 0.
+        settle_tolerance = platform_dict['settle_tolerance'] if platform_dict.__contains__('settle_tolerance') else 1.
+        settle_min = platform_dict['settle_min'] if platform_dict.__contains__('settle_min') else 0.
+        self.scheduler = RampScheduler(self.backend.setControlVoltages, settle_tau, settle_tolerance,
+                                       minimum=settle_min)
+        self.fs = platform_dict['fs']
+        self.amplification = platform_dict['amplification']
+        self.control_indx = platform_dict['control_indx']
+        if platform_dict.__contains__('inputPorts'):
+            self.inputPorts = platform_dict['inputPorts']
+        else:
+            self.inputPorts = [1, 0, 0, 0, 0, 0, 0]
+        
+        if platform_dict.__contains__('surrogate'):
+            Grabber = importlib.import_module('SkyNEt.modules.Grabber')
+            self.surrogate = nn(platform_dict['surrogate'])
+            self.Fitness = Grabber.get_fitness(platform_dict['fitness'])
+            get = lambda key, default: platform_dict[key] if platform_dict.__contains__(key) else default
+            self.measure_best = get('measure_best', 5)
+            self.measure_random = get('measure_random', 1)
+            self.remeasure_interval = get('remeasure_interval', 5)
+            self.penalty_factor = get('penalty', 1.)
+            self.verbose = get('verbose', False)
+            self.measured = {} # quantised genome -> (generation, output) of the measured genomes
+            self.residuals = deque(maxlen=50) # measured - surrogate fitness of the last measured genomes
+            self.generation = 0
+        else:
+            self.surrogate = None
+        self.penalty = None
     
-    def evaluatePopulation(self,inputs_wfm, gene_pool, target_wfm):
-        pass
+    def evaluatePopulation(self,inputs_wfm, genePool, target_wfm):
+        if self.surrogate is None:
+            self.penalty = np.zeros(len(genePool))
+            return self.measure(inputs_wfm, genePool, target_wfm)
+        
+        self.generation += 1
+        self.measured = {key:value for key, value in self.measured.items() 
+                         if self.generation - value[0] < self.remeasure_interval}
+        keys = [gene.tobytes() for gene in np.round(genePool*1e6).astype(np.int64)]
+        outputPopul = np.zeros((len(genePool),target_wfm.shape[-1]))
+        known = np.array([key in self.measured for key in keys], dtype=bool)
+        for j in np.flatnonzero(known):
+            outputPopul[j] = self.measured[keys[j]][1]
+        
+        # Pre-screen the other genomes with the surrogate and measure the most promising ones
+        screened = np.flatnonzero(~known)
+        selected = np.zeros(0, dtype=int)
+        if len(screened):
+            surrogate_outputs = self.surrogate.evaluatePopulation(inputs_wfm, genePool[screened], target_wfm)
+            surrogate_fitness = self.Fitness(surrogate_outputs, target_wfm)
+            ranking = np.argsort(surrogate_fitness)[::-1]
+            best, rest = ranking[:self.measure_best], ranking[self.measure_best:]
+            explore = np.random.permutation(rest)[:self.measure_random]
+            selected = np.concatenate((best, explore)).astype(int)
+            
+            outputPopul[screened] = surrogate_outputs
+            if len(selected):
+                outputs = self.measure(inputs_wfm, genePool[screened[selected]], target_wfm)
+                outputPopul[screened[selected]] = outputs
+                self.residuals.extend(self.Fitness(outputs, target_wfm) - surrogate_fitness[selected])
+                for j, output in zip(screened[selected], outputs):
+                    self.measured[keys[j]] = (self.generation, output)
+        
+        uncertainty = np.sqrt(np.mean(np.square(self.residuals))) if self.residuals else 0.
+        self.penalty = np.zeros(len(genePool))
+        self.penalty[np.delete(screened, selected)] = self.penalty_factor*uncertainty
+        if self.verbose:
+            print(f'{len(selected)} genomes measured, {np.sum(known)} reused, '
+                  f'{len(screened)-len(selected)} from the surrogate (uncertainty {uncertainty:.3g})')
+        return outputPopul
+    
+    def measure(self,inputs_wfm, genePool, target_wfm):
+        '''Measures the outputs of all genomes in genePool on the device.'''
+        outputPopul = np.zeros((len(genePool),target_wfm.shape[-1]))
+        # The DACs are set in mV
+        for j in self.scheduler.sweep(genePool[:,self.control_indx]*1000):
+            outputPopul[j] = self.backend.IO(inputs_wfm, self.fs, inputPorts=self.inputPorts)[0]
+        
+        return self.amplification*outputPopul
 
 #%% NN platform using models loaded form staNNet
 class nn:
@@ -51,37 +158,194 @@ class nn:
         else:  
             self.trafo_indx = None
             self.trafo = lambda x,y: x #define trafo as identity
+        self.g_index = np.delete(np.arange(self.nn_input_dim),self.input_indx)
+        
+        # Nr of genomes fed to the NN in a single forward pass (None: whole pool)
+        if platform_dict.__contains__('batch_size'):
+            self.batch_size = platform_dict['batch_size']
+        else:
+            self.batch_size = None
 
     def evaluatePopulation(self,inputs_wfm, genePool, target_wfm):
         genomes = len(genePool)
         outputPopul = np.zeros((genomes,target_wfm.shape[-1]))
+        chunk = max(1, genomes if self.batch_size is None else self.batch_size)
         
-        for j in range(genomes):
-            # Set the input scaling
-            # inputs_wfm.shape -> (nr-inputs,nr-time-steps)
-            x = self.trafo(inputs_wfm, genePool[j, self.trafo_indx])
-        
-            # Feed input to NN
-            #target_wfm.shape, genePool.shape --> (time-steps,) , (nr-genomes,nr-genes)
-            g = np.ones_like(target_wfm)[:,np.newaxis]*genePool[j,self.control_indx,np.newaxis].T
-            g_index = np.delete(np.arange(self.nn_input_dim),self.input_indx)
-            #g.shape,x.shape --> (time-steps,nr-CVs) , (input-dim, time-steps)
-            x_dummy = np.empty((g.shape[0],self.nn_input_dim)) # dims of input (time-steps)xD_in
-            x_dummy[:,self.input_indx] = x.T
-            x_dummy[:,g_index] = g 
-            inputs = Accelerator.format_numpy(x_dummy)
+        for j in range(0, genomes, chunk):
+            x_dummy = self.batch_inputs(inputs_wfm, genePool[j:j+chunk])
+            # Flatten to (genomes*time-steps)xD_in so all genomes go in one forward pass
+            inputs = Accelerator.format_numpy(x_dummy.reshape(-1,self.nn_input_dim))
             output = self.net.outputs(inputs)
-            outputPopul[j] = output
+            outputPopul[j:j+chunk] = output.reshape(x_dummy.shape[:2])
         
         return self.amplification*np.asarray(outputPopul)
+    
+    def batch_inputs(self, inputs_wfm, genePool):
+        '''Builds the NN input for a batch of genomes as an array of shape 
+        (nr-genomes, time-steps, D_in), with the (transformed) inputs in 
+        self.input_indx and the control genes broadcasted over time.
+        '''
+        # inputs_wfm.shape -> (nr-inputs,nr-time-steps)
+        x_dummy = np.empty((len(genePool),inputs_wfm.shape[-1],self.nn_input_dim))
+        if self.trafo_indx is None:
+            x_dummy[:,:,self.input_indx] = inputs_wfm.T
+        else:
+            # Set the input scaling per genome
+            for j in range(len(genePool)):
+                x = self.trafo(inputs_wfm, genePool[j, self.trafo_indx])
+                x_dummy[j][:,self.input_indx] = x.T
+        x_dummy[:,:,self.g_index] = genePool[:,self.control_indx][:,np.newaxis,:]
+        return x_dummy
 
 #%% Simulation platform for physical MC simulations of devices 
 class kmc:
+    '''Simulates the device with the kinetic Monte Carlo engine KMC.DopantNetwork.
+    The device is a rectangle of platform_dict['xdim'] x platform_dict['ydim'] nm with
+    electrodes at the positions platform_dict['electrodes'] (list of (x,y) in nm) and either
+    the dopants at 'acceptors' and 'donors' (arrays of positions in nm) or 'N' acceptors
+    and 'M' donors at random positions (drawn with the optional 'layout_seed').
+    The inputs (in V) are applied on the electrodes platform_dict['in_list'], the current is
+    read on the electrode platform_dict['out_indx'] and the genes platform_dict['control_indx']
+    are the voltages (in V) of the other electrodes, in order.
+    Optional keys: the physical parameters 'T', 'ab', 'eps_r', 'nu' and 'grid' of DopantNetwork, 
+    'hops' (default 10000), 'equilibration' (default 1000) and 'tolerance' (default 0.01) of 
+    DopantNetwork.simulate and 'amplification' (default 1) of the current.
+    Each distinct input level is simulated once per genome, all genomes and levels together.
+    '''
     def __init__(self, platform_dict):
-        pass
+        KMC = importlib.import_module('SkyNEt.modules.KMC')
+        get = lambda key, default: platform_dict[key] if platform_dict.__contains__(key) else default
+        physics = {key:platform_dict[key] for key in ['T', 'ab', 'eps_r', 'nu', 'grid'] 
+                   if platform_dict.__contains__(key)}
+        if platform_dict.__contains__('acceptors'):
+            self.network = KMC.DopantNetwork(platform_dict['acceptors'], platform_dict['donors'], 
+                                             platform_dict['electrodes'], platform_dict['xdim'], 
+                                             platform_dict['ydim'], **physics)
+        else:
+            self.network = KMC.DopantNetwork.random(platform_dict['N'], platform_dict['M'], 
+                                                    platform_dict['electrodes'], platform_dict['xdim'], 
+                                                    platform_dict['ydim'], seed=get('layout_seed', None), **physics)
+        self.hops = get('hops', 10000)
+        self.equilibration = get('equilibration', 1000)
+        self.tolerance = get('tolerance', 0.01)
+        self.amplification = get('amplification', 1.)
+        self.input_indx = platform_dict['in_list']
+        self.out_indx = platform_dict['out_indx']
+        self.control_indx = platform_dict['control_indx']
+        self.c_index = np.delete(np.arange(self.network.P), np.append(self.input_indx, self.out_indx))
+        print(f'Initializing KMC platform with {len(self.c_index)} control electrodes')
+        assert len(self.c_index) == len(self.control_indx)
     
     def evaluatePopulation(self,inputs_wfm, gene_pool, target_wfm):
-        pass
+        levels, samples = np.unique(np.asarray(inputs_wfm).T, axis=0, return_inverse=True)
+        voltages = np.zeros((len(gene_pool), len(levels), self.network.P))
+        voltages[:, :, self.input_indx] = levels
+        voltages[:, :, self.c_index] = gene_pool[:, np.newaxis, self.control_indx]
+        currents = self.network.simulate(voltages.reshape(-1, self.network.P), hops=self.hops,
+                                         equilibration=self.equilibration, tolerance=self.tolerance)
+        outputs = currents[:, self.out_indx].reshape(len(gene_pool), len(levels))
+        return self.amplification*outputs[:, samples.ravel()]
+
+#%% Parallel platform sharding the population over a pool of workers
+class parallel:
+    '''Wraps the platform given by platform_dict['modality'] and splits the gene pool
+    over platform_dict['workers'] workers, each holding its own instance of the platform
+    (e.g. its own loaded staNNet). The outputs are returned in pool order.
+    The pool is a process pool by default, set platform_dict['pool'] = 'thread' 
+    for a thread pool (the key 'backend' is the measurement backend of the chip).
+    NOTE: With the process backend on Windows the platform_dict is pickled, so a trafo 
+    must be defined at module level and the script must be guarded by __main__.
+    '''
+    def __init__(self, platform_dict):
+        self.workers = platform_dict['workers']
+        if platform_dict.__contains__('pool'):
+            self.pool = platform_dict['pool']
+        else:
+            self.pool = 'process'
+        worker_dict = platform_dict.copy()
+        worker_dict['workers'] = 1
+        worker_dict['cache_size'] = 0 # the parallel platform is cached as a whole
+        
+        futures = importlib.import_module('concurrent.futures')
+        if self.pool == 'process':
+            # Share the cores among the workers instead of oversubscribing them
+            nr_threads = max(1, os.cpu_count()//self.workers)
+            self.executor = futures.ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                                        initargs=(worker_dict, nr_threads))
+        elif self.pool == 'thread':
+            self.executor = futures.ThreadPoolExecutor(self.workers, initializer=_init_worker,
+                                                       initargs=(worker_dict, None))
+        else:
+            raise NotImplementedError(f"Pool {self.pool} is not recognized!")
+        print(f"Initializing {platform_dict['modality']} platform on {self.workers} {self.pool} workers")
+    
+    def evaluatePopulation(self,inputs_wfm, genePool, target_wfm):
+        shards = np.array_split(genePool, min(self.workers, len(genePool)))
+        outputs = self.executor.map(_evaluate_shard, shards, repeat(inputs_wfm), repeat(target_wfm))
+        return np.concatenate(list(outputs))
+    
+    def submit(self, inputs_wfm, genePool, target_wfm):
+        '''Evaluates genePool on the next free worker; returns a Future with its outputs.'''
+        return self.executor.submit(_evaluate_shard, genePool, inputs_wfm, target_wfm)
+    
+    def close(self):
+        self.executor.shutdown()
+
+#%% Cache of the outputs of deterministic platforms
+class cached:
+    '''Memoizes the outputs of a deterministic platform per genome, so genomes evaluated
+    before (e.g. the elite copied unchanged by GA.NextGen) are not evaluated again.
+    The genes are quantised to platform_dict['cache_resolution'] (default 1e-6) to form the
+    keys and at most platform_dict['cache_size'] outputs (default 1000) are kept, dropping
+    the least recently used. The cache is cleared when the inputs or the target change.
+    Other attributes (e.g. submit and close of the parallel platform) are those of the
+    wrapped platform. Grabber.get_platform only uses it for deterministic platforms.
+    '''
+    def __init__(self, platform, platform_dict):
+        self.platform = platform
+        self.resolution = platform_dict['cache_resolution'] if platform_dict.__contains__('cache_resolution') else 1e-6
+        self.size = platform_dict['cache_size'] if platform_dict.__contains__('cache_size') else 1000
+        self.outputs = OrderedDict()
+        self.waveforms = None
+    
+    def evaluatePopulation(self,inputs_wfm, genePool, target_wfm):
+        waveforms = (np.asarray(inputs_wfm).tobytes(), np.asarray(target_wfm).tobytes())
+        if waveforms != self.waveforms:
+            self.outputs.clear()
+            self.waveforms = waveforms
+        keys = [gene.tobytes() for gene in np.round(genePool/self.resolution).astype(np.int64)]
+        # The first genome of each key not in the cache, so repeated genomes are evaluated once
+        missing = {}
+        for j, key in enumerate(keys):
+            if key not in self.outputs and key not in missing:
+                missing[key] = j
+        missing = list(missing.values())
+        outputs = np.zeros((len(genePool),target_wfm.shape[-1]))
+        if missing:
+            evaluated = self.platform.evaluatePopulation(inputs_wfm, genePool[missing], target_wfm)
+            for j, output in zip(missing, evaluated):
+                self.outputs[keys[j]] = output.copy()
+        for j, key in enumerate(keys):
+            self.outputs.move_to_end(key)
+            outputs[j] = self.outputs[key]
+        while len(self.outputs) > self.size:
+            self.outputs.popitem(last=False)
+        return outputs
+    
+    def __getattr__(self, name):
+        return getattr(self.platform, name)
+
+# Platform instance of each worker of the parallel platform
+_worker = threading.local()
+
+def _init_worker(platform_dict, nr_threads):
+    if nr_threads:
+        importlib.import_module('torch').set_num_threads(nr_threads)
+    Grabber = importlib.import_module('SkyNEt.modules.Grabber')
+    _worker.platform = Grabber.get_platform(platform_dict)
+
+def _evaluate_shard(genePool, inputs_wfm, target_wfm):
+    return _worker.platform.evaluatePopulation(inputs_wfm, genePool, target_wfm)
 
 #%% MAIN function (for debugging)    
 if __name__ == '__main__':
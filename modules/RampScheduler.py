@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Schedules the configurations of control voltages measured on the chip (genomes
+or grid points). The configurations are visited in an order that keeps the
+ramping of the DACs small, and each one is set directly after the previous one,
+waiting only for the settling time of that change instead of a fixed sleep.
+
+All DACs ramp together (IVVI.set_dacs), so the distance between two
+configurations is the largest change of a single DAC. The settling time of a
+change of d mV is modelled as an exponential transient with time constant tau
+that has to decay below the tolerance (in mV):
+    t = tau * ln(d / tolerance)  if d > tolerance, else 0
+and at least a fixed minimum time is waited after every change (e.g. the fixed
+sleep of a script, until tau has been measured for the setup).
+Grids made with GridConstructor.gridConstructor already change a single
+electrode by one step between consecutive points, so they are swept in their
+own order (reorder=False).
+"""
+import time
+import numpy as np
+
+
+def nearest_neighbour_order(configs, start=None):
+    '''Greedy nearest-neighbour tour over configs (N x D array, in mV) from start
+    (default: all voltages zero). Returns the order as an array of indices.
+    '''
+    configs = np.asarray(configs, dtype=float)
+    current = np.zeros(configs.shape[1]) if start is None else np.asarray(start, dtype=float)
+    visited = np.zeros(len(configs), dtype=bool)
+    order = np.empty(len(configs), dtype=int)
+    for n in range(len(configs)):
+        distance = np.max(np.abs(configs - current), axis=1)
+        distance[visited] = np.inf
+        order[n] = np.argmin(distance)
+        visited[order[n]] = True
+        current = configs[order[n]]
+    return order
+
+def travel(configs, start=None):
+    '''Sum of the distances when visiting configs in the given order from start.'''
+    configs = np.asarray(configs, dtype=float)
+    start = np.zeros((1, configs.shape[1])) if start is None else np.asarray(start, dtype=float)[np.newaxis]
+    return np.sum(np.max(np.abs(np.diff(np.concatenate((start, configs)), axis=0)), axis=1))
+
+def settling_time(distance, tau, tolerance, minimum=0.):
+    '''Time for the transient after a change of distance mV to decay below tolerance,
+    at least minimum.'''
+    if tau <= 0 or distance <= tolerance:
+        return minimum
+    return max(minimum, tau * np.log(distance / tolerance))
+
+
+class RampScheduler:
+    '''Sets configurations with set_voltages (a function taking the voltages in mV,
+    e.g. lambda cv: IVVIrack.setControlVoltages(ivvi, cv)) and waits for them to settle.
+    tau: time constant of the device/setup in s (0 disables waiting)
+    tolerance: remaining transient in mV accepted as settled
+    minimum: least time in s waited after every change (default 0)
+    start: voltages currently set (default: all zero)
+    '''
+    def __init__(self, set_voltages, tau=0., tolerance=1., start=None, minimum=0.):
+        self.set_voltages = set_voltages
+        self.tau = tau
+        self.tolerance = tolerance
+        self.minimum = minimum
+        self.current = None if start is None else np.asarray(start, dtype=float)
+
+    def set(self, config):
+        '''Sets config and waits for its settling time.'''
+        config = np.asarray(config, dtype=float)
+        current = np.zeros_like(config) if self.current is None else self.current
+        self.set_voltages(config)
+        time.sleep(settling_time(np.max(np.abs(config - current)), self.tau, self.tolerance,
+                                 self.minimum))
+        self.current = config
+
+    def sweep(self, configs, reorder=True):
+        '''Generator setting the configs one by one, in nearest-neighbour order if
+        reorder, and yielding the index of the config that has been set and settled.
+        '''
+        if reorder:
+            order = nearest_neighbour_order(configs, self.current)
+        else:
+            order = range(len(configs))
+        for j in order:
+            self.set(configs[j])
+            yield j
@@ -45,6 +45,54 @@ def saveExperiment(filepath, **kwargs):
     saveArrays(filepath, **kwargs)
     copyFiles(filepath)
 
+class ResultStore:
+    '''
+    Store for arrays which are filled row by row, e.g. one row per generation.
+    Every array is a memory-mapped .npy file in directory, preallocated for all
+    rows, so writing a row only touches the pages of that row and a checkpoint
+    (flush) only writes what changed, instead of rewriting a whole archive.
+    Load the results lazily with loadStore(directory).
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.arrays = {}
+
+    def create(self, name, shape, dtype=float, fill_value=0):
+        '''Creates the array name.npy of the given shape and returns its memory map.'''
+        array = np.lib.format.open_memmap(os.path.join(self.directory, name + '.npy'),
+                                          mode='w+', dtype=dtype, shape=shape)
+        if fill_value != 0:
+            array[:] = fill_value
+        self.arrays[name] = array
+        return array
+
+    def save(self, **kwargs):
+        '''Saves arrays which are written only once (e.g. inputs, targets) as .npy files.'''
+        for name, value in kwargs.items():
+            np.save(os.path.join(self.directory, name + '.npy'), value)
+
+    def flush(self):
+        '''Writes the changed rows of all arrays to disk.'''
+        for array in self.arrays.values():
+            array.flush()
+
+def loadStore(directory):
+    '''
+    Loads the arrays of a ResultStore as a dictionary of read-only memory maps,
+    so only the parts that are used are read from disk.
+    '''
+    return {os.path.splitext(filename)[0]: _loadArray(os.path.join(directory, filename))
+            for filename in sorted(os.listdir(directory)) if filename.endswith('.npy')}
+
+def _loadArray(path):
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        # Arrays of python objects (e.g. a meta dictionary) cannot be memory-mapped
+        return np.load(path, allow_pickle=True)
+
 def createSaveDirectory(filepath, name):
     '''
     This function checks if there exists a directory filepath+datetime_name.
@@ -277,6 +277,69 @@ class IVVI(VisaInstrument):
 
             return reply
 
+    def set_dacs(self, mvoltages, channels=None):
+        '''
+        Sets several dacs at once. The set descriptors of all dacs are sent
+        in a single write and their replies are read at once, instead of a
+        round-trip per dac. Dacs whose cached value already is the setpoint
+        are skipped. As for the dac parameters, the change is ramped in steps
+        of at most the step of each dac (waiting its inter_delay); every step
+        of the ramp sets all changing dacs together.
+
+        Input:
+            mvoltages (float[]) : output voltages in mV
+            channels (int[])    : 1 based indices of the dacs,
+                                  default 1 to len(mvoltages)
+        '''
+        if channels is None:
+            channels = range(1, len(mvoltages) + 1)
+        params = [self.parameters['dac{}'.format(ch)] for ch in channels]
+        for param, mvoltage in zip(params, mvoltages):
+            param.validate(mvoltage)
+
+        # the cached values are only read again if a single set invalidated them
+        if self._time_last_update == 0:
+            self._get_dacs()
+        channels = np.asarray(channels)
+        target = np.asarray(mvoltages, dtype=float)
+        current = np.asarray([self._mvoltages[ch - 1] for ch in channels])
+
+        # skip the dacs within half the dac resolution of the setpoint, eps as
+        # in _set_dac
+        byte_res = self.Fullrange / 2**16
+        eps = 0.0001
+        changed = np.abs(target - current) > byte_res / 2 + eps
+        if not np.any(changed):
+            return
+        params = [param for param, ch in zip(params, changed) if ch]
+        channels, target, current = channels[changed], target[changed], current[changed]
+
+        steps = np.asarray([param.step if param.step else np.inf for param in params])
+        nr_steps = max(1, int(np.max(np.ceil(np.abs(target - current) / steps))))
+        delay = max(param.inter_delay for param in params)
+        for k in range(1, nr_steps + 1):
+            self._set_dacs(channels, current + (target - current) * k / nr_steps)
+            if k < nr_steps:
+                time.sleep(delay)
+
+        # the set values are known, so update the cache instead of reading it
+        for param, ch, mvoltage in zip(params, channels, target):
+            self._mvoltages[ch - 1] = self.round_dac(mvoltage, int(ch) - 1)
+            param._save_val(self._mvoltages[ch - 1])
+
+    def _set_dacs(self, channels, mvoltages):
+        '''
+        Sends the set descriptors of all channels in one write and reads
+        the replies (2 bytes per descriptor) at once.
+        '''
+        message = b''
+        for ch, mvoltage in zip(channels, mvoltages):
+            polarity_corrected = mvoltage - self.pol_num[ch - 1]
+            byte_val = self._mvoltage_to_bytes(polarity_corrected)
+            message += bytes([7, 0, 2, 1, int(ch)]) + byte_val
+
+        return self.ask(message, raw=True, message_len=2 * len(channels))
+
     def _get_dacs(self):
         '''
         Reads from device and returns all dacvoltages in a list
@@ -325,11 +388,13 @@ class IVVI(VisaInstrument):
 
         return expected_answer_length
 
-    def ask(self, message, raw=False):
+    def ask(self, message, raw=False, message_len=None):
         '''
         Send <message> to the device and read answer.
         Raises an error if one occurred
         Returns a list of bytes
+        message_len is the length of the answer of a raw message, otherwise
+        it is taken from the descriptor.
         '''
         if self.lock:
             max_tries = 10
@@ -341,7 +406,9 @@ class IVVI(VisaInstrument):
             if i + 1 == max_tries:
                 raise Exception('IVVI: lock is stuck')
         # Protocol knows about the expected length of the answer
-        message_len = self.write(message, raw=raw)
+        expected_answer_length = self.write(message, raw=raw)
+        if not raw:
+            message_len = expected_answer_length
         reply = self.read(message_len=message_len)
         if self.lock:
             self.lock.release()
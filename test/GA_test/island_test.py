@@ -0,0 +1,69 @@
+'''This test runs IslandGA with two islands on the nn platform. The merged results
+must hold the results saved by each island in its own block of genomes, with the
+outputs of the saved genes on the platform, and the best solution returned must
+be the fittest genome of all islands. The nn platform is deterministic and the
+elite is kept, so after each migration the fittest genome of an island must be
+at least as fit as the fittest genome that the previous island in the ring had
+when it sent its migrants.'''
+
+import os
+import glob
+import tempfile
+import numpy as np
+import torch
+import SkyNEt.modules.SaveLib as SaveLib
+import SkyNEt.modules.Platforms as Platforms
+from SkyNEt.modules.GA import IslandGA
+from SkyNEt.modules.Nets.staNNet import staNNet
+
+if __name__ == '__main__':
+    checks = {}
+    rng = np.random.RandomState(21)
+    torch.manual_seed(21)
+    inputs = [[-1., 0.4, -1., 0.4], [-1., -1., 0.4, 0.4]]
+    targets = [0, 1, 1, 0]
+    epochs, genomes = 6, 10
+    with tempfile.TemporaryDirectory() as tmp:
+        path2NN = os.path.join(tmp, 'model.pt')
+        x, y = rng.randn(100, 7), rng.randn(100, 1)
+        info = {'amplification':np.array([10.]), 'amplitude':np.ones(7), 'offset':np.zeros(7)}
+        staNNet([(x, y), (x, y), info], [16, 16]).save_model(path2NN)
+        platform = {'modality':'nn', 'path2NN':path2NN, 'in_list':[0, 1], 'control_indx':np.arange(5)}
+        config_dict = {'genes':6, 'generange':[[-1.2, 0.6]]*5 + [[1, 1]], 'genomes':genomes,
+                       'partition':[2, 2, 2, 2, 2], 'mutationrate':0.1, 'lengths':[10], 'slopes':[0],
+                       'fitness':'corrsig_fit', 'platform':platform,
+                       'islands':2, 'migration_interval':2, 'migrants':2}
+
+        ga = IslandGA(config_dict)
+        best_genome, best_output, max_fitness, accuracy = ga.optimize(
+            inputs, targets, epochs=epochs, savepath=tmp+os.sep, dirname='ring', seed=4)
+        merged = SaveLib.loadStore(os.path.join(ga.savior.saveDirectory, 'Results_GA'))
+        islands = [SaveLib.loadStore(os.path.join(glob.glob(tmp+os.sep+f'*_ring_island{i}')[0], 'Results_GA'))
+                   for i in range(2)]
+
+        #%% Layout of the merged results
+        checks['shapes'] = (merged['geneArray'].shape == (epochs, 2*genomes, 6)
+                            and merged['outputArray'].shape == (epochs, 2*genomes, len(ga.target_wfm))
+                            and merged['fitnessArray'].shape == (epochs, 2*genomes))
+        checks['all generations'] = np.all(np.isfinite(merged['fitnessArray']))
+        checks['island blocks'] = all(np.array_equal(merged[key][:, i*genomes:(i+1)*genomes], islands[i][key])
+                                      for i in range(2) for key in ['geneArray', 'outputArray', 'fitnessArray'])
+        nn = Platforms.nn(platform)
+        checks['outputs of the genes'] = np.allclose(
+            merged['outputArray'], [nn.evaluatePopulation(ga.inputs_wfm, pool, ga.target_wfm)
+                                    for pool in merged['geneArray']], rtol=1e-5, atol=1e-5)
+        best = np.unravel_index(np.argmax(merged['fitnessArray']), merged['fitnessArray'].shape)
+        checks['best solution'] = (max_fitness == merged['fitnessArray'][best]
+                                   and np.array_equal(best_genome, merged['geneArray'][best]))
+
+        #%% Ring migration after generations 1 and 3
+        best_fitness = np.array([island['fitnessArray'].max(1) for island in islands])
+        checks['migration'] = all(best_fitness[i, gen+1] >= best_fitness[i-1, gen]
+                                  for i in range(2) for gen in [1, 3])
+        del merged, islands
+
+    for name, passed in checks.items():
+        print(f'{name}: passed_test = {passed}')
+    passed_test = all(checks.values())
+    print(f'passed_test = {passed_test}')
+    assert passed_test
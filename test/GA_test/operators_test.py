@@ -0,0 +1,136 @@
+'''This test checks the vectorized breeding operators of GA against the loops
+over genomes and genes they replaced (kept below as reference). With the same
+seed Crossover_BLXab and the crossover step of NextGen must give the same
+offspring; Universal_sampling must choose the same parents; Triangular,
+Mutation and RemoveDuplicates are random, so their properties are checked.'''
+
+import random
+import numpy as np
+from SkyNEt.modules.GA import GA
+
+#%% GA without platform, only the attributes used by the operators
+ga = GA.__new__(GA)
+ga.genes = 6
+ga.generange = [[-1.2, 0.6]]*5 + [[1, 1]]
+ga.genomes = 25
+ga.partition = [5, 15, 5]
+ga.generations = 100
+ga.mutationrate = 0.1
+rng = np.random.RandomState(2)
+low, high = np.asarray(ga.generange, dtype=float).T
+ga.pool = low + (high - low)*rng.rand(ga.genomes, ga.genes)
+ga.fitness = rng.rand(ga.genomes)
+
+#%% Reference: the original loops
+def universal_sampling_ref(ga):
+    no_genomes = 2 * ga.partition[1]
+    chosen = []
+    probabilities = ga.Linear_rank()
+    for i in range(1, len(ga.fitness)):
+        probabilities[i] = probabilities[i] + probabilities[i-1]
+    distance = 1/(no_genomes)
+    start = random.random() * distance
+    for n in range(no_genomes):
+        pointer = start+n*distance
+        for i in range(len(ga.fitness)):
+            if pointer < probabilities[0]:
+                chosen.append(0)
+                break
+            elif pointer < probabilities[i] and pointer >= probabilities[i-1]:
+                chosen.append(i)
+                break
+    return chosen
+
+def crossover_ref(ga, parent1, parent2):
+    alpha, beta = 0.6, 0.4
+    maximum = np.maximum(parent1, parent2)
+    minimum = np.minimum(parent1, parent2)
+    I = maximum - minimum
+    offspring = np.zeros(parent1.shape)
+    for i in range(len(parent1)):
+        if parent1[i] > parent2[i]:
+            offspring[i] = np.random.uniform(minimum[i]-I[i]*beta, maximum[i]+I[i]*alpha)
+        else:
+            offspring[i] = np.random.uniform(minimum[i]-I[i]*alpha, maximum[i]+I[i]*beta)
+    for i in range(ga.genes):
+        offspring[i] = min(max(offspring[i], ga.generange[i][0]), ga.generange[i][1])
+    return offspring
+
+def crossover_step_ref(ga, chosen):
+    newpool = ga.pool.copy()
+    for i in range(0, len(chosen), 2):
+        index_newpool = int(i/2 + sum(ga.partition[:1]))
+        if chosen[i] == chosen[i+1]:
+            chosen[i] = chosen[i] + 1 if chosen[i] == 0 else chosen[i] - 1
+        if chosen[i] < chosen[i+1]:
+            newpool[index_newpool] = crossover_ref(ga, ga.pool[chosen[i]], ga.pool[chosen[i+1]])
+        else:
+            newpool[index_newpool] = crossover_ref(ga, ga.pool[chosen[i+1]], ga.pool[chosen[i]])
+    return newpool
+
+checks = {}
+
+#%% Universal sampling: same parents for the same pointers
+same = True
+for seed in range(20):
+    random.seed(seed)
+    chosen = ga.Universal_sampling()
+    random.seed(seed)
+    same &= np.array_equal(np.sort(chosen), np.sort(universal_sampling_ref(ga)))
+checks['Universal_sampling'] = same and len(chosen) == 2*ga.partition[1]
+
+#%% Crossover: same offspring from the same random numbers
+parents1, parents2 = ga.pool[:10], ga.pool[10:20]
+np.random.seed(3)
+offspring = ga.Crossover_BLXab(parents1, parents2)
+np.random.seed(3)
+reference = np.array([crossover_ref(ga, p1, p2) for p1, p2 in zip(parents1, parents2)])
+checks['Crossover_BLXab'] = np.allclose(offspring, reference)
+
+#%% NextGen: the crossover step, without mutation, gives the same new pool
+chosen = np.array([3, 3, 0, 0, 7, 2] + list(range(ga.genomes))[:2*ga.partition[1]-6])
+ga.Universal_sampling = lambda: chosen.copy()
+ga.Mutation = ga.RemoveDuplicates = lambda: None
+order = np.argsort(ga.fitness)[::-1]
+sorted_ga = GA.__new__(GA)
+sorted_ga.__dict__.update(ga.__dict__, pool=ga.pool[order], fitness=ga.fitness[order])
+np.random.seed(4)
+ga.NextGen(10)
+np.random.seed(4)
+checks['NextGen crossover'] = np.allclose(ga.pool, crossover_step_ref(sorted_ga, list(chosen)))
+del ga.Universal_sampling, ga.Mutation, ga.RemoveDuplicates
+
+#%% Triangular: in generange, fixed genes fixed, mean of the triangular distribution
+genomes = np.tile(ga.pool[:1], (20000, 1))
+mutated = ga.Triangular(genomes)
+checks['Triangular range'] = np.all((mutated >= low) & (mutated <= high))
+checks['Triangular fixed genes'] = np.all(mutated[:, -1] == 1)
+expected = (low + ga.pool[0] + high)/3
+checks['Triangular mean'] = np.allclose(mutated.mean(0)[:-1], expected[:-1], atol=0.01)
+
+#%% Mutation: the first partition is never mutated, about mutationrate of the others is
+changed = []
+for repeat in range(20):
+    ga.newpool = ga.pool.copy()
+    ga.Mutation()  # Mutation reseeds numpy, so the rate is averaged over repeats
+    changed.append(ga.newpool != ga.pool)
+changed = np.array(changed)
+checks['Mutation elite'] = not np.any(changed[:, :ga.partition[0]])
+checks['Mutation rate'] = abs(np.mean(changed[:, ga.partition[0]:, :-1]) - ga.mutationrate) < 0.03
+
+#%% RemoveDuplicates: no duplicates left, the first occurrence and unique genomes kept
+ga.newpool = ga.pool.copy()
+ga.newpool[[7, 12, 20]] = ga.newpool[3]
+ga.newpool[21] = ga.newpool[4]
+before = ga.newpool.copy()
+ga.RemoveDuplicates()
+kept = np.setdiff1d(np.arange(ga.genomes), [7, 12, 20, 21])
+checks['RemoveDuplicates'] = (len(np.unique(ga.newpool, axis=0)) == ga.genomes
+                              and np.array_equal(ga.newpool[kept], before[kept])
+                              and np.all(ga.newpool[:, -1] == 1))
+
+for name, passed in checks.items():
+    print(f'{name}: passed_test = {passed}')
+passed_test = all(checks.values())
+print(f'passed_test = {passed_test}')
+assert passed_test
@@ -0,0 +1,82 @@
+'''This test runs SteadyStateGA on the nn platform with a small budget, with the
+genomes evaluated one by one (cached platform) and on three workers where the
+first genome of the initial pool is slow. Every saved generation must hold only
+evaluated genomes: outputs of the saved genes on the platform, their fitness and
+no -inf, also when the slow genome finishes after the others. The fittest genome
+is never replaced, so the best fitness never decreases over the generations.'''
+
+import os
+import time
+import tempfile
+import threading
+from concurrent import futures
+import numpy as np
+import SkyNEt.modules.SaveLib as SaveLib
+import SkyNEt.modules.Platforms as Platforms
+from SkyNEt.modules.GA import SteadyStateGA
+from SkyNEt.modules.Nets.staNNet import staNNet
+
+#%% Platform evaluating on workers, the first submitted genome takes longer
+class slow_start:
+    def __init__(self, platform, workers):
+        self.platform = platform
+        self.workers = workers
+        self.executor = futures.ThreadPoolExecutor(workers)
+        self.lock = threading.Lock()
+        self.submitted = 0
+    def evaluatePopulation(self, inputs_wfm, genePool, target_wfm):
+        with self.lock:
+            return self.platform.evaluatePopulation(inputs_wfm, genePool, target_wfm)
+    def submit(self, inputs_wfm, genePool, target_wfm):
+        delay = 0.5 if self.submitted == 0 else 0.
+        self.submitted += 1
+        return self.executor.submit(self.evaluate, delay, inputs_wfm, genePool, target_wfm)
+    def evaluate(self, delay, inputs_wfm, genePool, target_wfm):
+        time.sleep(delay)
+        return self.evaluatePopulation(inputs_wfm, genePool, target_wfm)
+
+checks = {}
+rng = np.random.RandomState(18)
+inputs = [[-1., 0.4, -1., 0.4], [-1., -1., 0.4, 0.4]]
+targets = [0, 1, 1, 0]
+with tempfile.TemporaryDirectory() as tmp:
+    path2NN = os.path.join(tmp, 'model.pt')
+    x, y = rng.randn(100, 7), rng.randn(100, 1)
+    info = {'amplification':np.array([10.]), 'amplitude':np.ones(7), 'offset':np.zeros(7)}
+    staNNet([(x, y), (x, y), info], [16, 16]).save_model(path2NN)
+    platform = {'modality':'nn', 'path2NN':path2NN, 'in_list':[0, 1], 'control_indx':np.arange(5)}
+    config_dict = {'genes':6, 'generange':[[-1.2, 0.6]]*5 + [[1, 1]], 'genomes':10,
+                   'partition':[2, 2, 2, 2, 2], 'mutationrate':0.1, 'lengths':[10], 'slopes':[0],
+                   'fitness':'corrsig_fit', 'platform':platform}
+
+    for workers in [1, 3]:
+        if workers == 1:
+            ga = SteadyStateGA(config_dict)
+        else:
+            ga = SteadyStateGA(dict(config_dict, platform=dict(platform, cache_size=0)))
+            ga.Platform = slow_start(ga.Platform, workers)
+        ga.stop_thr = 2  # run the whole budget
+        best_genome, best_output, max_fitness, accuracy = ga.optimize(
+            inputs, targets, epochs=5, savepath=tmp+os.sep, dirname=f'workers{workers}', seed=3)
+        results = SaveLib.loadStore(os.path.join(ga.savior.saveDirectory, 'Results_GA'))
+        genes, outputs, fitness = results['geneArray'], results['outputArray'], results['fitnessArray']
+
+        nn = Platforms.nn(platform)
+        evaluated = np.array([nn.evaluatePopulation(ga.inputs_wfm, pool, ga.target_wfm) for pool in genes])
+        checks[f'{workers} workers: all generations saved'] = fitness.shape == (5, 10) and np.all(np.isfinite(fitness))
+        checks[f'{workers} workers: outputs of the genes'] = np.allclose(outputs, evaluated, rtol=1e-5, atol=1e-5)
+        checks[f'{workers} workers: fitness of the outputs'] = np.allclose(
+            fitness, [ga.Fitness(output, ga.target_wfm) for output in evaluated], rtol=1e-4, atol=1e-6)
+        checks[f'{workers} workers: best kept'] = np.all(np.diff(fitness.max(1)) >= 0)
+        checks[f'{workers} workers: best solution'] = (max_fitness == fitness.max()
+                                                       and np.array_equal(best_genome, genes[np.unravel_index(
+                                                           np.argmax(fitness), fitness.shape)]))
+        if workers > 1:
+            ga.Platform.executor.shutdown()
+        del results, genes, outputs, fitness
+
+for name, passed in checks.items():
+    print(f'{name}: passed_test = {passed}')
+passed_test = all(checks.values())
+print(f'passed_test = {passed_test}')
+assert passed_test
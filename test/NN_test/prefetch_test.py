@@ -0,0 +1,85 @@
+'''This test checks the training of staNNet from the BatchPrefetcher against the
+training loop without prefetching, in which every minibatch is indexed from the
+data in the training step. With AMP off on the CPU and the same seed, both must
+give the same losses and weights, for data in memory and for lazy data read from
+disk (DataHandler.LazySet), with a last minibatch shorter than the others and
+several prefetch depths. The prefetched minibatches must be the rows of the
+permutation, also in a slot whose buffer was used before, and a consumer that
+stops the epoch early must leave no thread behind.'''
+
+import copy
+import threading
+import numpy as np
+import torch
+from SkyNEt.modules.Nets.staNNet import staNNet, BatchPrefetcher
+from SkyNEt.modules.Nets.DataHandler import LazySet
+
+def train_ref(net, learning_rate, nr_epochs, batch_size, seed):
+    '''The training loop of train_nn without prefetching, AMP and compile.'''
+    torch.manual_seed(seed)
+    optimizer = torch.optim.Adam(net.model.parameters(), lr=learning_rate, betas=(0.9, 0.999))
+    L_train, L_val = np.zeros((nr_epochs,)), np.zeros((nr_epochs,))
+    for epoch in range(nr_epochs):
+        net.model.train()
+        permutation = torch.randperm(net.x_train.shape[0]).type(net.itype)
+        for i in range(0, len(permutation), batch_size):
+            indices = permutation[i:i+batch_size]
+            y_pred = net.model(net.load_data(net._batch(net.x_train, indices)))
+            loss_training = net.loss_fn(y_pred, net._batch(net.y_train, indices))
+            optimizer.zero_grad()
+            loss_training.backward()
+            optimizer.step()
+        net.model.eval()
+        L_train[epoch] = net._errors(net.x_train, net.y_train)
+        L_val[epoch] = net._errors(net.x_val, net.y_val)
+    return L_train, L_val
+
+def same_weights(net, reference):
+    return all(torch.equal(p, q) for p, q in zip(net.model.parameters(), reference.model.parameters()))
+
+checks = {}
+rng = np.random.RandomState(20)
+torch.manual_seed(20)
+x, y = rng.randn(230, 7), rng.randn(230, 1)
+info = {'amplification':np.array([10.]), 'amplitude':np.ones(7), 'offset':np.zeros(7)}
+in_memory = [(x[:200], y[:200]), (x[200:], y[200:]), info]
+shuffler = rng.permutation(230)
+lazy = [(LazySet(x, shuffler[:200]), LazySet(y, shuffler[:200])),
+        (LazySet(x, shuffler[200:]), LazySet(y, shuffler[200:])), info]
+
+#%% Prefetched training against the loop without prefetching
+for name, data in [('in memory', in_memory), ('lazy', lazy)]:
+    initial = staNNet(data, [16, 16])
+    for prefetch in [1, 3]:
+        net, reference = copy.deepcopy(initial), copy.deepcopy(initial)
+        net.train_nn(1e-3, 3, 32, seed=5, prefetch=prefetch, amp=False)  # 200 = 6*32 + 8
+        L_train, L_val = train_ref(reference, 1e-3, 3, 32, seed=5)
+        checks[f'{name}, prefetch {prefetch}: losses'] = (np.array_equal(net.L_train, L_train)
+                                                          and np.array_equal(net.L_val, L_val))
+        checks[f'{name}, prefetch {prefetch}: weights'] = same_weights(net, reference)
+    checks[f'{name}: trained'] = not same_weights(net, initial)
+
+#%% Minibatches of the prefetcher
+net = staNNet(in_memory, [16, 16])
+permutation = torch.randperm(200)
+for name, data in [('in memory', [net.x_train, net.y_train]), ('lazy', [lazy[0][0], lazy[0][1]])]:
+    prefetcher = BatchPrefetcher(data, 32, torch.FloatTensor, depth=1)  # 3 slots for 7 minibatches
+    for epoch in range(2):
+        batches = [[b.clone() for b in batch] for batch in prefetcher.epoch(permutation)]
+        checks[f'{name}, epoch {epoch}: minibatches'] = (
+            len(batches) == 7 and [len(batch[0]) for batch in batches] == [32]*6 + [8]
+            and all(torch.equal(b, net._batch(x, permutation[32*i:32*(i+1)]))
+                    for i, batch in enumerate(batches) for b, x in zip(batch, data)))
+
+threads = threading.active_count()
+prefetcher = BatchPrefetcher([net.x_train, net.y_train], 8, torch.FloatTensor, depth=2)
+for nr, batch in enumerate(prefetcher.epoch(permutation)):
+    if nr == 2:
+        break
+checks['break leaves no thread'] = threading.active_count() == threads
+
+for name, passed in checks.items():
+    print(f'{name}: passed_test = {passed}')
+passed_test = all(checks.values())
+print(f'passed_test = {passed_test}')
+assert passed_test
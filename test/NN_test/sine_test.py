@@ -0,0 +1,45 @@
+'''This test checks the sine wave inputs of lightNNet, generated with torch, against
+the numpy expression they replaced, also at the large sample indices of long
+measurements, and checks that the waves of one call are not changed by the next
+call (on the CPU a buffer is reused for the argument of the sine).'''
+
+import numpy as np
+import torch
+from SkyNEt.modules.Nets.lightNNet import lightNNet
+
+#%% lightNNet without a model, only the info used by load_data
+net = lightNNet.__new__(lightNNet)
+torch.nn.Module.__init__(net)
+net.info = {'freq':np.sqrt(np.array([2, np.pi, 5, 7, 13, 17, 19]))*0.2,
+            'amplitude':np.array([0.5, 0.5, 0.9, 0.9, 0.9, 0.9, 0.9]),
+            'offset':np.linspace(-0.3, 0.3, 7), 'fs':50, 'phase':np.ones(7)*0.3}
+
+def sines_ref(info, t):
+    '''The numpy expression of generateSineWave, in double precision.'''
+    return (info['amplitude']*np.sin(2*np.pi*np.outer(t, info['freq'])/info['fs'] + info['phase'])
+            + np.outer(np.ones(t.shape[0]), info['offset']))
+
+checks = {}
+devices = ['cpu'] + (['cuda'] if torch.cuda.is_available() else [])
+for device in devices:
+    t = torch.randint(0, 16000000, (1000, 1), device=device).float()
+    waves = net.load_data(t)
+    reference = sines_ref(net.info, t.cpu().numpy())
+    checks[f'{device} float32'] = waves.dtype == torch.float32 and waves.device.type == device
+    checks[f'{device} values'] = np.abs(waves.cpu().numpy() - reference).max() < 1e-5
+
+    # The waves are not overwritten by the next call, also with the same number of samples
+    first = net.load_data(t[:100])
+    copy = first.clone()
+    net.load_data(t[100:200])
+    net.load_data(t[:50])
+    checks[f'{device} not overwritten'] = torch.equal(first, copy)
+
+checks['numpy indices'] = np.allclose(net.load_data(np.arange(20)[:, np.newaxis]).numpy(),
+                                      sines_ref(net.info, np.arange(20)[:, np.newaxis]), atol=1e-6)
+
+for name, passed in checks.items():
+    print(f'{name}: passed_test = {passed}')
+passed_test = all(checks.values())
+print(f'passed_test = {passed_test}')
+assert passed_test
@@ -0,0 +1,89 @@
+'''This test checks the resume path of the capacity sweep with a dummy evolve (the
+GA of evolve_VCdim5_Final is replaced by a deterministic result per labelling):
+a sweep interrupted by a failing labelling must leave a cache file for every
+finished labelling and none for the failed one (a left-over temporary file is
+ignored); called again with the same save_dir it must evolve only the missing
+labellings, and the aggregate must be the one of an uninterrupted sweep.
+The dummy takes the place of the module evolve_VCdim5_Final, which needs the
+device configuration and is not imported.'''
+
+import os
+import sys
+import glob
+import types
+import tempfile
+import numpy as np
+
+#%% Dummy evolve, logging the labellings it evolves
+def evolve(dataset, threshold, inputs, binary_labels, stop_fitness=0.1):
+    bl = np.array(binary_labels)
+    with open(os.environ['SWEEP_LOG'], 'a') as log:
+        log.write(''.join(map(str, binary_labels)) + f' {dataset}\n')
+    if os.path.isfile(os.environ['SWEEP_FAIL']) and binary_labels == [0, 1, 1, 0]:
+        raise RuntimeError('interrupted')
+    accuracy = 1. if bl[0] == bl[-1] else 0.75
+    return (np.append(bl, 1.), np.repeat(bl, 5)*2., accuracy - 0.5, accuracy, np.repeat(bl, 5), 3, np.ones(20))
+
+sys.modules['evolve_VCdim5_Final'] = types.ModuleType('evolve_VCdim5_Final')
+sys.modules['evolve_VCdim5_Final'].evolve = evolve
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'experiments', 'GA_optimization'))
+import capacity_sweep as cs
+from create_binary import bintarget
+
+def logged():
+    with open(os.environ['SWEEP_LOG']) as log:
+        return [line.split() for line in log]
+
+if __name__ == '__main__':
+    checks = {}
+    inputs = [[-1., 0.4, -1., 0.4], [-1., -1., 0.4, 0.4]]
+    labels = bintarget(4).tolist()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['SWEEP_LOG'] = os.path.join(tmp, 'log.txt')
+        os.environ['SWEEP_FAIL'] = os.path.join(tmp, 'fail')
+        save_dir = os.path.join(tmp, 'sweep')
+
+        #%% Uninterrupted reference sweep
+        reference = cs.capacity_sweep(inputs, os.path.join(tmp, 'reference'), workers=2, dataset=7)
+        checks['dataset passed on'] = len(logged()) == 14 and all(dataset == '7' for label, dataset in logged())
+
+        #%% Interrupted sweep
+        open(os.environ['SWEEP_FAIL'], 'w').close()
+        os.makedirs(save_dir)
+        with open(os.path.join(save_dir, 'VCdim-0011.npz.tmp'), 'wb') as f:
+            f.write(b'broken')  # left by an interrupted write
+        os.remove(os.environ['SWEEP_LOG'])
+        try:
+            cs.capacity_sweep(inputs, save_dir, workers=2, dataset=7)
+            checks['interrupted'] = False
+        except RuntimeError:
+            checks['interrupted'] = True
+        cached = sorted(os.path.basename(f) for f in glob.glob(os.path.join(save_dir, 'VCdim-*.npz')))
+        evolved = [''.join(map(str, bl)) for bl in labels if len(set(bl)) > 1]
+        checks['finished labellings cached'] = (cached == sorted(f'VCdim-{bl}.npz' for bl in evolved if bl != '0110')
+                                                and not os.path.isfile(os.path.join(save_dir, 'Results.npz')))
+
+        #%% Resumed sweep
+        os.remove(os.environ['SWEEP_FAIL'])
+        os.remove(os.environ['SWEEP_LOG'])
+        sweep = cs.capacity_sweep(inputs, save_dir, workers=2, dataset=7)
+        checks['only missing evolved'] = logged() == [['0110', '7']]
+        checks['aggregate'] = (sweep.keys() == reference.keys()
+                               and all(np.array_equal(sweep[key], reference[key], equal_nan=True)
+                                       for key in reference if key not in ['inputs', 'binary_labels'])
+                               and sweep['binary_labels'] == labels)
+        found = [1 if len(set(bl)) == 1 or bl[0] == bl[-1] else 0 for bl in labels]
+        constant = [len(set(bl)) == 1 for bl in labels]
+        checks['capacity'] = (np.array_equal(sweep['found_classifier'], found)
+                              and sweep['capacity'] == np.mean(found)
+                              and np.all(np.isnan(sweep['accuracy_classifier'][constant]))
+                              and np.all(np.isnan(sweep['output_classifier'][constant]))
+                              and np.array_equal(sweep['output_classifier'][1], np.repeat(labels[1], 5)*2.))
+        with np.load(os.path.join(save_dir, 'Results.npz'), allow_pickle=True) as saved:
+            checks['Results.npz'] = np.array_equal(saved['found_classifier'], found) and saved['capacity'] == np.mean(found)
+
+    for name, passed in checks.items():
+        print(f'{name}: passed_test = {passed}')
+    passed_test = all(checks.values())
+    print(f'passed_test = {passed_test}')
+    assert passed_test
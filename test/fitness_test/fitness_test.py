@@ -0,0 +1,65 @@
+'''This test checks the vectorized fitness functions of FitnessFunctions against
+the per-genome loops they replaced (kept below as reference), including clipped
+genomes and genomes with a negative separation, and checks that Grabber.get_fitness
+finds the functions in the registry and rejects unknown names.'''
+
+import numpy as np
+import SkyNEt.modules.FitnessFunctions as FitF
+import SkyNEt.modules.Grabber as Grabber
+
+#%% Reference: the loops over the genomes of the original fitness functions
+def corr_ref(outputpool, target, clipvalue=np.inf):
+    fitpool = np.zeros(len(outputpool))
+    for j, output in enumerate(outputpool):
+        if np.any(np.abs(output) > clipvalue):
+            fitpool[j] = -1
+        else:
+            fitpool[j] = np.corrcoef(np.stack((output, target)))[0, 1]
+    return fitpool
+
+def corrsig_ref(outputpool, target, clipvalue=np.inf):
+    fitpool = np.zeros(len(outputpool))
+    for j, output in enumerate(outputpool):
+        if np.any(np.abs(output) > clipvalue):
+            fitpool[j] = -100
+            continue
+        sep = np.min(output[target == 1]) - np.max(output[target == 0])
+        corr = np.corrcoef(np.stack((output, target)))[0, 1]
+        fitpool[j] = FitF.sig(sep) * corr * (1 if sep >= 0 else 0.01)
+    return fitpool
+
+#%% Random output pools, a part of them well separated and a part clipped
+rng = np.random.RandomState(0)
+target = np.repeat([0., 1., 1., 0.], 25)
+outputpool = rng.randn(50, len(target))
+outputpool[:20] += 5*target    # positive separation
+outputpool[-5:] += 100         # clipped at clipvalue=50
+clipvalue = 50
+
+checks = {}
+for clip in (np.inf, clipvalue):
+    checks[f'corr_fit (clipvalue={clip})'] = np.allclose(
+        FitF.corr_fit(outputpool, target, clip), corr_ref(outputpool, target, clip))
+    checks[f'corrsig_fit (clipvalue={clip})'] = np.allclose(
+        FitF.corrsig_fit(outputpool, target, clip), corrsig_ref(outputpool, target, clip))
+
+#%% Registry
+@FitF.register
+def negative_corr_fit(outputpool, target, clipvalue=np.inf):
+    return -FitF.corr_fit(outputpool, target, clipvalue)
+
+checks['registry'] = all(Grabber.get_fitness(name) is getattr(FitF, name)
+                         for name in ['corr_fit', 'corrsig_fit', 'accuracy_fit'])
+checks['registered function'] = np.allclose(Grabber.get_fitness('negative_corr_fit')(outputpool, target),
+                                            -corr_ref(outputpool, target))
+try:
+    Grabber.get_fitness('no_such_fit')
+    checks['unknown fitness'] = False
+except NotImplementedError:
+    checks['unknown fitness'] = True
+
+for name, passed in checks.items():
+    print(f'{name}: passed_test = {passed}')
+passed_test = all(checks.values())
+print(f'passed_test = {passed_test}')
+assert passed_test
@@ -0,0 +1,44 @@
+'''This test checks Classifiers.linear_separability against a brute force search
+over all thresholds of each output: the accuracy must be the best accuracy of a
+threshold classifier (samples above the threshold are 1), and the returned
+weights and predictions must realize it. The outputs include ties and constant
+outputs, where not every cut of the sorted samples is a valid threshold.'''
+
+import numpy as np
+from SkyNEt.modules.Classifiers import linear_separability
+import SkyNEt.modules.FitnessFunctions as FitF
+
+#%% Reference: try every sample value (and below the minimum) as threshold
+def best_accuracy_ref(output, target):
+    thresholds = np.concatenate(([output.min() - 1], np.unique(output)))
+    return max(np.mean((output > th) == (target == 1)) for th in thresholds)
+
+rng = np.random.RandomState(1)
+target = np.repeat([0., 1., 1., 0., 1.], 8)
+outputs = rng.randn(60, len(target))
+outputs[:10] += 10*target                             # separable
+outputs[10:20] = np.round(outputs[10:20])             # many ties
+outputs[20:25] = 0.7                                  # constant
+outputs[25:30] = np.round(outputs[25:30] + 3*target)  # shifted, with ties
+
+accuracy, weights, predicted = linear_separability(outputs, target)
+
+checks = {}
+reference = np.array([best_accuracy_ref(output, target) for output in outputs])
+checks['best accuracy'] = np.allclose(accuracy, reference)
+checks['separable outputs'] = np.all(accuracy[:10] == 1)
+checks['predictions realize accuracy'] = np.allclose(np.mean(predicted == (target == 1), axis=1), accuracy)
+
+# The weights follow the perceptron convention: predict 1 if np.dot([1,x],w)<0 on the normalized outputs
+std = np.std(outputs, axis=1, keepdims=True)
+std[std == 0] = 1.
+normalized = (outputs - np.mean(outputs, axis=1, keepdims=True))/std
+checks['weights realize predictions'] = np.array_equal(
+    (weights[:, :1] + weights[:, 1:]*normalized < 0).astype(float), predicted)
+checks['accuracy_fit'] = np.allclose(FitF.accuracy_fit(outputs, target), reference)
+
+for name, passed in checks.items():
+    print(f'{name}: passed_test = {passed}')
+passed_test = all(checks.values())
+print(f'passed_test = {passed_test}')
+assert passed_test
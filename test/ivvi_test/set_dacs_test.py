@@ -0,0 +1,136 @@
+'''This test checks IVVI.set_dacs without the rack: visa and qcodes are replaced by
+dummies and ask by a mock device that parses the descriptors written on the
+serial line and answers 2 bytes per set descriptor. set_dacs must write the set
+descriptors of all changed dacs in one message, equal to the messages of repeated
+_set_dac calls, and read a reply of 2 bytes per dac. Unchanged dacs are skipped,
+a ramp sets all changing dacs in every step, the cache holds the values read
+back from the device and an invalid setpoint is rejected before anything is sent.'''
+
+import os
+import sys
+import types
+import importlib.util
+import numpy as np
+
+#%% Dummies of visa and qcodes, used by the driver only at its construction
+class Numbers:
+    def __init__(self, min_value=-np.inf, max_value=np.inf):
+        self.min_value, self.max_value = min_value, max_value
+    def validate(self, value):
+        if not self.min_value <= value <= self.max_value:
+            raise ValueError(f'{value} is out of range')
+
+modules = {'visa':types.ModuleType('visa'), 'qcodes':types.ModuleType('qcodes'),
+           'qcodes.utils':types.ModuleType('qcodes.utils'),
+           'qcodes.utils.validators':types.ModuleType('qcodes.utils.validators')}
+modules['qcodes'].VisaInstrument = object
+modules['qcodes'].validators = modules['qcodes.utils.validators']
+modules['qcodes.utils.validators'].Numbers = Numbers
+modules['qcodes.utils.validators'].Bool = object
+sys.modules.update(modules)
+spec = importlib.util.spec_from_file_location('IVVI', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', 'qcodes', 'instrument_drivers', 'QuTech', 'IVVI.py'))
+IVVI_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(IVVI_module)
+IVVI = IVVI_module.IVVI
+
+#%% Mock rack: the bytes written on the serial line set the dacs
+class parameter:
+    def __init__(self, vals, step, inter_delay):
+        self.vals, self.step, self.inter_delay = vals, step, inter_delay
+        self.saved = None
+    def validate(self, value):
+        self.vals.validate(value)
+    def _save_val(self, value):
+        self.saved = value
+
+def rack(numdacs=8, step=10):
+    ivvi = IVVI.__new__(IVVI)
+    ivvi._numdacs = numdacs
+    ivvi.lock = None
+    ivvi.pol_num = np.zeros(numdacs)
+    ivvi.set_pol_dacrack('BIP', range(1, 5), get_all=False)
+    ivvi.set_pol_dacrack('POS', range(5, numdacs + 1), get_all=False)
+    ivvi.parameters = {f'dac{i}': parameter(Numbers(ivvi.pol_num[i - 1], ivvi.pol_num[i - 1] + ivvi.Fullrange),
+                                            step, 0.)
+                       for i in range(1, numdacs + 1)}
+    ivvi.check_setpoints = lambda: False
+    ivvi._update_time = 5
+    ivvi._time_last_update = 0
+    ivvi.dacs = bytearray(2*numdacs)  # 16-bit value of every dac on the rack
+    ivvi.written, ivvi.asked = [], []
+    ivvi.visa_handle = types.SimpleNamespace(write_raw=ivvi.written.append)
+    def ask(message, raw=False, message_len=None):
+        ivvi.asked.append((message, raw, message_len))
+        expected = ivvi.write(message, raw=raw)
+        reply, wire = b'', ivvi.written[-1]
+        while wire:
+            descriptor, wire = wire[:wire[0]], wire[wire[0]:]
+            if descriptor[2:4] == bytes([2, 1]):  # set dac
+                ch = descriptor[4]
+                ivvi.dacs[2*(ch - 1):2*ch] = descriptor[5:7]
+                reply += bytes([2, 0])
+            elif descriptor[3] == 2:  # get all dacs
+                reply += bytes([2 + 2*numdacs, 0]) + bytes(ivvi.dacs)
+        assert len(reply) == (message_len if raw else expected), 'reply length differs from the expected length'
+        ivvi.replies.append(len(reply))
+        return reply
+    ivvi.replies = []
+    ivvi.ask = ask
+    return ivvi
+
+checks = {}
+
+#%% One message holding the descriptors of repeated _set_dac calls
+channels, mvoltages = [1, 3, 4, 6, 8], [150., -1234.5, 1999., 0.3, 3999.9]
+reference = rack(step=None)
+for ch, mvoltage in zip(channels, mvoltages):
+    reference._set_dac(ch, mvoltage)
+ivvi = rack(step=None)
+ivvi.set_dacs(mvoltages, channels)
+sets = [asked for asked in ivvi.asked if asked[1]]
+checks['one message'] = len(sets) == 1 and len(ivvi.written) == 2  # get_dacs for the cache and the set
+checks['message of repeated _set_dac'] = ivvi.written[-1] == b''.join(reference.written)
+checks['reply of 2 bytes per dac'] = sets[0][2] == 2*len(channels) and ivvi.replies[-1] == 2*len(channels)
+checks['dacs set'] = ivvi.dacs == reference.dacs
+
+#%% Cache and parameter values are those read back from the rack
+read_back = ivvi._bytes_to_mvoltages(bytes(2) + bytes(ivvi.dacs))
+checks['cache'] = (np.allclose([ivvi._mvoltages[ch - 1] for ch in channels], [read_back[ch - 1] for ch in channels])
+                   and all(ivvi.parameters[f'dac{ch}'].saved == ivvi._mvoltages[ch - 1] for ch in channels)
+                   and np.allclose([read_back[ch - 1] for ch in channels], mvoltages, atol=ivvi.Fullrange/2**16))
+
+#%% Unchanged dacs are skipped
+asked = len(ivvi.asked)
+ivvi.set_dacs(mvoltages, channels)
+checks['nothing changed'] = len(ivvi.asked) == asked
+ivvi.set_dacs(mvoltages[:2] + [-500.] + mvoltages[3:], channels)
+reference._set_dac(4, -500.)
+checks['only changed dac'] = (len(ivvi.asked) == asked + 1 and ivvi.asked[-1][2] == 2
+                              and ivvi.written[-1] == reference.written[-1] and ivvi.dacs == reference.dacs)
+
+#%% Ramp of at most step per dac, all changing dacs in every step
+ivvi = rack(step=10)
+ivvi.set_dacs([0., 0., 4.], [1, 2, 5])
+ivvi.asked.clear()
+ivvi.set_dacs([35., -12., 4.], [1, 2, 5])
+steps = []
+for message, raw, message_len in ivvi.asked:
+    steps.append([message[7*i + 4] for i in range(message_len // 2)])
+checks['ramp'] = (steps == [[1, 2]]*4 and np.allclose(ivvi._mvoltages[:2], [35., -12.], atol=ivvi.Fullrange/2**16)
+                  and [ivvi.asked[k][0][5:7] for k in range(4)] == [ivvi._mvoltage_to_bytes(v + 2000.)
+                                                                     for v in [8.75, 17.5, 26.25, 35.]])
+
+#%% An invalid setpoint is rejected before anything is sent
+asked = len(ivvi.asked)
+try:
+    ivvi.set_dacs([100., 2500.], [1, 2])
+    checks['invalid setpoint'] = False
+except ValueError:
+    checks['invalid setpoint'] = len(ivvi.asked) == asked
+
+for name, passed in checks.items():
+    print(f'{name}: passed_test = {passed}')
+passed_test = all(checks.values())
+print(f'passed_test = {passed_test}')
+assert passed_test
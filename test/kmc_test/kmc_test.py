@@ -0,0 +1,78 @@
+'''This test checks the KMC engine: the Fenwick trees must give the prefix sums
+of the rates and select the same events as a search on their cumulative sum
+(never an event with zero rate), also after updates with repeated positions.
+The simulation with exact rates (tolerance=0) and with rates updated in the
+trees must select the same events, and so give the same currents, as rebuilding
+all rates after every hop. A positive voltage on one electrode must drive holes
+into the device.'''
+
+import numpy as np
+from SkyNEt.modules.KMC import DopantNetwork, fenwick_build, fenwick_add, fenwick_search
+
+def prefix_sums(tree):
+    '''Sums of the first k values of each tree, for k = 1..size, by the Fenwick query.'''
+    size = tree.shape[1] - 1
+    sums = np.zeros((len(tree), size))
+    for k in range(1, size+1):
+        node = k
+        while node > 0:
+            sums[:, k-1] += tree[:, node]
+            node -= node & -node
+    return sums
+
+checks = {}
+rng = np.random.RandomState(11)
+
+#%% Fenwick trees
+values = rng.exponential(size=(6, 37))
+values[values < 0.5] = 0    # events that are not possible
+tree = fenwick_build(values)
+checks['build'] = np.allclose(prefix_sums(tree), np.cumsum(values, axis=1))
+
+rows = rng.randint(6, size=200)
+positions = rng.randint(37, size=200)
+delta = rng.exponential(size=200)
+np.add.at(values, (rows, positions), delta)
+fenwick_add(tree, rows, positions, delta)
+checks['add'] = np.allclose(tree, fenwick_build(values))
+
+same, possible = True, True
+for repeat in range(200):
+    targets = rng.uniform(size=6)*values.sum(axis=1)
+    events = fenwick_search(tree, targets)
+    reference = [np.searchsorted(np.cumsum(v), u, side='right') for v, u in zip(values, targets)]
+    same &= np.array_equal(events, reference)
+    possible &= np.all(values[np.arange(6), events] > 0)
+checks['search'] = same
+checks['no impossible events'] = possible
+
+#%% Exact incremental rates select the same events as rebuilding every hop
+electrodes = [(0, 50), (100, 50), (50, 0), (50, 100), (0, 20)]
+network = DopantNetwork.random(20, 2, electrodes, 100, 100, seed=3, grid=15)
+voltages = rng.uniform(-0.3, 0.3, (4, len(electrodes)))
+incremental = network.simulate(voltages, hops=400, equilibration=50, tolerance=0,
+                               rebuild_interval=10**6, seed=5)
+rebuilt = network.simulate(voltages, hops=400, equilibration=50, tolerance=0,
+                           rebuild_interval=1, seed=5)
+checks['tolerance=0 = rebuilt'] = np.allclose(incremental, rebuilt)
+
+# Without Coulomb interactions only the two sites of a hop change, so the rates are
+# updated in the trees instead of rebuilding whole configurations
+screened = DopantNetwork.random(20, 2, electrodes, 100, 100, seed=3, grid=15, eps_r=1e12)
+incremental = screened.simulate(voltages, hops=400, equilibration=50, tolerance=1e-6,
+                                rebuild_interval=10**6, seed=5)
+rebuilt = screened.simulate(voltages, hops=400, equilibration=50, tolerance=1e-6,
+                            rebuild_interval=1, seed=5)
+checks['incremental updates = rebuilt'] = np.allclose(incremental, rebuilt)
+
+#%% Holes enter the device from the electrode at the highest voltage
+voltages = np.zeros((1, len(electrodes)))
+voltages[0, 0] = 0.5
+currents = network.simulate(voltages, hops=4000, equilibration=500, seed=6)[0]
+checks['direction of the current'] = currents[0] < 0 and np.sum(currents[1:]) > 0
+
+for name, passed in checks.items():
+    print(f'{name}: passed_test = {passed}')
+passed_test = all(checks.values())
+print(f'passed_test = {passed_test}')
+assert passed_test
@@ -0,0 +1,132 @@
+'''This test checks nidaqIO.StreamSession without the DAQ: the nidaqmx tasks, stream
+readers and writers are replaced by a mock device whose input channels read
+(i+1)*ao0 + ao1, one sample after it is written. The streamed data must be the
+response to each block with the lag trimmed and shorter blocks cut to their
+length, the output buffer never holds more than two blocks ahead of the read,
+the yielded data alternate between the two read buffers, a block above 2V ends
+the stream holding the last voltages, the tasks are stopped after every stream
+(also when the consumer breaks) and are reused by the next stream.'''
+
+import sys
+import types
+import numpy as np
+
+#%% Mock of the nidaqmx package used by nidaqIO
+class device:
+    '''Samples written to the ao channels and read from the ai channels.'''
+    def __init__(self, n_ao, n_ai):
+        self.written = np.zeros((n_ao, 0))
+        self.read = 0
+        self.n_ai = n_ai
+        self.running = False
+        self.max_ahead = 0
+        self.events = []
+    def response(self):
+        inputs = np.concatenate((np.zeros((self.written.shape[0], 1)), self.written), axis=1) # lag of one sample
+        return (np.arange(1, self.n_ai+1)[:, np.newaxis]*inputs[0] + inputs[1])
+
+mock = device(2, 2)
+
+class channels:
+    def __init__(self): self.names = []
+    def add_ao_voltage_chan(self, name, *args): self.names.append(name)
+    def add_ai_voltage_chan(self, name, *args): self.names.append(name)
+
+class Task:
+    def __init__(self):
+        self.ao_channels, self.ai_channels = channels(), channels()
+        self.timing = types.SimpleNamespace(cfg_samp_clk_timing=lambda *args, **kwargs: None)
+        self.out_stream, self.in_stream = types.SimpleNamespace(), types.SimpleNamespace()
+        self.triggers = types.SimpleNamespace(start_trigger=types.SimpleNamespace(
+            cfg_dig_edge_start_trig=lambda source: None))
+    def start(self):
+        mock.events.append('start')
+        mock.running = True
+    def stop(self):
+        mock.events.append('stop')
+        mock.running = False
+    def close(self):
+        mock.events.append('close')
+
+class AnalogMultiChannelWriter:
+    def __init__(self, stream, auto_start=False): pass
+    def write_many_sample(self, data, timeout):
+        mock.written = np.concatenate((mock.written, data), axis=1)
+        mock.max_ahead = max(mock.max_ahead, mock.written.shape[1] - mock.read)
+
+class AnalogMultiChannelReader:
+    def __init__(self, stream): pass
+    def read_many_sample(self, data, number_of_samples_per_channel, timeout):
+        assert mock.running, 'read before the tasks are started'
+        n = number_of_samples_per_channel
+        assert mock.read + n <= mock.written.shape[1] + 1, 'read samples that were never written'
+        data[:, :n] = mock.response()[:, mock.read:mock.read+n]
+        mock.read += n
+
+modules = {'nidaqmx':types.ModuleType('nidaqmx'),
+           'nidaqmx.constants':types.SimpleNamespace(AcquisitionType=types.SimpleNamespace(
+               FINITE='finite', CONTINUOUS='continuous'), RegenerationMode=types.SimpleNamespace(
+               DONT_ALLOW_REGENERATION='dont')),
+           'nidaqmx.system':types.ModuleType('system'),
+           'nidaqmx.system.device':types.ModuleType('device'),
+           'nidaqmx.stream_readers':types.SimpleNamespace(AnalogMultiChannelReader=AnalogMultiChannelReader),
+           'nidaqmx.stream_writers':types.SimpleNamespace(AnalogMultiChannelWriter=AnalogMultiChannelWriter),
+           'InstrumentImporter':types.ModuleType('InstrumentImporter')}
+modules['nidaqmx'].Task = Task
+for name, module in modules.items():
+    parent, _, child = name.rpartition('.')
+    if parent:
+        setattr(modules[parent], child, module)
+    prefix = 'SkyNEt.instruments.' if name == 'InstrumentImporter' else 'SkyNEt.instruments.niDAQ.'
+    sys.modules[prefix + name] = module
+import SkyNEt.instruments
+SkyNEt.instruments.InstrumentImporter = modules['InstrumentImporter']
+from SkyNEt.instruments.niDAQ.nidaqIO import StreamSession
+
+#%% Streaming blocks, the last one shorter
+checks = {}
+rng = np.random.RandomState(20)
+block_size = 50
+blocks = [rng.uniform(-1, 1, (2, block_size)) for n in range(6)] + [rng.uniform(-1, 1, (2, 30))]
+expected = [np.arange(1, 3)[:, np.newaxis]*block[0] + block[1] for block in blocks]
+
+with StreamSession(1000, n_ao=2, inputPorts=[1, 0, 1, 0, 0, 0, 0], block_size=block_size) as session:
+    streamed, same_buffer = [], True
+    for nr, data in enumerate(session.stream(iter(blocks))):
+        same_buffer &= np.shares_memory(data, session._read_buffers[nr % 2])
+        streamed.append(data.copy())
+    checks['blocks'] = (len(streamed) == len(blocks)
+                        and all(np.allclose(data, reference) for data, reference in zip(streamed, expected)))
+    checks['lag trimmed'] = mock.response()[0, 0] == 0 and np.allclose(streamed[0][:, 0], expected[0][:, 0])
+    checks['double buffering'] = mock.max_ahead <= 2*block_size + 1 and same_buffer
+    held = mock.written[:, 6*block_size+30:]
+    checks['short block held'] = np.all(held == blocks[-1][:, -1:]) and held.shape[1] > 0
+    checks['stopped'] = mock.events == ['start', 'start', 'stop', 'stop'] and not mock.running
+
+    #%% A block above 2V ends the stream holding the last voltages
+    mock.written, mock.read, mock.events = np.zeros((2, 0)), 0, []
+    high = [blocks[0], blocks[1], 3*np.ones((2, block_size)), blocks[2]]
+    streamed = [data.copy() for data in session.stream(high)]
+    checks['high voltage aborts'] = (len(streamed) == 2 and np.allclose(streamed[1], expected[1])
+                                     and np.all(np.abs(mock.written) <= 2)
+                                     and np.all(mock.written[:, 2*block_size:] == blocks[1][:, -1:]))
+    checks['tasks reused'] = mock.events == ['start', 'start', 'stop', 'stop']
+
+    #%% A consumer that breaks stops the tasks
+    mock.written, mock.read, mock.events = np.zeros((2, 0)), 0, []
+    received = []
+    session.run(blocks[:2], lambda data: received.append(data.copy()))
+    checks['run'] = len(received) == 2 and np.allclose(received[1], expected[1])
+    mock.written, mock.read, mock.events = np.zeros((2, 0)), 0, []
+    stream = session.stream(blocks)
+    for data in stream:
+        break
+    stream.close()
+    checks['break stops the tasks'] = mock.events == ['start', 'start', 'stop', 'stop'] and not mock.running
+checks['closed'] = mock.events[-2:] == ['close', 'close']
+
+for name, passed in checks.items():
+    print(f'{name}: passed_test = {passed}')
+passed_test = all(checks.values())
+print(f'passed_test = {passed_test}')
+assert passed_test
@@ -0,0 +1,96 @@
+'''This test checks AcquisitionPipeline.pipeline with dummy measure and process
+functions of random duration: the results must be yielded in the order of the
+items, with the data and result of each item, while the items are iterated and
+measured in one background thread that runs at most depth items ahead. An error
+in measure or process must be raised in the caller, and a caller that stops
+iterating (break or error) must stop the measurements and leave no thread behind.'''
+
+import time
+import random
+import threading
+from SkyNEt.modules.AcquisitionPipeline import pipeline
+
+checks = {}
+random.seed(19)
+main = threading.current_thread()
+
+def measure(item):
+    measured.append(item)
+    threads.add(threading.current_thread())
+    time.sleep(random.uniform(0, 0.005))
+    if item == fail_at:
+        raise RuntimeError(f'measurement {item} failed')
+    return 10*item
+
+def process(item, data):
+    time.sleep(random.uniform(0, 0.02))
+    return data + 1
+
+def sweep(n):
+    for item in range(n):
+        threads.add(threading.current_thread())
+        yield item
+
+#%% Order, data and results, measured ahead of the caller by at most depth items
+measured, threads, fail_at, ahead = [], set(), None, []
+yielded = []
+for item, data, result in pipeline(sweep(30), measure, process, depth=3, workers=4):
+    ahead.append(len(measured) - len(yielded))
+    yielded.append((item, data, result))
+    time.sleep(random.uniform(0, 0.01))
+checks['order'] = yielded == [(item, 10*item, 10*item + 1) for item in range(30)]
+checks['one acquisition thread'] = len(threads) == 1 and main not in threads
+# The yielded item, depth items in the queue and one in the acquisition thread
+checks['depth'] = max(ahead) <= 1 + 3 + 1
+
+yielded = list(pipeline(range(5), measure))
+checks['without process'] = yielded == [(item, 10*item, None) for item in range(5)]
+
+#%% Errors in measure and process are raised in the caller
+measured, fail_at, yielded = [], 4, []
+try:
+    for item, data, result in pipeline(range(10), measure, process):
+        yielded.append(item)
+    checks['measure error'] = False
+except RuntimeError as error:
+    checks['measure error'] = str(error) == 'measurement 4 failed' and yielded == [0, 1, 2, 3]
+checks['stopped after measure error'] = measured == [0, 1, 2, 3, 4]
+
+def failing_process(item, data):
+    if item == 2:
+        raise ValueError('processing failed')
+    return data
+fail_at, yielded = None, []
+try:
+    for item, data, result in pipeline(range(10), measure, failing_process):
+        yielded.append(item)
+    checks['process error'] = False
+except ValueError:
+    checks['process error'] = yielded == [0, 1]
+
+#%% A caller that breaks early or fails stops the acquisition
+time.sleep(0.1)
+threads_before = threading.active_count()
+measured = []
+for item, data, result in pipeline(range(1000), measure, process, depth=2):
+    if item == 3:
+        break
+count = len(measured)
+time.sleep(0.1)
+checks['break stops measuring'] = count <= 4 + 2 + 1 and len(measured) == count
+measured = []
+try:
+    for item, data, result in pipeline(range(1000), measure, process, depth=2):
+        if item == 3:
+            raise KeyboardInterrupt
+except KeyboardInterrupt:
+    count = len(measured)
+time.sleep(0.1)
+checks['caller error stops measuring'] = count <= 4 + 2 + 1 and len(measured) == count
+checks['no threads left'] = threading.active_count() == threads_before
+
+for name, passed in checks.items():
+    print(f'{name}: passed_test = {passed}')
+passed_test = all(checks.values())
+print(f'passed_test = {passed_test}')
+assert passed_test
@@ -0,0 +1,86 @@
+'''This test checks Platforms.cached: the outputs must be those of the wrapped
+platform for any pool (with repeated genomes, in any order), every genome is
+evaluated once while it is in the cache, genomes equal up to cache_resolution
+share an entry, the least recently used genomes are dropped beyond cache_size
+and a change of the inputs or the target clears the cache. It also checks that
+Grabber.get_platform only caches the deterministic nn platform.'''
+
+import os
+import tempfile
+import numpy as np
+import SkyNEt.modules.Platforms as Platforms
+import SkyNEt.modules.Grabber as Grabber
+from SkyNEt.modules.Nets.staNNet import staNNet
+
+#%% Deterministic platform counting the genomes it evaluates
+class counting:
+    def __init__(self):
+        self.evaluated = 0
+        self.workers = 3
+    def evaluatePopulation(self, inputs_wfm, genePool, target_wfm):
+        self.evaluated += len(genePool)
+        return np.sin(genePool.sum(axis=1, keepdims=True)*np.arange(1, target_wfm.shape[-1]+1)) + inputs_wfm.sum(0)
+
+checks = {}
+rng = np.random.RandomState(9)
+inputs_wfm, target_wfm = rng.randn(2, 12), np.zeros(12)
+platform = counting()
+cache = Platforms.cached(platform, {'cache_resolution':1e-6, 'cache_size':40})
+reference = counting()
+
+pool = rng.uniform(-1, 1, (20, 5))
+pool[10:15] = pool[:5]                     # repeated genomes in the same pool
+outputs = cache.evaluatePopulation(inputs_wfm, pool, target_wfm)
+checks['same outputs'] = np.array_equal(outputs, reference.evaluatePopulation(inputs_wfm, pool, target_wfm))
+checks['each genome once'] = platform.evaluated == 15
+
+outputs[:] = 0                             # the returned outputs are not the cached ones
+shuffled = rng.permutation(20)
+again = cache.evaluatePopulation(inputs_wfm, pool[shuffled], target_wfm)
+checks['reused in any order'] = (platform.evaluated == 15 and np.array_equal(
+    again, reference.evaluatePopulation(inputs_wfm, pool[shuffled], target_wfm)))
+
+close = pool[:3] + 1e-8                    # below the resolution: same entry
+far = pool[:3] + 1e-4                      # above the resolution: new entry
+cache.evaluatePopulation(inputs_wfm, close, target_wfm)
+checks['resolution'] = platform.evaluated == 15
+cache.evaluatePopulation(inputs_wfm, far, target_wfm)
+checks['new genomes'] = platform.evaluated == 18
+
+# 18 genomes in the cache of 40: 30 new ones drop the 8 least recently used, which are
+# among the 10 genomes of pool[5:10] and pool[15:20] not used since the shuffled pool
+cache.evaluatePopulation(inputs_wfm, pool[:5], target_wfm)
+cache.evaluatePopulation(inputs_wfm, far, target_wfm)
+cache.evaluatePopulation(inputs_wfm, rng.uniform(-1, 1, (30, 5)), target_wfm)
+checks['cache_size'] = len(cache.outputs) == 40
+evaluated = platform.evaluated
+cache.evaluatePopulation(inputs_wfm, np.concatenate((pool[:5], far)), target_wfm)
+checks['recently used kept'] = platform.evaluated == evaluated
+cache.evaluatePopulation(inputs_wfm, np.concatenate((pool[5:10], pool[15:20])), target_wfm)
+checks['least recently used dropped'] = platform.evaluated == evaluated + 8
+
+evaluated = platform.evaluated
+cache.evaluatePopulation(inputs_wfm + 1, pool[:5], target_wfm)
+checks['new inputs clear the cache'] = platform.evaluated == evaluated + 5 and len(cache.outputs) == 5
+checks['attributes of the platform'] = cache.workers == 3
+
+#%% Grabber caches only the deterministic nn platform
+with tempfile.TemporaryDirectory() as tmp:
+    path2NN = os.path.join(tmp, 'model.pt')
+    x, y = rng.randn(100, 7), rng.randn(100, 1)
+    info = {'amplification':np.array([10.]), 'amplitude':np.ones(7), 'offset':np.zeros(7)}
+    staNNet([(x, y), (x, y), info], [16, 16]).save_model(path2NN)
+    nn_dict = {'modality':'nn', 'path2NN':path2NN, 'in_list':[0, 1], 'control_indx':np.arange(5)}
+    checks['nn cached'] = isinstance(Grabber.get_platform(nn_dict), Platforms.cached)
+    checks['cache_size 0'] = isinstance(Grabber.get_platform(dict(nn_dict, cache_size=0)), Platforms.nn)
+    checks['fitnessavg > 1'] = isinstance(Grabber.get_platform(nn_dict, fitnessavg=3), Platforms.nn)
+    parallel = Grabber.get_platform(dict(nn_dict, workers=2, pool='thread'))
+    checks['parallel cached'] = (isinstance(parallel, Platforms.cached)
+                                 and isinstance(parallel.platform, Platforms.parallel))
+    parallel.close()
+
+for name, passed in checks.items():
+    print(f'{name}: passed_test = {passed}')
+passed_test = all(checks.values())
+print(f'passed_test = {passed_test}')
+assert passed_test
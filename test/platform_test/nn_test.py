@@ -0,0 +1,59 @@
+'''This test checks that Platforms.nn, which feeds the whole population (or chunks
+of batch_size genomes) to the staNNet in one forward pass, gives the outputs of
+the loop over genomes it replaced (kept below as reference), also with an input
+transformation per genome, and returns an empty array for an empty pool.'''
+
+import os
+import tempfile
+import numpy as np
+import SkyNEt.modules.Platforms as Platforms
+from SkyNEt.modules.Nets.staNNet import staNNet
+from SkyNEt.config.acceleration import Accelerator
+
+#%% Reference: the original loop over genomes
+def evaluate_ref(platform, inputs_wfm, genePool, target_wfm):
+    outputPopul = np.zeros((len(genePool), target_wfm.shape[-1]))
+    g_index = np.delete(np.arange(platform.nn_input_dim), platform.input_indx)
+    for j in range(len(genePool)):
+        x = platform.trafo(inputs_wfm, genePool[j, platform.trafo_indx])
+        g = np.ones_like(target_wfm)[:, np.newaxis]*genePool[j, platform.control_indx, np.newaxis].T
+        x_dummy = np.empty((g.shape[0], platform.nn_input_dim))
+        x_dummy[:, platform.input_indx] = x.T
+        x_dummy[:, g_index] = g
+        outputPopul[j] = platform.net.outputs(Accelerator.format_numpy(x_dummy))
+    return platform.amplification*outputPopul
+
+def scale_inputs(inputs_wfm, scale):
+    return scale*inputs_wfm
+
+checks = {}
+rng = np.random.RandomState(12)
+with tempfile.TemporaryDirectory() as tmp:
+    path2NN = os.path.join(tmp, 'model.pt')
+    x, y = rng.randn(100, 7), rng.randn(100, 1)
+    info = {'amplification':np.array([10.]), 'amplitude':np.ones(7), 'offset':np.zeros(7)}
+    staNNet([(x, y), (x, y), info], [16, 16]).save_model(path2NN)
+    nn_dict = {'path2NN':path2NN, 'in_list':[0, 1], 'control_indx':np.arange(5)}
+    inputs_wfm = np.array([[-1., 0.4, -1., 0.4], [-1., -1., 0.4, 0.4]]).repeat(10, axis=1)
+    target_wfm = np.zeros(inputs_wfm.shape[-1])
+    genePool = rng.uniform(-1.2, 0.6, (11, 6))
+
+    for batch_size in [None, 1, 4]:
+        platform = Platforms.nn(dict(nn_dict, batch_size=batch_size))
+        outputs = platform.evaluatePopulation(inputs_wfm, genePool, target_wfm)
+        reference = evaluate_ref(platform, inputs_wfm, genePool, target_wfm)
+        checks[f'batch_size={batch_size}'] = (outputs.shape == reference.shape
+                                              and np.allclose(outputs, reference, rtol=1e-5, atol=1e-6))
+        empty = platform.evaluatePopulation(inputs_wfm, genePool[:0], target_wfm)
+        checks[f'empty pool (batch_size={batch_size})'] = empty.shape == (0, target_wfm.shape[-1])
+
+    platform = Platforms.nn(dict(nn_dict, batch_size=4, trafo_indx=5, trafo=scale_inputs))
+    outputs = platform.evaluatePopulation(inputs_wfm, genePool, target_wfm)
+    checks['trafo'] = np.allclose(outputs, evaluate_ref(platform, inputs_wfm, genePool, target_wfm),
+                                  rtol=1e-5, atol=1e-6)
+
+for name, passed in checks.items():
+    print(f'{name}: passed_test = {passed}')
+passed_test = all(checks.values())
+print(f'passed_test = {passed_test}')
+assert passed_test
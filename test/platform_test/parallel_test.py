@@ -0,0 +1,43 @@
+'''This test checks that a chip platform with the simulated measurement backend
+can be sharded over workers with Platforms.parallel: the chip reads its
+measurement backend from platform['backend'] and parallel its pool from
+platform['pool'], and the outputs on a thread or process pool must equal those
+of a single chip (without noise the simulated device is deterministic).'''
+
+import os
+import tempfile
+import numpy as np
+import SkyNEt.modules.Platforms as Platforms
+import SkyNEt.modules.Grabber as Grabber
+from SkyNEt.modules.Nets.staNNet import staNNet
+
+if __name__ == '__main__':
+    checks = {}
+    rng = np.random.RandomState(10)
+    with tempfile.TemporaryDirectory() as tmp:
+        path2NN = os.path.join(tmp, 'model.pt')
+        x, y = rng.randn(100, 7), rng.randn(100, 1)
+        info = {'amplification':np.array([10.]), 'amplitude':np.ones(7), 'offset':np.zeros(7)}
+        staNNet([(x, y), (x, y), info], [16, 16]).save_model(path2NN)
+        chip_dict = {'modality':'chip', 'fs':1000, 'amplification':10., 'control_indx':np.arange(5),
+                     'backend':{'backend':'simulated', 'path2NN':path2NN,
+                                'ao_indx':[0, 1], 'dac_indx':[2, 3, 4, 5, 6]}}
+        inputs_wfm = np.array([[-1., 0.4, -1., 0.4], [-1., -1., 0.4, 0.4]]).repeat(5, axis=1)
+        target_wfm = np.zeros(inputs_wfm.shape[-1])
+        genePool = rng.uniform(-1.2, 0.6, (9, 5))
+
+        reference = Grabber.get_platform(chip_dict).evaluatePopulation(inputs_wfm, genePool, target_wfm)
+        for pool in ['thread', 'process']:
+            platform = Grabber.get_platform(dict(chip_dict, workers=3, pool=pool))
+            outputs = platform.evaluatePopulation(inputs_wfm, genePool, target_wfm)
+            checks[f'chip on {pool} pool'] = (isinstance(platform, Platforms.parallel)
+                                              and np.allclose(outputs, reference))
+            future = platform.submit(inputs_wfm, genePool[:2], target_wfm)
+            checks[f'submit on {pool} pool'] = np.allclose(future.result(), reference[:2])
+            platform.close()
+
+    for name, passed in checks.items():
+        print(f'{name}: passed_test = {passed}')
+    passed_test = all(checks.values())
+    print(f'passed_test = {passed_test}')
+    assert passed_test
@@ -0,0 +1,93 @@
+'''This test checks the surrogate-assisted pre-screening of Platforms.chip with the
+simulated measurement backend: only the measure_best genomes with the highest
+surrogate fitness and measure_random others are measured, the others get the
+surrogate outputs and the uncertainty penalty, measured genomes are reused (without
+penalty) for remeasure_interval generations, also when the whole pool is known,
+and Grabber.get_platform rejects the pre-screening on several workers.'''
+
+import os
+import tempfile
+import numpy as np
+import SkyNEt.modules.Platforms as Platforms
+import SkyNEt.modules.Grabber as Grabber
+from SkyNEt.modules.Nets.staNNet import staNNet
+
+checks = {}
+rng = np.random.RandomState(13)
+with tempfile.TemporaryDirectory() as tmp:
+    # Different models for the device and its surrogate, so the surrogate is uncertain
+    info = {'amplification':np.array([10.]), 'amplitude':np.ones(7), 'offset':np.zeros(7)}
+    for name in ['device.pt', 'surrogate.pt']:
+        x, y = rng.randn(100, 7), rng.randn(100, 1)
+        staNNet([(x, y), (x, y), info], [16, 16]).save_model(os.path.join(tmp, name))
+    surrogate_dict = {'modality':'nn', 'path2NN':os.path.join(tmp, 'surrogate.pt'),
+                      'in_list':[0, 1], 'control_indx':np.arange(5)}
+    chip_dict = {'modality':'chip', 'fs':1000, 'amplification':10., 'control_indx':np.arange(5),
+                 'backend':{'backend':'simulated', 'path2NN':os.path.join(tmp, 'device.pt'),
+                            'ao_indx':[0, 1], 'dac_indx':[2, 3, 4, 5, 6]},
+                 'surrogate':surrogate_dict, 'fitness':'corr_fit', 'measure_best':3,
+                 'measure_random':2, 'remeasure_interval':3, 'penalty':0.5}
+    inputs_wfm = np.array([[-1., 0.4, -1., 0.4], [-1., -1., 0.4, 0.4]]).repeat(5, axis=1)
+    target_wfm = np.array([0., 1., 1., 0.]).repeat(5)
+    genePool = rng.uniform(-1.2, 0.6, (12, 5))
+
+    platform = Grabber.get_platform(chip_dict)
+    surrogate = Platforms.nn(surrogate_dict)
+    device = Platforms.chip({key:value for key, value in chip_dict.items() if key != 'surrogate'})
+    # Record the genomes measured on the device
+    measured = []
+    measure = platform.measure
+    def recording(inputs_wfm, genePool, target_wfm):
+        measured.append(genePool.copy())
+        return measure(inputs_wfm, genePool, target_wfm)
+    platform.measure = recording
+
+    #%% First generation: the best genomes of the surrogate and random others are measured
+    np.random.seed(0)
+    outputs = platform.evaluatePopulation(inputs_wfm, genePool, target_wfm)
+    surrogate_outputs = surrogate.evaluatePopulation(inputs_wfm, genePool, target_wfm)
+    device_outputs = device.evaluatePopulation(inputs_wfm, genePool, target_wfm)
+    surrogate_fitness = platform.Fitness(surrogate_outputs, target_wfm)
+    is_measured = np.array([any(np.array_equal(gene, m) for m in measured[0]) for gene in genePool])
+    best = np.argsort(surrogate_fitness)[::-1][:3]
+    checks['number measured'] = len(measured) == 1 and len(measured[0]) == 5 and np.sum(is_measured) == 5
+    checks['best measured'] = np.all(is_measured[best])
+    checks['measured outputs'] = np.allclose(outputs[is_measured], device_outputs[is_measured])
+    checks['surrogate outputs'] = np.allclose(outputs[~is_measured], surrogate_outputs[~is_measured])
+    residuals = (platform.Fitness(device_outputs, target_wfm) - surrogate_fitness)[is_measured]
+    uncertainty = np.sqrt(np.mean(residuals**2))
+    checks['penalty'] = (np.all(platform.penalty[is_measured] == 0)
+                         and np.allclose(platform.penalty[~is_measured], 0.5*uncertainty)
+                         and uncertainty > 0)
+
+    #%% A pool of known genomes is not screened nor measured
+    outputs = platform.evaluatePopulation(inputs_wfm, genePool[is_measured], target_wfm)
+    checks['all known'] = (len(measured) == 1 and np.all(platform.penalty == 0)
+                           and np.allclose(outputs, device_outputs[is_measured]))
+
+    #%% Next generation: the measured genomes are reused, the others screened again
+    new = np.concatenate((genePool[is_measured], rng.uniform(-1.2, 0.6, (4, 5))))
+    outputs = platform.evaluatePopulation(inputs_wfm, new, target_wfm)
+    checks['reused'] = (len(measured) == 2 and len(measured[1]) == 4
+                        and np.allclose(outputs[:5], device_outputs[is_measured])
+                        and np.all(platform.penalty[:5] == 0))
+
+    #%% After remeasure_interval generations the genomes are measured again
+    platform.evaluatePopulation(inputs_wfm, genePool[is_measured], target_wfm)
+    checks['remeasured'] = len(measured) == 3 and len(measured[2]) == 5
+
+    #%% Without surrogate every genome is measured and there is no penalty
+    outputs = device.evaluatePopulation(inputs_wfm, genePool, target_wfm)
+    checks['without surrogate'] = np.allclose(outputs, device_outputs) and np.all(device.penalty == 0)
+
+    try:
+        Grabber.get_platform(dict(chip_dict, workers=2, pool='thread'))
+        checks['workers rejected'] = False
+    except NotImplementedError:
+        checks['workers rejected'] = True
+
+for name, passed in checks.items():
+    print(f'{name}: passed_test = {passed}')
+passed_test = all(checks.values())
+print(f'passed_test = {passed_test}')
+assert passed_test
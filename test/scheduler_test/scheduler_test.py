@@ -0,0 +1,63 @@
+'''This test checks RampScheduler: nearest_neighbour_order must give the greedy tour
+of a loop over the configurations (kept below as reference), a permutation with
+less ramping than the original order; settling_time must follow tau*ln(d/tolerance),
+at least the minimum; and sweep must set every configuration once, in the order
+it yields, and wait the settling time of each change.'''
+
+import numpy as np
+import SkyNEt.modules.RampScheduler as RS
+
+#%% Reference: greedy tour with a loop over the configurations
+def order_ref(configs, start):
+    current, left, order = start, list(range(len(configs))), []
+    while left:
+        distances = [np.max(np.abs(configs[k] - current)) for k in left]
+        order.append(left.pop(int(np.argmin(distances))))
+        current = configs[order[-1]]
+    return order
+
+checks = {}
+rng = np.random.RandomState(14)
+configs = rng.uniform(-1200, 600, (40, 5))
+start = rng.uniform(-1200, 600, 5)
+
+order = RS.nearest_neighbour_order(configs, start)
+checks['greedy order'] = np.array_equal(order, order_ref(configs, start))
+checks['permutation'] = np.array_equal(np.sort(order), np.arange(len(configs)))
+checks['less ramping'] = RS.travel(configs[order], start) < RS.travel(configs, start)
+checks['from zero'] = np.array_equal(RS.nearest_neighbour_order(configs), order_ref(configs, np.zeros(5)))
+
+#%% Settling time
+checks['settling_time'] = (np.isclose(RS.settling_time(1000, 0.1, 1), 0.1*np.log(1000))
+                           and RS.settling_time(0.5, 0.1, 1) == 0
+                           and RS.settling_time(1000, 0, 1) == 0)
+checks['settling_time minimum'] = (RS.settling_time(1000, 0.1, 1, minimum=1) == 1
+                                   and RS.settling_time(0, 0.1, 1, minimum=0.01) == 0.01
+                                   and np.isclose(RS.settling_time(1000, 0.2, 1, minimum=1), 0.2*np.log(1000)))
+
+#%% Sweep: the voltages set, the indices yielded and the time waited after each change
+sleep, waited, applied = RS.time.sleep, [], []
+RS.time.sleep = waited.append
+try:
+    scheduler = RS.RampScheduler(lambda cv: applied.append(np.array(cv)), 0.01, 1, start=start, minimum=0.02)
+    yielded, same = [], True
+    for j in scheduler.sweep(configs):
+        same &= np.array_equal(applied[-1], configs[j])  # set before it is yielded
+        yielded.append(j)
+    checks['sweep order'] = np.array_equal(yielded, order) and same and len(applied) == len(configs)
+    path = np.concatenate((start[np.newaxis], configs[order]))
+    expected = [max(0.02, 0.01*np.log(d)) for d in np.max(np.abs(np.diff(path, axis=0)), axis=1)]
+    checks['sweep waits'] = np.allclose(waited, expected)
+    checks['current'] = np.array_equal(scheduler.current, configs[order[-1]])
+
+    applied.clear()
+    checks['no reorder'] = (list(scheduler.sweep(configs[:5], reorder=False)) == list(range(5))
+                            and np.array_equal(applied, configs[:5]))
+finally:
+    RS.time.sleep = sleep
+
+for name, passed in checks.items():
+    print(f'{name}: passed_test = {passed}')
+passed_test = all(checks.values())
+print(f'passed_test = {passed_test}')
+assert passed_test
@@ -0,0 +1,52 @@
+'''This test checks that DataLoader gives the same training and validation sets
+from a store (converted with NpzToStore) as from the .npz file, and that
+LazySet reads the same rows as indexing the array in memory, for shuffled and
+repeated indices and after scaling and splitting.'''
+
+import os
+import tempfile
+import numpy as np
+import SkyNEt.modules.SaveLib as SaveLib
+from SkyNEt.modules.Nets.DataHandler import DataLoader, NpzToStore, LazySet
+
+checks = {}
+rng = np.random.RandomState(6)
+inputs = rng.randn(3000, 7).astype(np.float32)
+outputs = rng.randn(3000, 1).astype(np.float32)
+
+with tempfile.TemporaryDirectory() as tmp:
+    data_dir = tmp + os.sep
+    np.savez(data_dir+'data_for_training.npz', inputs=inputs, outputs=np.asfortranarray(outputs),
+             meta=np.array({'nr_raw_samples':3000, 'fs':1000}))
+    store_dir = NpzToStore(data_dir+'data_for_training.npz')
+    store = SaveLib.loadStore(store_dir)
+    checks['NpzToStore'] = (np.array_equal(store['inputs'], inputs) and np.array_equal(store['outputs'], outputs)
+                            and store['meta'].tolist() == {'nr_raw_samples':3000, 'fs':1000})
+
+    #%% DataLoader: same sets from the same seed
+    np.random.seed(7)
+    from_npz = DataLoader(data_dir, 'data_for_training.npz', batch_size=256, steps=2)
+    np.random.seed(7)
+    from_store = DataLoader(data_dir, 'data_for_training', batch_size=256, steps=2)
+    same = from_npz[2] == from_store[2]
+    for set_npz, set_store in zip(from_npz[:2], from_store[:2]):
+        for array, lazy in zip(set_npz, set_store):
+            same &= isinstance(lazy, LazySet) and lazy.shape == array.shape
+            same &= np.array_equal(lazy[np.arange(len(lazy))], array)
+    checks['DataLoader'] = same
+
+    #%% LazySet indexing
+    indices = rng.permutation(3000)[:500]
+    lazy = LazySet(store['inputs'], indices)
+    positions = np.concatenate((rng.permutation(500)[:50], [3, 3, 499]))
+    checks['LazySet rows'] = np.array_equal(lazy[positions], inputs[indices[positions]])
+    checks['LazySet slice and int'] = (np.array_equal(lazy[10:20], inputs[indices[10:20]])
+                                       and np.array_equal(lazy[5], inputs[indices[5]]))
+    checks['LazySet scale'] = np.allclose((lazy/4.)[positions], inputs[indices[positions]]/4.)
+    del store, lazy, from_store
+
+for name, passed in checks.items():
+    print(f'{name}: passed_test = {passed}')
+passed_test = all(checks.values())
+print(f'passed_test = {passed_test}')
+assert passed_test
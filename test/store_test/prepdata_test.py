@@ -0,0 +1,62 @@
+'''This test checks that PrepData, which streams the data files chunk by chunk
+into a store, gives the same inputs and outputs as merging the files in memory
+and cropping them (as PrepData did before), also for a file without inputs
+(generated as sine waves) and a chunk size that does not divide the files.
+The store must be readable by GetData and DataLoader and its index must give
+the rows of every merged file.'''
+
+import os
+import glob
+import tempfile
+import numpy as np
+import SkyNEt.modules.SaveLib as SaveLib
+from SkyNEt.modules.Nets.DataHandler import PrepData, GetData, DataLoader, generate_inpsines
+
+checks = {}
+rng = np.random.RandomState(8)
+meta = {'freq':np.sqrt(np.arange(2, 9))*0.2, 'amplitude':np.linspace(0.5, 1.2, 7),
+        'offset':np.linspace(-0.3, 0.3, 7), 'fs':50, 'phase':np.zeros(7)}
+threshold = [-30., 30.]
+
+with tempfile.TemporaryDirectory() as tmp:
+    main_dir = tmp + os.sep
+    # Two measurements, the second without inputs (sine sampling)
+    outputs1, inputs1 = 20*rng.randn(2500, 1), rng.randn(2500, 7)
+    outputs2 = 20*rng.randn(1800, 1)
+    os.makedirs(main_dir+'meas1/')
+    os.makedirs(main_dir+'meas2/')
+    np.savez(main_dir+'meas1/training_NN_data.npz', inputs=inputs1, outputs=outputs1, **meta)
+    np.savez(main_dir+'meas2/training_NN_data.npz', outputs=outputs2, **meta)
+
+    PrepData(main_dir, list_dirs=['meas1/', 'meas2/'], threshold=threshold, chunk_size=700)
+    store_dir = glob.glob(main_dir+'data4nn/*/data_for_training')[0]
+
+    #%% Reference: merge in memory, then crop on the mean output
+    inputs2 = generate_inpsines(dict(meta, nr_raw_samples=len(outputs2)))
+    inputs = np.concatenate((inputs1, inputs2))
+    outputs = np.concatenate((outputs1, outputs2))
+    mean_output = np.mean(outputs, axis=1)
+    keep = (mean_output < threshold[1]) * (mean_output > threshold[0])
+
+    store_inputs, store_outputs = GetData(store_dir, device='cpu')
+    checks['outputs'] = np.array_equal(store_outputs, outputs[keep])
+    checks['inputs'] = np.allclose(store_inputs.numpy(), inputs[keep], atol=1e-6)
+
+    store = SaveLib.loadStore(store_dir)
+    kept1 = int(np.sum(keep[:2500]))
+    index = store['index']
+    checks['index'] = (list(index['nr_raw_samples']) == [2500, 1800]
+                       and list(index['start']) == [0, kept1]
+                       and list(index['stop']) == [kept1, int(np.sum(keep))]
+                       and index['data_path'][1].endswith('meas2/training_NN_data.npz'))
+    checks['meta'] = store['meta'].tolist()['nr_raw_samples'] == 4300
+
+    data = DataLoader(os.path.dirname(store_dir)+os.sep, 'data_for_training', batch_size=128)
+    checks['DataLoader'] = len(data[0][0]) + len(data[1][0]) == np.sum(keep)
+    del store, index, data
+
+for name, passed in checks.items():
+    print(f'{name}: passed_test = {passed}')
+passed_test = all(checks.values())
+print(f'passed_test = {passed_test}')
+assert passed_test
@@ -0,0 +1,69 @@
+'''This test checks the round trip of SaveLib.ResultStore: arrays filled row by
+row and flushed must be read back by loadStore exactly, as read-only memory
+maps, and the God observer must save the same arrays (same keys and values) as
+the Results_GA.npz archive it used to write, with the unwritten generations at
+fitness -inf.'''
+
+import os
+import tempfile
+import types
+import numpy as np
+import SkyNEt.modules.SaveLib as SaveLib
+from SkyNEt.modules.Observers import God
+
+checks = {}
+rng = np.random.RandomState(5)
+
+with tempfile.TemporaryDirectory() as tmp:
+    #%% ResultStore filled row by row
+    store = SaveLib.ResultStore(os.path.join(tmp, 'store'))
+    rows = store.create('rows', (10, 4, 3))
+    counts = store.create('counts', (10,), dtype=np.int32, fill_value=-1)
+    reference = rng.randn(10, 4, 3)
+    for i in range(7):
+        rows[i] = reference[i]
+        counts[i] = i
+        store.flush()
+    store.save(meta=np.array({'fs':1000, 'name':'test'}), inputs=reference[0])
+
+    loaded = SaveLib.loadStore(os.path.join(tmp, 'store'))
+    checks['keys'] = sorted(loaded) == ['counts', 'inputs', 'meta', 'rows']
+    checks['rows'] = (np.array_equal(loaded['rows'][:7], reference[:7])
+                      and np.all(loaded['rows'][7:] == 0))
+    checks['fill_value and dtype'] = (np.array_equal(loaded['counts'], [0, 1, 2, 3, 4, 5, 6, -1, -1, -1])
+                                      and loaded['counts'].dtype == np.int32)
+    checks['memory-mapped'] = isinstance(loaded['rows'], np.memmap) and not loaded['rows'].flags.writeable
+    checks['objects'] = loaded['meta'].tolist() == {'fs':1000, 'name':'test'}
+    checks['saved once'] = np.array_equal(loaded['inputs'], reference[0])
+
+    #%% God observer of GA
+    subject = types.SimpleNamespace(savepath=tmp+os.sep, dirname='GA', generations=8, genomes=5, genes=4,
+                                    target_wfm=np.arange(6.), inputs_wfm=np.ones((2, 6)),
+                                    filter_array=np.ones(6, dtype=bool))
+    god = God({})
+    god.subject = subject
+    god.reset()
+    genes, outputs, fitness = rng.rand(6, 5, 4), rng.randn(6, 5, 6), rng.rand(6, 5)
+    for gen in range(6):
+        god.update({'generation':gen, 'genes':genes[gen], 'outputs':outputs[gen], 'fitness':fitness[gen]})
+    god.save()
+    max_fitness, best_genome, best_output = god.judge()
+
+    # The arrays of the archive np.savez(Results_GA, geneArray=..., ...) written before the store
+    archive = {'geneArray':np.concatenate((genes, np.zeros((2, 5, 4)))),
+               'outputArray':np.concatenate((outputs, np.zeros((2, 5, 6)))),
+               'fitnessArray':np.concatenate((fitness, -np.inf*np.ones((2, 5)))),
+               'mask':subject.filter_array}
+    results = SaveLib.loadStore(os.path.join(god.saveDirectory, 'Results_GA'))
+    checks['God keys'] = sorted(results) == sorted(archive)
+    checks['God arrays'] = all(np.array_equal(results[key], archive[key]) for key in archive)
+    best = np.unravel_index(np.argmax(fitness), fitness.shape)
+    checks['God judge'] = (max_fitness == fitness[best] and np.array_equal(best_genome, genes[best])
+                           and np.array_equal(best_output, outputs[best]))
+    del rows, counts, loaded, results, god, store
+
+for name, passed in checks.items():
+    print(f'{name}: passed_test = {passed}')
+passed_test = all(checks.values())
+print(f'passed_test = {passed_test}')
+assert passed_test
@@ -0,0 +1,46 @@
+'''This test checks webNNet.evaluate_pool, which evaluates the web for all genomes
+of a GA pool in one batched forward pass, against the loop over genomes it
+replaced: set_parameters_from_pool and forward for each genome. The web has two
+vertices connected by an arc and custom scale and bias parameters.'''
+
+import numpy as np
+import torch
+from SkyNEt.modules.Nets.staNNet import staNNet
+from SkyNEt.modules.Nets.webNNet import webNNet
+
+checks = {}
+rng = np.random.RandomState(15)
+torch.manual_seed(15)
+x, y = rng.randn(100, 7), rng.randn(100, 1)
+info = {'amplification':np.array([10.]), 'amplitude':np.ones(7), 'offset':np.zeros(7)}
+net = staNNet([(x, y), (x, y), info], [16, 16])
+
+web = webNNet()
+web.add_vertex(net, 'A', output=True)
+web.add_vertex(net, 'B', output=True)
+web.add_arc('A', 'B', 3)
+web.check_graph(verbose=False)
+inputs = torch.rand(20, 4)*2 - 1
+genes = len(web.graph)*5 - len(web.arcs)
+pool = rng.uniform(-1, 1, (12, genes))
+web.set_dict_indices_from_pool(pool[0])
+
+for custom in [False, True]:
+    if custom:
+        web.add_parameters(['scale', 'bias'], [torch.tensor([1.5]), torch.tensor([0.1])])
+    outputs = web.evaluate_pool(inputs, pool)
+    reference = []
+    for genome in pool:
+        web.set_parameters_from_pool(genome)
+        reference.append(web.forward(inputs).detach())
+    reference = torch.stack(reference)
+    name = 'with scale and bias' if custom else 'control voltages'
+    checks[name] = (outputs.shape == (len(pool), len(inputs), 2)
+                    and torch.allclose(outputs, reference, rtol=1e-5, atol=1e-5))
+    checks[f'{name}: no gradients'] = not outputs.requires_grad and web._cv_batch is None
+
+for name, passed in checks.items():
+    print(f'{name}: passed_test = {passed}')
+passed_test = all(checks.values())
+print(f'passed_test = {passed_test}')
+assert passed_test
@@ -0,0 +1,68 @@
+'''This test checks the fused evaluation of webNNet: the vertices of a layer sharing
+a network are grouped and evaluated in one batched call, which must give the
+outputs and gradients of evaluating them one by one (fuse_vertices = False),
+also for all genomes of a pool with evaluate_pool. The gather indices of the
+plan are moved to the device of the data once, not on every forward call.'''
+
+import numpy as np
+import torch
+from SkyNEt.modules.Nets.staNNet import staNNet
+from SkyNEt.modules.Nets.webNNet import webNNet
+
+def gradients(web, x):
+    '''Output of the web and the gradients of the sum of its squares.'''
+    web.zero_grad()
+    output = web(x)
+    torch.sum(output**2).backward()
+    return output.detach(), {name:param.grad.clone() for name, param in web.named_parameters()}
+
+checks = {}
+rng = np.random.RandomState(17)
+torch.manual_seed(17)
+info = {'amplification':np.array([10.]), 'amplitude':np.ones(7), 'offset':np.zeros(7)}
+nets = [staNNet([(x, y), (x, y), info], [16, 16]) for x, y in [(rng.randn(100, 7), rng.randn(100, 1))
+                                                             for n in range(2)]]
+# Three vertices of the first layer share a network, one has other input gates
+web = webNNet()
+web.add_vertex(nets[0], 'A')
+web.add_vertex(nets[0], 'B', input_gates=[3, 5])
+web.add_vertex(nets[1], 'C')
+web.add_vertex(nets[0], 'D', output=True)
+web.add_vertex(nets[1], 'E', output=True)
+web.add_arc('A', 'D', 2)
+web.add_arc('B', 'D', 3)
+web.add_arc('C', 'E', 4)
+web.add_arc('A', 'E', 5)
+web.add_parameters(['scale', 'bias'], [torch.tensor([0.8]), torch.tensor([-0.1])])
+web.check_graph(verbose=False)
+checks['groups'] = ([[[step['name'] for step in group] for group in layer] for layer in web._plan]
+                    == [[['A', 'B'], ['C']], [['D'], ['E']]])
+
+x = torch.rand(30, 10)*2 - 1
+web.fuse_vertices = True
+output, grads = gradients(web, x)
+web.fuse_vertices = False
+reference, grads_ref = gradients(web, x)
+checks['output'] = torch.allclose(output, reference, rtol=1e-5, atol=1e-6)
+checks['gradients'] = all(torch.allclose(grads[name], grads_ref[name], rtol=1e-4, atol=1e-6) for name in grads_ref)
+
+web.set_dict_indices_from_pool(None)
+pool = rng.uniform(-1, 1, (9, sum(len(indices) for indices in web.indices.values())))
+web.fuse_vertices = True
+outputs = web.evaluate_pool(x, pool)
+web.fuse_vertices = False
+checks['evaluate_pool'] = torch.allclose(outputs, web.evaluate_pool(x, pool), rtol=1e-5, atol=1e-6)
+
+# The gather indices stay the same tensors, on the device of the data
+indices = [step['swapindices'] for layer in web._plan for group in layer for step in group]
+web.fuse_vertices = True
+web(x)
+checks['swapindices moved once'] = all(
+    step['swapindices'] is index and step['swapindices'].device == x.device
+    for step, index in zip([step for layer in web._plan for group in layer for step in group], indices))
+
+for name, passed in checks.items():
+    print(f'{name}: passed_test = {passed}')
+passed_test = all(checks.values())
+print(f'passed_test = {passed_test}')
+assert passed_test
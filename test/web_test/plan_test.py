@@ -0,0 +1,86 @@
+'''This test checks that webNNet.forward, which runs the execution plan compiled
+by check_graph layer by layer, gives the outputs and the gradients of the
+recursive evaluation of the graph it replaced (kept below as reference), on a
+web with arcs over three layers, two output vertices and custom scale and bias
+parameters. The plan must be compiled again when a vertex or an arc is added.
+Vertices are evaluated one by one here, fused evaluation is tested in fused_test.'''
+
+import numpy as np
+import torch
+from SkyNEt.modules.Nets.staNNet import staNNet
+from SkyNEt.modules.Nets.webNNet import webNNet
+
+#%% Reference: the original recursive evaluation, starting at the output vertices
+def forward_ref(web, x):
+    columns, i = {}, 0
+    for name, v in web.graph.items():
+        nr_columns = v['network'].D_in - v['voltage_bounds'].shape[1]
+        columns[name] = x[:, i:i+nr_columns]
+        i += nr_columns
+    outputs = {}
+    def forward_vertex(name):
+        if name in outputs:
+            return
+        v = web.graph[name]
+        cv_data = getattr(web, name).repeat(x.shape[0], 1)
+        if hasattr(web, 'scale') and hasattr(web, 'bias'):
+            data = torch.cat((columns[name]*web.scale + web.bias, cv_data), dim=1)
+        else:
+            data = torch.cat((columns[name], cv_data), dim=1)
+        data = data[:, v['swapindices']]
+        for (sink_name, sink_gate), source_name in web.arcs.items():
+            if sink_name == name:
+                forward_vertex(source_name)
+                data[:, sink_gate] = v['transfer'][sink_gate](outputs[source_name][:, 0])
+        outputs[name] = v['network'].outputs(data, grad=True)
+    for name, v in web.graph.items():
+        if v['isoutput']:
+            forward_vertex(name)
+    return torch.cat([outputs[name] for name, v in web.graph.items() if v['isoutput']], dim=1)
+
+def gradients(web, function, x):
+    '''Output of function(x) and the gradients of the sum of its squares.'''
+    web.zero_grad()
+    output = function(x)
+    torch.sum(output**2).backward()
+    return output.detach(), {name:param.grad.clone() for name, param in web.named_parameters()}
+
+checks = {}
+rng = np.random.RandomState(16)
+torch.manual_seed(16)
+info = {'amplification':np.array([10.]), 'amplitude':np.ones(7), 'offset':np.zeros(7)}
+nets = [staNNet([(x, y), (x, y), info], [16, 16]) for x, y in [(rng.randn(100, 7), rng.randn(100, 1))
+                                                             for n in range(2)]]
+web = webNNet()
+web.fuse_vertices = False
+web.add_vertex(nets[0], 'A')
+web.add_vertex(nets[1], 'B')
+web.add_vertex(nets[0], 'C', output=True)
+web.add_vertex(nets[1], 'D', output=True, input_gates=[1, 4])
+web.add_arc('A', 'C', 2)
+web.add_arc('B', 'C', 3)
+web.add_arc('A', 'D', 5)
+web.add_arc('C', 'D', 6)
+web.add_parameters(['scale', 'bias'], [torch.tensor([1.5]), torch.tensor([0.1])])
+x = torch.rand(25, 8)*2 - 1
+
+output, grads = gradients(web, web.forward, x)
+reference, grads_ref = gradients(web, lambda x: forward_ref(web, x), x)
+checks['layers'] = [[step['name'] for group in layer for step in group] for layer in web._plan] == [['A', 'B'], ['C'], ['D']]
+checks['output'] = output.shape == (25, 2) and torch.allclose(output, reference, rtol=1e-5, atol=1e-6)
+checks['gradients'] = all(torch.allclose(grads[name], grads_ref[name], rtol=1e-4, atol=1e-6) for name in grads_ref)
+
+# Adding a vertex and an arc compiles the plan again
+web.add_vertex(nets[0], 'E', output=True)
+web.add_arc('D', 'E', 2)
+x = torch.rand(25, 10)*2 - 1
+output, grads = gradients(web, web.forward, x)
+reference, grads_ref = gradients(web, lambda x: forward_ref(web, x), x)
+checks['recompiled'] = (output.shape == (25, 3) and torch.allclose(output, reference, rtol=1e-5, atol=1e-6)
+                        and all(torch.allclose(grads[name], grads_ref[name], rtol=1e-4, atol=1e-6) for name in grads_ref))
+
+for name, passed in checks.items():
+    print(f'{name}: passed_test = {passed}')
+passed_test = all(checks.values())
+print(f'passed_test = {passed_test}')
+assert passed_test